@@ -9,13 +9,17 @@
 ##########################################################################
 
 import os
+from functools import partial
 
 from PyQt5.QtWidgets import QFileDialog, QLineEdit, QLabel, QComboBox, \
-    QPushButton, QCheckBox, QWidget, QFormLayout
+    QPushButton, QCheckBox, QWidget, QFormLayout, QMessageBox
+
+from profiles import read_profile, write_profile, convert_profile, converted_path
+from journal import ProfileJournal
+from fields import FieldRegistry
 
 ###### FIX THIS!
 #from .files.qcheckcombobox import CheckComboBox
-from data_specifications import data_specifications
 from data_values import data_values
 ###### FIX THIS!
 
@@ -37,38 +41,42 @@ class DataInputBox(QWidget):
 
         # Create labels or input fields for each option
         self.widgets = {}  # Store references to widgets for later use
+        # Registry of the fields built from the specifications. Every
+        # widget is connected to a handler bound to its own field.
+        self.fields = FieldRegistry(data_specifications)
 
         # Add labels or input fields for each option
-        for key, options in data_specifications.items():
-            label = QLabel(options['name'])
-            value = data_values.get(key, options['default'])  # Get the corresponding value from data_values dictionary
+        for key, field in self.fields.items():
+            label = QLabel(field.name)
+            value = data_values.get(key, field.default)  # Get the corresponding value from data_values dictionary
 
-            if options['type'] == str:
+            if field.type == str:
                 widget = QLineEdit(str(value))
-                if options.get('writable', False):
-                    widget.textChanged.connect(self.handle_text_change)
-            elif options['type'] == int:
+                if field.writable:
+                    widget.textChanged.connect(partial(self.handle_text_change, field))
+            elif field.type == int:
                 widget = QLineEdit()
                 widget.setText(str(value))
-                if options.get('writable', False):
-                    widget.textChanged.connect(self.handle_int_text_change)
-            elif options['type'] == float:
+                if field.writable:
+                    widget.textChanged.connect(partial(self.handle_int_text_change, field))
+            elif field.type == float:
                 widget = QLineEdit()
                 widget.setText(str(value))
-                if options.get('writable', False):
-                    widget.textChanged.connect(self.handle_float_text_change)
-            elif options['type'] == bool:
+                if field.writable:
+                    widget.textChanged.connect(partial(self.handle_float_text_change, field))
+            elif field.type == bool:
                 widget = QCheckBox()
                 widget.setChecked(value)
-                widget.stateChanged.connect(self.handle_checkbox_change)
-            elif options['type'] == list:
+                widget.stateChanged.connect(partial(self.handle_checkbox_change, field))
+            elif field.type == list:
                 widget = QComboBox()
-                widget.addItems(options['parameters'][0])
+                widget.addItems(field.parameters[0])
                 widget.setCurrentText(value)
-                widget.currentIndexChanged.connect(self.handle_dropdown_change)
+                widget.currentIndexChanged.connect(partial(self.handle_dropdown_change, field))
 
             self.layout.addRow(label, widget)
             self.widgets[key] = widget
+            self.fields.bind(field, widget)
 
 
         # Add a button to save the values
@@ -79,24 +87,17 @@ class DataInputBox(QWidget):
 
         self.setLayout(self.layout)
 
+        # Edits are journaled after a short delay, a full profile is only
+        # written on save
+        self.journal = ProfileJournal(self.profile_path(), self.get_updated_values, parent=self)
+        self.changes_made = False
+        self.recover_changes()
 
-    def update_display(self, data):
-        for key, options in data_specifications.items():
-            if key in self.widgets:
-                widget = self.widgets[key]
-                value = data['data_values'].get(key, options['default'])
-
-                if isinstance(widget, QLineEdit):
-                    widget.setText(str(value))
-                elif isinstance(widget, QCheckBox):
-                    widget.setChecked(value)
-                elif isinstance(widget, QComboBox):
-                    widget.setCurrentText(value)
 
     def update_values(self, data_values):
         for key, value in data_values.items():
-            if key in self.widgets:
-                widget = self.widgets[key]
+            if key in self.fields:
+                widget = self.fields[key].widget
                 if isinstance(widget, QLineEdit):
                     widget.setText(str(value))
                 elif isinstance(widget, QCheckBox):
@@ -104,173 +105,202 @@ class DataInputBox(QWidget):
                 elif isinstance(widget, QComboBox):
                     widget.setCurrentText(value)
 
-    def handle_text_change(self, text):
-        sender = self.sender()
-        key = self.get_key_from_widget(sender)
-        if key is not None:
-            options = data_specifications[key]
-
-            if options.get('writable', False):
-                value = text
-                if options['type'] == int:
-                    try:
-                        value = int(text)
-                    except ValueError:
-                        sender.setStyleSheet("background-color: red;")
-                        return
-
-                sender.setStyleSheet("background-color: white;")
-                data_values[key] = value  # Save the updated value to data_values
+    def handle_text_change(self, field, text):
+        widget = field.widget
+        if field.writable:
+            if field.validator.check(text) is None:
+                widget.setStyleSheet("background-color: white;")
+                data_values[field.key] = text  # Save the updated value to data_values
 
                 self.changes_made = True # Set change flag to True
-                print(self.changes_made)
-
-    def handle_int_text_change(self, text):
-        sender = self.sender()
-        key = self.get_key_from_widget(sender)
-        if key is not None:
+                self.journal.record(field.key, text)
+            else:
+                widget.setStyleSheet("background-color: red;")
+
+    def handle_int_text_change(self, field, text):
+        widget = field.widget
+        try:
+            value = field.validator.parse(text)
+            if field.validator.check(value) is None:
+                widget.setStyleSheet("background-color: white;")
+                if field.writable:
+                    data_values[field.key] = value  # Save the updated value to data_values
+                    self.changes_made = True # Set change flag to True
+                    self.journal.record(field.key, value)
+            else:
+                widget.setStyleSheet("background-color: red;")
+        except ValueError:
+            widget.setStyleSheet("background-color: red;")
+
+    def handle_float_text_change(self, field, text):
+        widget = field.widget
+        if field.writable:
             try:
-                value = int(text)
-                options = data_specifications[key]
-                min_value = options['parameters'].get('min', float('-inf'))
-                max_value = options['parameters'].get('max', float('inf'))
-                if min_value <= value <= max_value:
-                    sender.setStyleSheet("background-color: white;")
-                    if options.get('writable', False):
-                        data_values[key] = value  # Save the updated value to data_values
-                        self.changes_made = True # Set change flag to True
-                        print(self.changes_made)
+                value = field.validator.parse(text)
+
+                if field.validator.check(value) is None:
+                    if field.validator.digits is not None:
+                        widget.setText(field.validator.format(value))
+                    widget.setStyleSheet("background-color: white;")
+                    data_values[field.key] = value  # Save the updated value to data_values
+                    self.changes_made = True # Set change flag to True
+                    self.journal.record(field.key, value)
                 else:
-                    sender.setStyleSheet("background-color: red;")
+                    widget.setStyleSheet("background-color: red;")
             except ValueError:
-                sender.setStyleSheet("background-color: red;")
-
-    def handle_float_text_change(self, text):
-        sender = self.sender()
-        key = self.get_key_from_widget(sender)
-        if key is not None:
-            options = data_specifications[key]
-
-            if options.get('writable', False):
-                try:
-                    value = float(text)
-                    min_value = options['parameters'].get('min', float('-inf'))
-                    max_value = options['parameters'].get('max', float('inf'))
-                    digits = options['parameters'].get('digits', None)
-
-                    if min_value <= value <= max_value:
-                        if digits is not None:
-                            value_str = f"{value:.{digits}f}"
-                            sender.setText(value_str)
-                        sender.setStyleSheet("background-color: white;")
-                        data_values[key] = value  # Save the updated value to data_values
-                        self.changes_made = True # Set change flag to True
-                        print(self.changes_made)
-                    else:
-                        sender.setStyleSheet("background-color: red;")
-                except ValueError:
-                    sender.setStyleSheet("background-color: red;")
-
-    def handle_checkbox_change(self, state):
-        sender = self.sender()
+                widget.setStyleSheet("background-color: red;")
+
+    def handle_checkbox_change(self, field, state):
         selected_state = bool(state)
         if selected_state:
-            sender.setStyleSheet("background-color: yellow;")
-            self.changes_made = True # Set change flag to True
-            print(self.changes_made)
+            field.widget.setStyleSheet("background-color: yellow;")
         else:
-            sender.setStyleSheet("background-color: white;")
-            self.changes_made = True # Set change flag to True
-            print(self.changes_made)
-
-    def handle_dropdown_change(self, index):
-        sender = self.sender()
-        key = self.get_key_from_widget(sender)
-        if key is not None:
-            data_values[key] = sender.currentText()  # Save the updated value to data_values
-            self.changes_made = True # Set change flag to True
-            print(self.changes_made)
-
-    # def handle_dropdown_change(self, index):
-    #     sender = self.sender()  # Get the combobox that triggered the signal
-    #     selected_value = sender.currentText()  # Retrieve the selected value
-    #     print(f'Selected value: {selected_value}')
+            field.widget.setStyleSheet("background-color: white;")
+        data_values[field.key] = selected_state  # Save the updated value to data_values
+        self.changes_made = True # Set change flag to True
+        self.journal.record(field.key, selected_state)
+
+    def handle_dropdown_change(self, field, index):
+        value = field.widget.currentText()
+        data_values[field.key] = value  # Save the updated value to data_values
+        self.changes_made = True # Set change flag to True
+        self.journal.record(field.key, value)
 
     def get_key_from_widget(self, widget):
-        for key, value in self.widgets.items():
-            if value is widget:
-                return key
-        return None
+        field = self.fields.field_for(widget)
+        return None if field is None else field.key
 
-    def save_values(self):
-        # Save the values to the data_values dictionary
-        updated_data = self.get_updated_values()
-        # Update the file in the "files" subfolder
+    def profile_path(self):
+        # Profile in the "files" subfolder unless a profile was loaded
         if self.last_loaded_file is None:
-            file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "files", "data_values.py")
-        else:
-            file_path = self.last_loaded_file
+            return os.path.join(os.path.dirname(os.path.abspath(__file__)), "files", "data_values.json")
+        return self.last_loaded_file
 
-        with open(file_path, 'w') as file:
-            file.write(f"data_values = {updated_data}")
-            self.changes_made = False
-            print("Values saved successfully.")
-            print(self.changes_made)
+    def save_values(self):
+        # Save the values to the data_values dictionary. Return False if
+        # the profile was not written.
+        updated_data = self.get_updated_values()
+        if not self.write_values(self.profile_path(), updated_data):
+            return False
+        # The journal of unsaved edits is obsolete now
+        self.journal.discard()
+        self.changes_made = False
+        print("Values saved successfully.")
+        return True
+
+    def write_values(self, file_path, updated_data):
+        # Write a profile only if it can be loaded again, report the
+        # invalid values otherwise
+        report = self.fields.validators.validate(updated_data)
+        if not report.ok:
+            QMessageBox.warning(self, "Save Data Values",
+                                "The profile was not saved:\n" + report.message())
+            return False
+        try:
+            write_profile(file_path, updated_data)
+        except OSError as error:
+            QMessageBox.warning(self, "Save Data Values", str(error))
+            return False
+        return True
+
+    def discard_changes(self):
+        # Unsaved edits are not recovered later
+        self.journal.discard()
+        self.changes_made = False
 
     def save_values_as(self):
         # Save the values to the data_values dictionary
         updated_data = self.get_updated_values()
         data_values.update(updated_data)
         # Open a file dialog to select the file to save the values
-        file_path, _ = QFileDialog.getSaveFileName(self, "Save Data Values", "", "Python Files (*.py)")
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Data Values", "", "Profile Files (*.json)")
         if file_path:
-            with open(file_path, 'w') as file:
-                file.write(f"data_values = {updated_data}")
-                self.changes_made = False
-                print("Values saved successfully.")
-                print(self.changes_made)
+            if not self.write_values(file_path, updated_data):
+                return
+            self.journal.discard()
+            self.last_loaded_file = file_path
+            self.journal.set_path(file_path)
+            self.changes_made = False
+            print("Values saved successfully.")
 
     def get_updated_values(self):
         updated_data = {}
 
-        for key, widget in self.widgets.items():
-            if key in data_specifications:
-                options = data_specifications[key]
-
-                if options.get('writable', False):
-                    if isinstance(widget, QLineEdit):
-                        value = widget.text()
-                        updated_data[key] = int(value) if options['type'] == int else value
-                    elif isinstance(widget, QCheckBox):
-                        updated_data[key] = widget.isChecked()
-                    elif isinstance(widget, QComboBox):
-                        updated_data[key] = widget.currentText()
+        for key, field in self.fields.items():
+            widget = field.widget
+            if field.writable:
+                if isinstance(widget, QLineEdit):
+                    # Text which is no number is kept and reported by the
+                    # validation before saving
+                    value = widget.text()
+                    try:
+                        updated_data[key] = field.validator.parse(value)
+                    except ValueError:
+                        updated_data[key] = value
+                elif isinstance(widget, QCheckBox):
+                    updated_data[key] = widget.isChecked()
+                elif isinstance(widget, QComboBox):
+                    updated_data[key] = widget.currentText()
 
         return updated_data
 
     def load_values(self):
         # Open a file dialog to select the file to load the values
-        file_path, _ = QFileDialog.getOpenFileName(self, "Load Data Values", "", "Python Files (*.py)")
-
+        file_path, _ = QFileDialog.getOpenFileName(self, "Load Data Values", "",
+                                                   "Profile Files (*.json);;Python Profiles (*.py)")
         if file_path:
-            # Load the values from the selected file
-            with open(file_path, 'r') as file:
-                file_contents = file.read()
-                # Create a dictionary to store the loaded values
-                loaded_data = {}
-                # Execute the file contents within the dictionary scope
-                exec(file_contents, loaded_data)
-
-            # Update the data_values dictionary with the loaded values
-            data_values.update(loaded_data)
-            # Update the input widgets with the loaded values
-            self.update_values(loaded_data)
-            # Update the display with the loaded values
-            self.update_display(loaded_data)
-
-            self.last_loaded_file = file_path
-
-            print("Values loaded successfully from:", self.last_loaded_file)
+            try:
+                self.load_profile(file_path)
+            except (OSError, RuntimeError) as error:
+                QMessageBox.warning(self, "Load Data Values", str(error))
+
+    def load_profile(self, file_path):
+        # Profiles in Python source are converted once into a profile file
+        # next to them. An existing profile file is only replaced on
+        # request, it may be newer than the source.
+        if file_path.endswith(".py"):
+            target = converted_path(file_path)
+            if os.path.exists(target):
+                reply = QMessageBox.question(self, "Load Data Values",
+                                             "The profile '%s' exists already. Replace it with "
+                                             "the converted '%s'?\nNo opens the existing profile."
+                                             % (target, file_path),
+                                             QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+                                             QMessageBox.No)
+                if reply == QMessageBox.Cancel:
+                    return
+                if reply == QMessageBox.Yes:
+                    file_path = convert_profile(file_path, target, self.fields.validators, overwrite=True)
+                else:
+                    file_path = target
+            else:
+                file_path = convert_profile(file_path, target, self.fields.validators)
+        loaded_data = read_profile(file_path, self.fields.validators)
+        # Pending edits still belong to the previous profile
+        self.journal.set_path(file_path)
+
+        # Update the data_values dictionary with the loaded values
+        data_values.update(loaded_data)
+        # Update the input widgets with the loaded values
+        self.update_values(loaded_data)
+
+        self.last_loaded_file = file_path
+        self.journal.clear()
+        self.changes_made = False
+        self.recover_changes()
+
+        print("Values loaded successfully from:", self.last_loaded_file)
+
+    def recover_changes(self):
+        # Apply the unsaved edits of a crashed session. The widget updates
+        # journal them again, so they are kept until saved or discarded.
+        recovered = {key: value for key, value in self.journal.recover(self.fields.validators).items()
+                     if data_values.get(key) != value}
+        if recovered:
+            data_values.update(recovered)
+            self.update_values(recovered)
+            self.changes_made = True
+            print("Unsaved changes recovered:", ", ".join(recovered))
 
 
 # =============================================================================
@@ -9,14 +9,37 @@
 ##########################################################################
 
 import math
+import time
+from bisect import bisect_left, insort
 
-from PyQt5.QtGui import QPen, QPainter, QPixmap, QFont, QPolygonF, QColor, \
-    QTransform, QMouseEvent
-from PyQt5.QtCore import Qt, QPointF
+from PyQt5.QtGui import QPen, QBrush, QPainter, QPixmap, QFont, QPolygonF, QColor, \
+    QTransform, QMouseEvent, QPainterPath, QGuiApplication
+from PyQt5.QtCore import Qt, QPointF, QRectF, QTimer
 from PyQt5.QtWidgets import QLineEdit, QLabel, QDialog, QComboBox, QPushButton, \
-    QGraphicsView, QGraphicsPixmapItem, QGraphicsScene, QFormLayout, QVBoxLayout
+    QGraphicsView, QGraphicsPixmapItem, QGraphicsScene, QFormLayout, QVBoxLayout, \
+    QGraphicsItemGroup, QGraphicsPathItem, QFileDialog, QMessageBox
 
 from font import Font as LineFont
+from pixmapcache import PixmapCache
+from pyramid import TilePyramid, PyramidBuilder
+from tileloader import TileLoader
+from redraw import RedrawScheduler
+from layerindex import LayerIndex
+from objectstore import ObjectStore
+from scenefile import SceneFile, write_scene
+from manifest import ManifestLoader
+from mosaic import Mosaic
+
+# Level of detail during continuous pan and zoom
+LOD_IDLE = 150          # Idle time in ms before the full quality pass
+LOD_TEXT_PIXELS = 6     # Text with smaller letters on screen is skipped
+LOD_DEPTH = 3           # Layers this far below the front are drawn as boxes
+SCENE_MARGIN = 0.5      # Object items are created up to this many view sizes around the view
+
+# Live camera and stage trajectory
+STAGE_SCALE = 0.1       # World units per µm of the stage position
+TRACE_POINTS = 1000     # Buckets of the decimated stage trajectory
+TRACE_INTERVAL = 0.25   # Minimum time in s between trajectory updates
 
 
 ############################################################################
@@ -24,7 +47,7 @@ from font import Font as LineFont
 ############################################################################
 
 class ImageViewer(QGraphicsView):
-    def __init__(self, parent, data):
+    def __init__(self, parent, data, retained=True):
         super().__init__(parent)
         self.scene = QGraphicsScene(self)
         self.setScene(self.scene)
@@ -44,6 +67,65 @@ class ImageViewer(QGraphicsView):
         self.margen_test = 0            # Test the margins
         self.data = data
         self.image_size = (100, 100)    # Afected by zoom
+        self.pixmap_cache = PixmapCache()   # Decoded and scaled images
+        self.pyramid = TilePyramid()        # Downscaled levels of the images
+
+        # Input events only mark the view dirty, it is rendered at most
+        # once per display frame
+        screen = QGuiApplication.primaryScreen()
+        frame_rate = screen.refreshRate() if screen is not None else 0
+        self.redraw = RedrawScheduler(self.update_camera_view, frame_rate or 60, self)
+
+        # Simplified drawing of the objects while the view is moving, the
+        # full quality pass follows once the input is idle
+        self.lod_enabled = True
+        self.interactive = False
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(LOD_IDLE)
+        self.idle_timer.timeout.connect(self.end_interaction)
+
+        # Images missing in the cache are decoded on worker threads, a
+        # placeholder is shown until they arrive
+        self.async_tiles = True
+        self.tile_loader = TileLoader(self)
+        self.tile_loader.loaded.connect(self.tile_loaded)
+        self.tile_requests = set()          # Tiles requested by the current frame
+        self.placeholder_color = QColor(200, 200, 200)
+        self.placeholders = {}              # (width, height) -> placeholder pixmap
+        self.manifest_loader = None
+
+        # Outdated pyramid levels are rebuilt on the same threads, the
+        # image is shown at full resolution meanwhile
+        self.pyramid_builder = PyramidBuilder(self.pyramid, self.tile_loader.pool, self)
+        self.pyramid_builder.built.connect(self.pyramid_built)
+
+        # Live camera frames are taken from a FrameRing once per display
+        # frame, only the newest frame is shown
+        self.camera_ring = None
+        self.camera_timer = QTimer(self)
+        self.camera_timer.timeout.connect(self.poll_camera)
+        self.camera_interval = round(1000 * self.redraw.interval)
+        self.stage_scale = STAGE_SCALE
+        self.live_frame = None          # (pixmap, x, y, scale) in world units
+        self.live_item = None
+        # Frames are stitched into a mosaic of tiles, only the dirty tiles
+        # in the viewport are uploaded
+        self.mosaic = Mosaic()
+        self.mosaic_pixmaps = {}        # tile key -> uploaded pixmap
+        self.mosaic_items = {}          # tile key -> item of the retained scene
+        self.mosaic_layer = None
+        # Stage trajectory from a PositionRecorder
+        self.trajectory = None
+        self.trajectory_path = None     # Decimated path in world coordinates
+        self.trajectory_item = None
+        self.trajectory_count = 0       # Samples in the current path
+        self.trajectory_time = 0.0
+        # Line font shared by all text objects, it caches glyphs and layouts
+        self.line_font = LineFont(valign="bottom", mirrory=True)
+        # Paths and pens shared by all objects of equal shape and style
+        self.object_paths = {}
+        self.object_pens = {}
         # Initialize zoom factors
         self.zoom_factor_in = 4/3
         self.zoom_factor_out = 3/4
@@ -51,7 +133,7 @@ class ImageViewer(QGraphicsView):
         # Objects data
         self.objects_visible = False
         self.mouse_cooridnates = ["Mouse Coordinates",0]
-        self.drawn_objects = [{
+        self.drawn_objects = ObjectStore([{
             'type': 'circle',
             'x': 250,
             'y': 250,
@@ -106,7 +188,7 @@ class ImageViewer(QGraphicsView):
             'linewidth': 2,
             'bounds': [250, 508.66666666666663, 282.0, 250]
         }
-        ]
+        ])
 
         # Create the mouse_label
         self.mouse_label = QLabel(self)
@@ -118,22 +200,130 @@ class ImageViewer(QGraphicsView):
 
         self.last_mouse_pos = None  # Store the last mouse position for panning
 
+        # Layer indices with the spatial index of the images and drawn
+        # objects in each z layer
+        self.image_index = LayerIndex()
+        self.object_index = LayerIndex()
+        self.index_built = False
+
+        # Retained scene mode: every image and drawn object owns a persistent
+        # item in world coordinates, pan and zoom only change the view
+        self.retained = retained
+        self.image_items = {}           # image_data key -> item
+        self.image_levels = {}          # image_data key -> pyramid level
+        self.object_items = {}          # object id -> item
+        self.scene_built = False
+        self.scene_covered = None       # Rectangle with all its object items created
+        self.scene_front = None         # Depth cutoff applied to the items
+        self.scene_objects_visible = None
+        self.image_layer = None
+        self.object_layer = None
+        self.image_groups = {}          # z -> group of image items
+        self.object_groups = {}         # z -> group of object items
+        self.box_items = {}             # z -> bounding boxes of the object layer
+        self.text_items = {}            # object id -> letter height of text items
+        self.text_heights = []          # Sorted (letter height, object id)
+        self.scene_lod = None           # (front, lod) applied to the object groups
+        self.scene_text_min = 0         # Text below this height is hidden
+
     def add_image(self, path, x, y, z):
-        pixmap = QPixmap(path)
-        #### HOTFIX
-        size = (round(self.image_size[0]), round(self.image_size[1]))
-        pixmap = pixmap.scaled(*size, Qt.KeepAspectRatio)  # Scale the pixmap
+        # Scaled pixmap from the cache, the file is decoded on a miss only.
+        # Zoomed out views use a downscaled level of the image pyramid.
+        path = self.pyramid.path_for(path, self.image_size)
+        width, height = self.image_size
+        if self.async_tiles:
+            pixmap = self.pixmap_cache.find(path, self.image_size)
+            if pixmap is None:
+                self.request_tile(path, self.image_size, x, y)
+                self.scene.addRect(x - width / 2, y - height / 2, width, height,
+                                   QPen(Qt.NoPen), QBrush(self.placeholder_color))
+                return
+        else:
+            pixmap = self.pixmap_cache.get(path, self.image_size)
 
         image_item = self.scene.addPixmap(pixmap)
         image_item.setOffset(-self.image_size[0] / 2, -self.image_size[1] / 2)  # Offset based on Image_size
         image_item.setPos(x, y)
 
+    def add_drawn_object(self, obj):
+        # Store the object and hand its draw row to the index and the
+        # retained scene
+        obj = self.drawn_objects.append(obj)
+        row = self.drawn_objects.draw_row(obj.oid)
+        if self.index_built:
+            self.object_index.insert(obj.oid, row[3], row[5], row)
+        if self.retained and self.scene_built:
+            self.add_object_item(row)
+        self.update_camera_view()  # Trigger redraw
+        return obj
+
+    def draw_objects(self, kind, columns, color, content=None):
+        # Bulk insertion of objects of one type from column arrays including
+        # the bounds columns top, right, bot and left. Redraw only once.
+        oids = self.drawn_objects.add_columns(kind, columns, color, content)
+        rows = self.drawn_objects.draw_rows(oids)
+        if self.index_built:
+            for row in rows:
+                self.object_index.insert(row[0], row[3], row[5], row)
+        if self.retained and self.scene_built:
+            # The items are created once they are near the view
+            self.scene_covered = None
+        self.update_camera_view()
+        return [self.drawn_objects.record(oid) for oid in oids]
+
+    def update_drawn_object(self, obj):
+        # Replace the scene item of an object after its parameters were edited
+        row = self.drawn_objects.draw_row(obj.oid)
+        if self.index_built:
+            self.object_index.insert(obj.oid, row[3], row[5], row)
+        if self.retained and self.scene_built:
+            self.remove_object_item(obj.oid)
+            self.add_object_item(row)
+        self.update_camera_view()
+
+    def remove_drawn_object(self, obj):
+        self.drawn_objects.remove(obj)
+        if self.index_built:
+            self.object_index.remove(obj.oid)
+        if self.retained and self.scene_built:
+            self.remove_object_item(obj.oid)
+        self.update_camera_view()
+
+    def set_image(self, key, options):
+        # Add or replace an entry of the image data
+        self.data[key] = options
+        if self.index_built:
+            self.image_index.insert(key, options['z'], options['bounds'])
+        if self.retained and self.scene_built:
+            self.remove_image_item(key)
+            self.add_image_item(key, options)
+        self.update_camera_view()
+
+    # Add a batch of (key, options) entries with a single redraw. The
+    # retained items are created once the images are visible.
+    def add_images(self, items):
+        for key, options in items:
+            self.data[key] = options
+            if self.index_built:
+                self.image_index.insert(key, options['z'], options['bounds'])
+            if self.retained and self.scene_built:
+                self.remove_image_item(key)
+        self.redraw.request()
+
+    def remove_image(self, key):
+        del self.data[key]
+        if self.index_built:
+            self.image_index.remove(key)
+        if self.retained and self.scene_built:
+            self.remove_image_item(key)
+        self.update_camera_view()
+
     def draw_circle(self, x, y, z, radius, color, linewidth):
         # Calculate Bounds [top, right, bot, left]
         bounds = [y - radius, x + radius, y + radius, x - radius]
 
         # Add circle information to the data structure
-        self.drawn_objects.append({
+        return self.add_drawn_object({
             'type': 'circle',
             'x': x,
             'y': y,
@@ -144,8 +334,6 @@ class ImageViewer(QGraphicsView):
             'bounds': bounds
         })
 
-        self.update_camera_view()  # Trigger redraw
-
     def draw_rectangle(self, x, y, z, height, width, angle, color, linewidth):
         # Calculate the half dimensions of the rectangle
         half_height = height / 2
@@ -174,7 +362,7 @@ class ImageViewer(QGraphicsView):
         left = min(x1, x2, x3, x4)
 
         # Add rectangle information to the data structure
-        self.drawn_objects.append({
+        return self.add_drawn_object({
             'type': 'rectangle',
             'x': x,
             'y': y,
@@ -187,8 +375,6 @@ class ImageViewer(QGraphicsView):
             'bounds': [top, right, bot, left]
         })
 
-        self.update_camera_view()  # Trigger redraw
-
     def draw_line(self, x, y, z, length, angle, color, linewidth):
         # Calculate the angle in radians
         angle_rad = math.radians(angle)
@@ -206,7 +392,7 @@ class ImageViewer(QGraphicsView):
         left = min(x_start, x_end)
 
         # Add line information to the data structure
-        self.drawn_objects.append({
+        return self.add_drawn_object({
             'type': 'line',
             'x': x,
             'y': y,
@@ -218,23 +404,14 @@ class ImageViewer(QGraphicsView):
             'bounds': [top, right, bot, left]
         })
 
-        self.update_camera_view()  # Trigger redraw
-
     def draw_text(self, content, x, y, z, letter_height, angle, color, linewidth):
         # Calculate Bounding Box
         size = letter_height
         frame = 0.3 * size
         lw = 0.1*size
 
-        args = {
-            "size": size,
-            "width": size,
-            "valign": "bottom",
-            "mirrory": True,
-            }
-        # Create an instance of your custom Font class
-        custom_font = LineFont(**args)
-        lines = custom_font.string(content, frame, frame)
+        # Text layout from the shared font instance
+        lines = self.line_font.string(content, frame, frame, size=size, width=size)
 
         # Initialize bounding box coordinates
         min_x = float('inf')
@@ -261,7 +438,7 @@ class ImageViewer(QGraphicsView):
         left = x
 
         # Add circle information to the data structure
-        self.drawn_objects.append({
+        obj = self.add_drawn_object({
             'type': 'text',
             'content': content,
             'x': x,
@@ -273,8 +450,7 @@ class ImageViewer(QGraphicsView):
             'linewidth': linewidth,
             'bounds': [top, right, bot, left]
         })
-        self.update_camera_view()  # Trigger redraw
-        print("bounds: ",top, right, bot, left)
+        return obj
 
     # Draw X and Y axes
     def draw_axes(self):
@@ -354,8 +530,27 @@ class ImageViewer(QGraphicsView):
         self.scene.addLine(self.margen_test, self.window_size_y -self.margen_test,  self.window_size_x-self.margen_test, self.window_size_y-self.margen_test, QPen(Qt.red))
         self.scene.addLine(self.window_size_x-self.margen_test, self.margen_test, self.window_size_x-self.margen_test, self.window_size_y-self.margen_test, QPen(Qt.red))
 
+    # Fill the spatial indices from the image data and drawn objects
+    def build_index(self):
+        if self.index_built:
+            return
+        self.image_index.clear()
+        for key, options in self.data.items():
+            self.image_index.insert(key, options['z'], options['bounds'])
+        self.object_index.clear()
+        for row in self.drawn_objects.draw_rows():
+            self.object_index.insert(row[0], row[3], row[5], row)
+        self.index_built = True
+
     # Update camera view with layers
     def update_camera_view(self):
+        if self.retained:
+            self.update_retained_view()
+        else:
+            self.rebuild_camera_view()
+
+    # Rebuild the whole scene for the current camera view
+    def rebuild_camera_view(self):
         # Clear existing items from the scene
         self.scene.clear()
         # Clear existing images
@@ -368,29 +563,33 @@ class ImageViewer(QGraphicsView):
 
 
 
-        # Margins for the camera view
-        left_margin = self.window_pos_x + self.margen_test
-        right_margin = self.window_pos_x + self.window_size_x - self.margen_test
-        lower_margin = self.window_pos_y + self.window_size_y - self.margen_test
-        upper_margin = self.window_pos_y + self.margen_test
+        # Margins for the camera view in world coordinates
+        zoom = self.zoom_factor
+        left_margin = (self.window_pos_x + self.margen_test) / zoom
+        right_margin = (self.window_pos_x + self.window_size_x - self.margen_test) / zoom
+        lower_margin = (self.window_pos_y + self.window_size_y - self.margen_test) / zoom
+        upper_margin = (self.window_pos_y + self.margen_test) / zoom
         front_margin = self.window_pos_z + 1
 
-        # Sort images based on Z-value
-        sorted_data = sorted(self.data.items(), key=lambda item: item[1]['z'])
-        self.drawn_objects.sort(key=lambda obj: obj['z'])
+        # Query the visible images ordered by their Z-value
+        self.build_index()
+        keys = self.image_index.query(left_margin, upper_margin, right_margin,
+                                      lower_margin, front_margin)
 
-        for key, options in sorted_data:
-            imx_bounds = [coord * self.zoom_factor for coord in options['bounds']]
-            if (left_margin < imx_bounds[1] and right_margin > imx_bounds[3] and
-                    lower_margin > imx_bounds[0] and upper_margin < imx_bounds[2] and
-                    options['z'] < front_margin):
-                img_x = options['x'] * self.zoom_factor
-                img_y = options['y'] * self.zoom_factor
-                img_z = options['z']
-                adjusted_x = img_x - self.window_pos_x  # Adjust image x position
-                adjusted_y = img_y - self.window_pos_y  # Adjust image y position
-
-                self.add_image(options['image_path'], int(adjusted_x), int(adjusted_y), int(img_z))
+        self.tile_requests = set()
+        for key in keys:
+            options = self.data[key]
+            img_x = options['x'] * self.zoom_factor
+            img_y = options['y'] * self.zoom_factor
+            img_z = options['z']
+            adjusted_x = img_x - self.window_pos_x  # Adjust image x position
+            adjusted_y = img_y - self.window_pos_y  # Adjust image y position
+
+            self.add_image(options['image_path'], int(adjusted_x), int(adjusted_y), int(img_z))
+
+        # Drop the requests of tiles which scrolled out of view
+        self.tile_loader.retain(self.tile_requests)
+        self.pyramid_builder.update()
 
         # Create a QPixmap as a drawing surface
         pixmap = QPixmap(self.window_size_x, self.window_size_y)
@@ -399,148 +598,65 @@ class ImageViewer(QGraphicsView):
 
         # Create a QPainter object with the QPixmap as the paint device
         painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)  # Enable antialiasing for smoother shapes
+        lod = self.lod_enabled and self.interactive
+        painter.setRenderHint(QPainter.Antialiasing, not lod)  # Enable antialiasing for smoother shapes
 
         if self.objects_visible:
-            # Draw drawn objects based on their type and parameters
-            for obj in self.drawn_objects:
-                if obj['type'] == 'circle':
-                    # Check if the object is within the camera view
-                    obj_bounds = [coord * self.zoom_factor for coord in obj['bounds']]
-                    if (left_margin < obj_bounds[1] and right_margin > obj_bounds[3] and
-                        lower_margin > obj_bounds[0] and upper_margin < obj_bounds[2] and
-                        obj['z'] < front_margin):
-                        obj_x = obj['x'] * self.zoom_factor
-                        obj_y = obj['y'] * self.zoom_factor
-                        obj_radius = obj['radius'] * self.zoom_factor
-                        obj_color_str = obj['color']  # Get the color string
-                        obj_color = QColor(obj_color_str)  # Create a QColor from the string
-                        obj_linewidth = obj['linewidth']
-                        adjusted_x = obj_x - self.window_pos_x  # Adjust image x position
-                        adjusted_y = obj_y - self.window_pos_y  # Adjust image y position
-
-                        # Draw the circle
-                        painter.setPen(QPen(obj_color, obj_linewidth))
-                        painter.drawEllipse(
-                            (adjusted_x - obj_radius),
-                            (adjusted_y - obj_radius),
-                            (2 * obj_radius),
-                            (2 * obj_radius)
-                        )
-                elif obj['type'] == 'rectangle':
-                    obj_bounds = [coord * self.zoom_factor for coord in obj['bounds']]
-                    if (left_margin < obj_bounds[1] and right_margin > obj_bounds[3] and
-                        lower_margin > obj_bounds[0] and upper_margin < obj_bounds[2] and
-                        obj['z'] < front_margin):
-
-                        obj_x = obj['x'] * self.zoom_factor
-                        obj_y = obj['y'] * self.zoom_factor
-                        obj_height = obj['height'] * self.zoom_factor
-                        obj_width = obj['width'] * self.zoom_factor
-                        obj_angle = obj['angle']
-                        obj_color_str = obj['color']  # Get the color string
-                        obj_color = QColor(obj_color_str)  # Create a QColor from the string
-                        obj_linewidth = obj['linewidth']
-
-                        adjusted_x = obj_x - self.window_pos_x  # Adjust image x position
-                        adjusted_y = obj_y - self.window_pos_y  # Adjust image y position
-
-                        # Calculate the points for the rotated rectangle
-                        rect = QPolygonF([
-                            QPointF(-obj_width / 2, -obj_height / 2),
-                            QPointF(obj_width / 2, -obj_height / 2),
-                            QPointF(obj_width / 2, obj_height / 2),
-                            QPointF(-obj_width / 2, obj_height / 2),
-                        ])
-
-                        # Create a transform for the rotation
-                        rotation = QTransform()
-                        rotation.translate(adjusted_x, adjusted_y)
-                        rotation.rotate(obj_angle)
-                        rotated_rect = rotation.map(rect)
-
-                        # Draw the rotated rectangle
-                        painter.setPen(QPen(obj_color, obj_linewidth))
-                        painter.drawPolygon(rotated_rect)
-                elif obj['type'] == 'line':
-                    obj_bounds = [coord * self.zoom_factor for coord in obj['bounds']]
-                    if (left_margin < obj_bounds[1] and right_margin > obj_bounds[3] and
-                        lower_margin > obj_bounds[0] and upper_margin < obj_bounds[2] and
-                        obj['z'] < front_margin):
-
-                        obj_x = obj['x'] * self.zoom_factor
-                        obj_y = obj['y'] * self.zoom_factor
-                        obj_length = obj['length'] * self.zoom_factor
-                        obj_angle = obj['angle']
-                        obj_color_str = obj['color']  # Get the color string
-                        obj_color = QColor(obj_color_str)  # Create a QColor from the string
-                        obj_linewidth = obj['linewidth']
-
-                        adjusted_x = obj_x - self.window_pos_x  # Adjust image x position
-                        adjusted_y = obj_y - self.window_pos_y  # Adjust image y position
-
-                        # Calculate the endpoint of the line based on length and angle
-                        end_x = adjusted_x + obj_length * math.cos(obj_angle)
-                        end_y = adjusted_y + obj_length * math.sin(obj_angle)
-
-                        # Draw the line
-                        painter.setPen(QPen(obj_color, obj_linewidth))
-                        painter.drawLine(adjusted_x, adjusted_y, end_x, end_y)
-                elif obj['type'] == 'text':
-                    obj_bounds = [coord * self.zoom_factor for coord in obj['bounds']]
-                    if (left_margin < obj_bounds[1] and right_margin > obj_bounds[3] and
-                        lower_margin > obj_bounds[0] and upper_margin < obj_bounds[2] and
-                        obj['z'] < front_margin):
-                        obj_content = obj['content']
-                        obj_x = obj['x'] * self.zoom_factor
-                        obj_y = obj['y'] * self.zoom_factor
-                        obj_letter_height = obj['letter_height'] * self.zoom_factor
-                        obj_angle = obj['angle']
-                        obj_color_str = obj['color']  # Get the color string
-                        obj_color = QColor(obj_color_str)  # Create a QColor from the string
-                        obj_linewidth = obj['linewidth']
-
-                        adjusted_x = obj_x - self.window_pos_x  # Adjust image x position
-                        adjusted_y = obj_y - self.window_pos_y  # Adjust image y position
-
-
-                        size = obj_letter_height
-                        frame = 0.3 * size
-                        lw = 0.1*size
-
-                        args = {
-                            "size": size,
-                            "width": size,
-                            "valign": "bottom",
-                            "mirrory": True,
-                            }
-                        # Create an instance of your custom Font class
-                        custom_font = LineFont(**args)
-                        lines = custom_font.string(obj_content, frame, frame)
-                        #bbox = custom_font.bbox(lines)
-
-                        #width = bbox[2] - bbox[0] + 2 * frame
-                        #height = bbox[3] - bbox[1] + 2 * frame
-
-                        for line in lines:
-                            for i in range(len(line) - 1):
-                                x0, y0 = line[i]
-                                x1, y1 = line[i + 1]
-                                if x0 == x1 and y0 == y1:
-                                    x1 -= 0.5 * lw
-                                    y1 -= 0.5 * lw
-                                    x2 = x0 + 0.5 * lw
-                                    y2 = y0 + 0.5 * lw
-                                    painter.setPen(QPen(obj_color, obj_linewidth))
-                                    #painter.drawEllipse(adjusted_x + x0, adjusted_y + y0, x1-x2,y1-y2)
-                                    painter.drawPoint(adjusted_x + x0, adjusted_y + y0)
-                                else:
-                                    painter.setPen(QPen(obj_color, obj_linewidth))
-                                    painter.drawLine(adjusted_x + x0, adjusted_y + y0, adjusted_x + x1, adjusted_y + y1)
+            # Query the visible objects ordered by their Z-value
+            visible_objects = self.object_index.query(
+                left_margin, upper_margin, right_margin, lower_margin, front_margin)
+
+            # Draw the cached path of each object with a single call, the
+            # zoom and camera position are handled by the transform. While
+            # the view is moving, small text is skipped and far layers are
+            # drawn as bounding boxes.
+            text_min = LOD_TEXT_PIXELS / zoom if lod else 0
+            far = front_margin - LOD_DEPTH if lod else None
+            pen_key = None
+            for oid, x, y, z, pen, bounds, shape, height in visible_objects:
+                if height < text_min:
+                    continue
+                boxed = far is not None and z < far
+                key = ("gray", 1) if boxed else pen
+                if key != pen_key:
+                    painter.setPen(self.object_pen(*key))
+                    pen_key = key
+                if boxed:
+                    painter.setTransform(QTransform(
+                        zoom, 0, 0, zoom, -self.window_pos_x, -self.window_pos_y))
+                    painter.drawRect(self.bounds_rect(bounds))
+                    continue
+                painter.setTransform(QTransform(
+                    zoom, 0, 0, zoom,
+                    x * zoom - self.window_pos_x,
+                    y * zoom - self.window_pos_y))
+                painter.drawPath(self.object_path(shape))
 
         # End painting
         painter.end()
 
+        # Mosaic tiles in the viewport
+        for key in self.update_mosaic(left_margin, upper_margin, right_margin, lower_margin):
+            x, y = self.mosaic.tile_origin(key)
+            item = self.scene.addPixmap(self.mosaic_pixmaps[key])
+            item.setTransformationMode(Qt.SmoothTransformation)
+            item.setScale(self.mosaic.resolution * zoom)
+            item.setPos(x * zoom - self.window_pos_x, y * zoom - self.window_pos_y)
+
+        # Live camera frame on top of the images and below the objects
+        if self.live_frame is not None:
+            frame, x, y, scale = self.live_frame
+            item = self.scene.addPixmap(frame)
+            item.setTransformationMode(Qt.SmoothTransformation)
+            item.setOffset(-0.5 * frame.width(), -0.5 * frame.height())
+            item.setScale(scale * zoom)
+            item.setPos(x * zoom - self.window_pos_x, y * zoom - self.window_pos_y)
+
+        # Stage trajectory
+        if self.trajectory_path is not None:
+            item = self.scene.addPath(self.trajectory_path, self.object_pen("blue", 1))
+            item.setTransform(QTransform(zoom, 0, 0, zoom, -self.window_pos_x, -self.window_pos_y))
+
         # Create a QGraphicsPixmapItem and add it to the scene
         pixmap_item = QGraphicsPixmapItem(pixmap)
         self.scene.addItem(pixmap_item)
@@ -548,35 +664,599 @@ class ImageViewer(QGraphicsView):
         # Update the view
         self.setSceneRect(pixmap_item.boundingRect())
 
+    # Switch between retained scene and rebuild on every frame
+    def set_retained(self, retained):
+        self.retained = retained
+        self.scene.clear()
+        self.image_items = {}
+        self.object_items = {}
+        self.live_item = None
+        self.mosaic_items = {}
+        self.trajectory_item = None
+        self.scene_built = False
+        self.resetTransform()
+        self.update_camera_view()
+
+    # Create the layers of the persistent items. The items of the images
+    # and drawn objects are created once they get near the view.
+    def build_scene(self):
+        self.scene.clear()
+        self.image_items = {}
+        self.image_levels = {}
+        self.object_items = {}
+
+        # Drawn objects are always stacked on top of the images
+        self.image_layer = QGraphicsItemGroup()
+        self.image_layer.setZValue(0)
+        self.scene.addItem(self.image_layer)
+        self.object_layer = QGraphicsItemGroup()
+        self.object_layer.setZValue(1)
+        self.scene.addItem(self.object_layer)
+        self.mosaic_layer = QGraphicsItemGroup()
+        self.mosaic_layer.setZValue(0.25)
+        self.scene.addItem(self.mosaic_layer)
+        self.mosaic_items = {}
+        for key, pixmap in self.mosaic_pixmaps.items():
+            self.add_mosaic_item(key, pixmap)
+        self.live_item = None
+        if self.live_frame is not None:
+            self.show_live_frame()
+        self.trajectory_item = None
+        if self.trajectory_path is not None:
+            self.show_trajectory_path()
+
+        # Every z layer gets its own group, items within a layer are
+        # stacked in insertion order
+        self.image_groups = {}
+        self.object_groups = {}
+        self.box_items = {}
+        self.text_items = {}
+        self.text_heights = []
+        self.scene_lod = None
+        self.scene_text_min = 0
+        self.scene_covered = None
+
+        self.scene_built = True
+        self.scene_front = None
+        self.scene_objects_visible = None
+
+    def add_image_item(self, key, options):
+        item = QGraphicsPixmapItem()
+        item.setTransformationMode(Qt.SmoothTransformation)
+        if self.async_tiles:
+            # Images are loaded once they become visible
+            self.fit_image_item(item, self.placeholder(options['image_path']))
+        else:
+            self.set_image_level(item, key, options)
+        item.setPos(options['x'], options['y'])
+        item.setParentItem(self.layer_group(self.image_layer, self.image_groups, options['z']))
+        self.image_items[key] = item
+        return item
+
+    # Return the group holding all items of the layer z
+    def layer_group(self, parent, groups, z):
+        group = groups.get(z)
+        if group is None:
+            group = QGraphicsItemGroup(parent)
+            group.setZValue(z)
+            group.setVisible(self.scene_front is None or z < self.scene_front)
+            groups[z] = group
+        return group
+
+    # Load the pyramid level of an image matching the current zoom
+    def set_image_level(self, item, key, options):
+        path = options['image_path']
+        level = self.pyramid.select(path, self.image_size)
+        if level == self.image_levels.get(key):
+            return
+        level_path = self.pyramid.level_path(path, level)
+        if self.async_tiles:
+            pixmap = self.pixmap_cache.find(level_path)
+            if pixmap is None:
+                # Keep the current level until the new one arrives
+                x = options['x'] * self.zoom_factor - self.window_pos_x
+                y = options['y'] * self.zoom_factor - self.window_pos_y
+                self.request_tile(level_path, None, x, y)
+                if item.pixmap().isNull():
+                    self.fit_image_item(item, self.placeholder(path))
+                return
+        else:
+            pixmap = self.pixmap_cache.get(level_path)
+        self.fit_image_item(item, pixmap)
+        self.image_levels[key] = level
+
+    # Scale the pixmap of an image item to the unzoomed image size in
+    # world units
+    def fit_image_item(self, item, pixmap):
+        item.setPixmap(pixmap)
+        width = self.image_size[0] / self.zoom_factor
+        height = self.image_size[1] / self.zoom_factor
+        if not pixmap.isNull():
+            scale = min(width / pixmap.width(), height / pixmap.height())
+            item.setScale(scale)
+            item.setOffset(-0.5 * width / scale, -0.5 * height / scale)
+
+    # Return a small uniform pixmap with the aspect ratio of an image, if
+    # it is already known
+    def placeholder(self, path):
+        width, height = self.pyramid.sizes.get(path, (1, 1))
+        scale = 16 / max(width, height, 1)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        pixmap = self.placeholders.get(size)
+        if pixmap is None:
+            pixmap = QPixmap(*size)
+            pixmap.fill(self.placeholder_color)
+            self.placeholders[size] = pixmap
+        return pixmap
+
+    # Queue the decoding of an image file. Tiles nearest to the center of
+    # the viewport at screen position (x, y) are decoded first.
+    def request_tile(self, path, size, x, y):
+        key = (path, None if size is None else (round(size[0]), round(size[1])))
+        distance = math.hypot(x - self.window_size_x / 2, y - self.window_size_y / 2)
+        self.tile_loader.request(key, path, size, -int(distance))
+        self.tile_requests.add(key)
+
+    # Store a decoded tile and redraw once for all tiles arriving together
+    def tile_loaded(self, key, image):
+        path, size = key
+        self.pixmap_cache.insert(path, size, QPixmap.fromImage(image))
+        self.redraw.request()
+
+    def remove_image_item(self, key):
+        item = self.image_items.pop(key, None)
+        self.image_levels.pop(key, None)
+        if item is not None:
+            self.scene.removeItem(item)
+
+    # Show the images and drawn objects of a memory-mapped scene file. The
+    # spatial indices are read from the file as well.
+    def load_scene(self, path):
+        scene = SceneFile(path)
+        # A running import would add its images to the new scene
+        if self.manifest_loader is not None:
+            self.manifest_loader.stop()
+        self.tile_loader.clear()
+        self.data = scene.images
+        self.drawn_objects = scene.objects
+        self.image_index = scene.image_index()
+        self.object_index = scene.object_index()
+        self.index_built = True
+        self.scene_built = False
+        self.update_camera_view()
+
+    def save_scene(self, path):
+        write_scene(path, self.data, self.drawn_objects)
+
+    # Import the images of a manifest file in batches
+    def import_manifest(self, path):
+        if self.manifest_loader is not None:
+            self.manifest_loader.stop()
+        self.manifest_loader = ManifestLoader(self, path)
+        self.manifest_loader.failed.connect(self.manifest_failed)
+        self.manifest_loader.start()
+
+    def manifest_failed(self, message):
+        QMessageBox.warning(self, "Import Manifest", "%s\n%d images imported." % (
+            message, self.manifest_loader.count))
+
+    def import_manifest_dialog(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Import Manifest", "", "Manifest Files (*.jsonl)")
+        if file_path:
+            self.import_manifest(file_path)
+
+    def load_scene_dialog(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open Scene", "", "Scene Files (*.plt)")
+        if file_path:
+            try:
+                self.load_scene(file_path)
+            except (OSError, ValueError, RuntimeError) as error:
+                QMessageBox.warning(self, "Open Scene", str(error))
+
+    def save_scene_dialog(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Scene", "", "Scene Files (*.plt)")
+        if file_path:
+            try:
+                self.save_scene(file_path)
+            except (OSError, ValueError, RuntimeError) as error:
+                QMessageBox.warning(self, "Save Scene", str(error))
+
+    # Show the live frames of a camera writing into the FrameRing ring
+    def attach_camera(self, ring):
+        self.camera_ring = ring
+        self.camera_timer.start(self.camera_interval)
+
+    def detach_camera(self):
+        self.camera_timer.stop()
+        self.camera_ring = None
+        self.live_frame = None
+        if self.live_item is not None:
+            self.scene.removeItem(self.live_item)
+            self.live_item = None
+        self.redraw.request()
+
+    # Take the newest frame from the ring. The slot is read in place, the
+    # upload into a pixmap is the only copy of the frame.
+    def poll_camera(self):
+        frame = self.camera_ring.acquire_latest()
+        if frame is None:
+            return
+        scale = self.stage_scale
+        x = frame.x * scale
+        y = frame.y * scale
+        try:
+            pixmap = QPixmap.fromImage(frame.image)
+            self.mosaic.add_frame(frame.image, x, y, frame.pixel_size * scale)
+        finally:
+            self.camera_ring.release(frame)
+        self.live_frame = (pixmap, x, y, frame.pixel_size * scale)
+        self.update_trajectory()
+        if self.retained and self.scene_built:
+            self.show_live_frame()
+            self.update_mosaic(*self.view_bounds())
+        else:
+            self.redraw.request()
+
+    # Place the live frame at its stage position in the retained scene
+    def show_live_frame(self):
+        pixmap, x, y, scale = self.live_frame
+        if self.live_item is None:
+            # Between the images and the drawn objects
+            self.live_item = QGraphicsPixmapItem()
+            self.live_item.setTransformationMode(Qt.SmoothTransformation)
+            self.live_item.setZValue(0.5)
+            self.scene.addItem(self.live_item)
+        self.live_item.setPixmap(pixmap)
+        self.live_item.setOffset(-0.5 * pixmap.width(), -0.5 * pixmap.height())
+        self.live_item.setScale(scale)
+        self.live_item.setPos(x, y)
+
+    # Upload the dirty mosaic tiles within the world rectangle and return
+    # the keys of all tiles there. Tiles outside stay dirty until they
+    # scroll into view.
+    def update_mosaic(self, left, top, right, bottom):
+        keys = self.mosaic.keys_in(left, top, right, bottom)
+        for tile in self.mosaic.take_dirty(keys):
+            pixmap = QPixmap.fromImage(tile.image)
+            self.mosaic_pixmaps[tile.key] = pixmap
+            item = self.mosaic_items.get(tile.key)
+            if item is not None:
+                item.setPixmap(pixmap)
+            elif self.retained and self.scene_built:
+                self.add_mosaic_item(tile.key, pixmap)
+        return keys
+
+    def add_mosaic_item(self, key, pixmap):
+        item = QGraphicsPixmapItem(pixmap, self.mosaic_layer)
+        item.setScale(self.mosaic.resolution)
+        item.setPos(*self.mosaic.tile_origin(key))
+        self.mosaic_items[key] = item
+
+    def clear_mosaic(self):
+        self.mosaic.clear()
+        self.mosaic_pixmaps = {}
+        for item in self.mosaic_items.values():
+            self.scene.removeItem(item)
+        self.mosaic_items = {}
+        self.redraw.request()
+
+    # Show the stage positions of the PositionRecorder recorder as path
+    def show_trajectory(self, recorder):
+        self.trajectory = recorder
+        self.trajectory_count = 0
+        self.trajectory_time = 0.0
+        self.update_trajectory()
+
+    def hide_trajectory(self):
+        self.trajectory = None
+        self.trajectory_path = None
+        if self.trajectory_item is not None:
+            self.scene.removeItem(self.trajectory_item)
+            self.trajectory_item = None
+        self.redraw.request()
+
+    # Rebuild the path from the decimated samples if new samples arrived.
+    # Minimum and maximum of each bucket are kept, so the path stays true
+    # to the envelope of the motion for any length of the recording.
+    def update_trajectory(self):
+        recorder = self.trajectory
+        if recorder is None or len(recorder) == self.trajectory_count:
+            return
+        now = time.perf_counter()
+        if now - self.trajectory_time < TRACE_INTERVAL:
+            return
+        self.trajectory_time = now
+        self.trajectory_count = len(recorder)
+        indices = recorder.decimate(('x', 'y'), TRACE_POINTS)
+        scale = self.stage_scale
+        path = QPainterPath()
+        for i, (x, y) in enumerate(zip(recorder.take('x', indices), recorder.take('y', indices))):
+            if i:
+                path.lineTo(x * scale, y * scale)
+            else:
+                path.moveTo(x * scale, y * scale)
+        self.trajectory_path = path
+        if self.retained and self.scene_built:
+            self.show_trajectory_path()
+        else:
+            self.redraw.request()
+
+    def show_trajectory_path(self):
+        if self.trajectory_item is None:
+            # Between the live frame and the drawn objects
+            self.trajectory_item = QGraphicsPathItem()
+            self.trajectory_item.setPen(self.object_pen("blue", 1))
+            self.trajectory_item.setZValue(0.75)
+            self.scene.addItem(self.trajectory_item)
+        self.trajectory_item.setPath(self.trajectory_path)
+
+    # Visible rectangle (left, top, right, bottom) in world coordinates
+    def view_bounds(self):
+        zoom = self.zoom_factor
+        left = self.window_pos_x / zoom
+        top = self.window_pos_y / zoom
+        return (left, top, left + self.window_size_x / zoom,
+                top + self.window_size_y / zoom)
+
+    # Show the new levels of an image rebuilt in the background
+    def pyramid_built(self, path):
+        for level in self.pyramid.levels:
+            self.pixmap_cache.invalidate(self.pyramid.level_path(path, level))
+        self.redraw.request()
+
+    # Write the downscaled levels of all images and reload the scene
+    def build_pyramid(self):
+        self.pyramid.build_all(self.data)
+        self.scene_built = False
+        self.update_camera_view()
+
+    # Return the cached path of a shape tuple of the draw rows in
+    # object-local coordinates
+    def object_path(self, shape):
+        # Objects with equal shape share the same path
+        path = self.object_paths.get(shape)
+        if path is not None:
+            return path
+
+        path = QPainterPath()
+        kind = shape[0]
+        if kind == 'circle':
+            radius = shape[1]
+            path.addEllipse(QPointF(0, 0), radius, radius)
+        elif kind == 'rectangle':
+            width, height, angle = shape[1:]
+            path.addPolygon(QPolygonF([
+                QPointF(-width / 2, -height / 2),
+                QPointF(width / 2, -height / 2),
+                QPointF(width / 2, height / 2),
+                QPointF(-width / 2, height / 2),
+            ]))
+            path.closeSubpath()
+            path = QTransform().rotate(angle).map(path)
+        elif kind == 'line':
+            length, angle = shape[1:]
+            angle_rad = math.radians(angle)
+            path.moveTo(0, 0)
+            path.lineTo(length * math.cos(angle_rad), length * math.sin(angle_rad))
+        elif kind == 'text':
+            content, size = shape[1:]
+            frame = 0.3 * size
+            lines = self.line_font.string(content, frame, frame, size=size, width=size)
+
+            # Single points get a tiny segment to be drawn with the pen cap
+            for line in lines:
+                for i in range(len(line) - 1):
+                    x0, y0 = line[i]
+                    x1, y1 = line[i + 1]
+                    if x0 == x1 and y0 == y1:
+                        x1 += 1e-3
+                    path.moveTo(x0, y0)
+                    path.lineTo(x1, y1)
+        else:
+            raise RuntimeError("Unknown object type '%s'!" % kind)
+
+        self.object_paths[shape] = path
+        return path
+
+    # Return the cached pen of an object
+    def object_pen(self, color, linewidth):
+        key = (color, linewidth)
+        pen = self.object_pens.get(key)
+        if pen is None:
+            # Line widths are given in screen pixels independent of the zoom
+            pen = QPen(QColor(color), linewidth)
+            pen.setCosmetic(True)
+            self.object_pens[key] = pen
+        return pen
+
+    # Create the item of an object from its draw row. Items within a layer
+    # are stacked by object id, whenever they are created.
+    def add_object_item(self, row):
+        oid, x, y, z, pen, bounds, shape, height = row
+        item = QGraphicsPathItem(self.object_path(shape))
+        item.setPos(x, y)
+        item.setZValue(oid)
+        item.setPen(self.object_pen(*pen))
+        item.setParentItem(self.layer_group(self.object_layer, self.object_groups, z))
+        self.object_items[oid] = item
+        self.drop_box_item(z)
+        if height < math.inf:
+            self.text_items[oid] = height
+            insort(self.text_heights, (height, oid))
+            item.setVisible(height >= self.scene_text_min)
+
+    def remove_object_item(self, oid):
+        item = self.object_items.pop(oid, None)
+        if item is not None:
+            self.drop_box_item(item.parentItem().zValue())
+            self.scene.removeItem(item)
+        height = self.text_items.pop(oid, None)
+        if height is not None:
+            del self.text_heights[bisect_left(self.text_heights, (height, oid))]
+
+    # Return bounds [top, right, bot, left] as normalized rectangle
+    def bounds_rect(self, bounds):
+        top, right, bot, left = bounds
+        return QRectF(min(left, right), min(top, bot), abs(right - left), abs(bot - top))
+
+    # Return the item drawing the bounding boxes of all objects in layer z
+    def box_item(self, z):
+        item = self.box_items.get(z)
+        if item is None:
+            path = QPainterPath()
+            for row in self.object_index.layer_values(z):
+                path.addRect(self.bounds_rect(row[5]))
+            item = QGraphicsPathItem(path, self.object_layer)
+            item.setPen(self.object_pen("gray", 1))
+            item.setZValue(z)
+            item.setVisible(False)
+            self.box_items[z] = item
+        return item
+
+    def drop_box_item(self, z):
+        item = self.box_items.pop(z, None)
+        if item is not None:
+            self.scene.removeItem(item)
+
+    # Update the retained scene for the current camera view
+    def update_retained_view(self):
+        if not self.scene_built:
+            self.build_scene()
+
+        # Touch the layer groups only if the depth cutoff has changed
+        front_margin = self.window_pos_z + 1
+        if front_margin != self.scene_front:
+            for z, group in self.image_groups.items():
+                group.setVisible(z < front_margin)
+            self.scene_front = front_margin
+
+        zoom = self.zoom_factor
+        left = self.window_pos_x / zoom
+        top = self.window_pos_y / zoom
+        right = left + self.window_size_x / zoom
+        bottom = top + self.window_size_y / zoom
+        self.build_index()
+        if self.objects_visible:
+            self.cover_view(left, top, right, bottom)
+
+        # Simplified objects while the view is moving
+        lod = self.lod_enabled and self.interactive
+        self.update_object_lod(front_margin, lod)
+        self.update_text_lod(LOD_TEXT_PIXELS / zoom if lod else 0)
+
+        # Create the items of the visible images and swap their pyramid
+        # levels
+        self.tile_requests = set()
+        for key in self.image_index.query(left, top, right, bottom, front_margin):
+            options = self.data[key]
+            item = self.image_items.get(key)
+            if item is None:
+                item = self.add_image_item(key, options)
+            self.set_image_level(item, key, options)
+        self.tile_loader.retain(self.tile_requests)
+        self.pyramid_builder.update()
+        self.update_mosaic(left, top, right, bottom)
+
+        if self.objects_visible != self.scene_objects_visible:
+            self.object_layer.setVisible(self.objects_visible)
+            self.scene_objects_visible = self.objects_visible
+
+        # Pan and zoom are handled by the view transform only
+        self.setTransform(QTransform.fromScale(zoom, zoom))
+        self.setSceneRect(QRectF(left, top, right - left, bottom - top))
+
+
+    # Create the missing object items around the view. The covered
+    # rectangle extends the view by SCENE_MARGIN on each side, so panning
+    # creates new items only when it leaves this rectangle.
+    def cover_view(self, left, top, right, bottom):
+        covered = self.scene_covered
+        if covered is not None and covered[0] <= left and covered[1] <= top \
+                and covered[2] >= right and covered[3] >= bottom:
+            return
+        dx = SCENE_MARGIN * (right - left)
+        dy = SCENE_MARGIN * (bottom - top)
+        covered = (left - dx, top - dy, right + dx, bottom + dy)
+        groups = len(self.object_groups)
+        for row in self.object_index.query(*covered):
+            if row[0] not in self.object_items:
+                self.add_object_item(row)
+        # New layers get the level of detail with the next update
+        if len(self.object_groups) != groups:
+            self.scene_lod = None
+        self.scene_covered = covered
+
+    # Show far layers as bounding boxes in interactive mode. Anti-aliasing
+    # is turned off at the same time.
+    def update_object_lod(self, front, lod):
+        if (front, lod) == self.scene_lod:
+            return
+        far = front - LOD_DEPTH if lod else None
+        for z, group in self.object_groups.items():
+            boxes = far is not None and z < far
+            group.setVisible(z < front and not boxes)
+            if boxes:
+                self.box_item(z).setVisible(True)
+            elif z in self.box_items:
+                self.box_items[z].setVisible(False)
+        self.setRenderHint(QPainter.Antialiasing, not lod)
+        self.scene_lod = (front, lod)
+
+    # Hide the text items with a letter height below text_min. Only the
+    # items between the old and the new threshold are touched.
+    def update_text_lod(self, text_min):
+        old = self.scene_text_min
+        if text_min == old:
+            return
+        lower = bisect_left(self.text_heights, (min(old, text_min),))
+        upper = bisect_left(self.text_heights, (max(old, text_min),))
+        for height, oid in self.text_heights[lower:upper]:
+            self.object_items[oid].setVisible(height >= text_min)
+        self.scene_text_min = text_min
+
+    # Switch to simplified drawing until the input is idle
+    def begin_interaction(self):
+        self.interactive = True
+        self.idle_timer.start()
+
+    # Full quality pass after the last input event
+    def end_interaction(self):
+        self.interactive = False
+        self.redraw.request()
 
     # Override keyPressEvent for camera view movement
     def keyPressEvent(self, event):
-        # Handle arrow key presses
+        # Handle arrow key presses, the view is redrawn with the next frame
         if event.key() == Qt.Key_Left:
             self.window_pos_x = self.window_pos_x - self.window_step
-            self.update_camera_view()
+            self.begin_interaction()
+            self.redraw.request()
         elif event.key() == Qt.Key_Right:
             self.window_pos_x = self.window_pos_x + self.window_step
-            self.update_camera_view()
+            self.begin_interaction()
+            self.redraw.request()
         elif event.key() == Qt.Key_Up:
             self.window_pos_y = self.window_pos_y - self.window_step
-            self.update_camera_view()
+            self.begin_interaction()
+            self.redraw.request()
         elif event.key() == Qt.Key_Down:
             self.window_pos_y = self.window_pos_y + self.window_step
-            self.update_camera_view()
+            self.begin_interaction()
+            self.redraw.request()
+
+    # Change the zoom factor without redrawing the view
+    def scale_view(self, factor):
+        self.zoom_factor *= factor
+#        self.window_pos_x *= factor
+#        self.window_pos_y *= factor
+        self.image_size = (self.image_size[0] * factor, self.image_size[1] * factor)
 
     def zoom_in(self):
-        self.zoom_factor *= self.zoom_factor_in
-#        self.window_pos_x *= self.zoom_factor_in
-#        self.window_pos_y *= self.zoom_factor_in
-        self.image_size = (self.image_size[0] * self.zoom_factor_in, self.image_size[1] * self.zoom_factor_in)
+        self.scale_view(self.zoom_factor_in)
         self.update_camera_view()
 
     def zoom_out(self):
-        self.zoom_factor *= self.zoom_factor_out
-#        self.window_pos_x *= self.zoom_factor_out
-#        self.window_pos_y *= self.zoom_factor_out
-        self.image_size = (self.image_size[0] * self.zoom_factor_out, self.image_size[1] * self.zoom_factor_out)
+        self.scale_view(self.zoom_factor_out)
         self.update_camera_view()
 
     def go_to_home_view(self):
@@ -591,24 +1271,17 @@ class ImageViewer(QGraphicsView):
 
         for key, options in sorted_data:
             if options['z'] < self.window_pos_z:
-                if options['x'] < x_min:
-                    x_min = options['x']
-                    if options['y'] < y_min:
-                        y_min = options['y']
-                    elif options['y'] > y_max:
-                        y_max = options['y']
-                elif options['x'] > x_max:
-                    x_max = options['x']
-                    if options['y'] < y_min:
-                        y_min = options['y']
-                    elif options['y'] > y_max:
-                        y_max = options['y']
-        self.window_pos_x = x_min + (x_max - x_min)/2
-        self.window_pos_y = y_min + (y_max - y_min)/2
-        while (x_min < self.window_pos_x - self.window_size_x) or (x_max > self.window_pos_x + self.window_size_x):
-            self.zoom_out()
-        while (y_min < self.window_pos_y - self.window_size_y) or (y_max > self.window_pos_y + self.window_size_y):
-            self.zoom_out()
+                x_min = min(x_min, options['x'])
+                x_max = max(x_max, options['x'])
+                y_min = min(y_min, options['y'])
+                y_max = max(y_max, options['y'])
+        # Zoom out until the extent fits into the window, then center it.
+        # The window position is given in zoomed units.
+        while (x_max - x_min) * self.zoom_factor > self.window_size_x or \
+                (y_max - y_min) * self.zoom_factor > self.window_size_y:
+            self.scale_view(self.zoom_factor_out)
+        self.window_pos_x = (x_min + x_max) / 2 * self.zoom_factor - self.window_size_x / 2
+        self.window_pos_y = (y_min + y_max) / 2 * self.zoom_factor - self.window_size_y / 2
         self.update_camera_view()
 
     def draw_circle_dialog(self):
@@ -853,19 +1526,19 @@ class ImageViewer(QGraphicsView):
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
-        # Print the mouse coordinates to the console
+        # Show the mouse coordinates in the label
 #        self.mouse_cooridnates = [int(self.window_pos_x + event.x()) , int(self.window_pos_y + event.y())]
         self.mouse_cooridnates = [int(self.window_pos_x + event.x()/self.zoom_factor) , int(self.window_pos_y + event.y()/self.zoom_factor)]
         self.mouse_label.setText(f"Mouse Coordinates: X={self.mouse_cooridnates[0]}, Y={self.mouse_cooridnates[1]}")
-        print("Mouse Coordinates:", self.mouse_cooridnates, self.window_pos_x, self.window_pos_y, event.x(), event.y())
-        if event.buttons() == Qt.LeftButton and self.lasst_mouse_pos is not None:
+        if event.buttons() == Qt.LeftButton and self.last_mouse_pos is not None:
             delta = event.pos() - self.last_mouse_pos
 
             # Calculate the relative movement and adjust window positions
             self.window_pos_x -= delta.x()
             self.window_pos_y -= delta.y()
 
-            self.update_camera_view()
+            self.begin_interaction()
+            self.redraw.request()
 
             self.last_mouse_pos = event.pos()
         super().mouseMoveEvent(event)
@@ -879,11 +1552,14 @@ class ImageViewer(QGraphicsView):
         num_degrees = event.angleDelta().y() / 8
         num_steps = num_degrees / 15  # Number of 15-degree steps
 
+        # All steps of a fast scroll are merged into a single redraw
         for _ in range(abs(int(num_steps))):
             if num_steps > 0:
-                self.zoom_in()
+                self.scale_view(self.zoom_factor_in)
             else:
-                self.zoom_out()
+                self.scale_view(self.zoom_factor_out)
+        self.begin_interaction()
+        self.redraw.request()
 
     def resizeEvent(self, event):
         # Update the window_size_x whenever the widget is resized
@@ -892,6 +1568,6 @@ class ImageViewer(QGraphicsView):
         super().resizeEvent(event)
         # Update the position of the mouse_label when the viewer is resized
         self.mouse_label.move(10, self.height() - 25)
-        self.update_camera_view()
+        self.redraw.request()
 
 
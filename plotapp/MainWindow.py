@@ -15,7 +15,11 @@ from PyQt5.QtWidgets import QMenu, QToolBar, QMessageBox, QMainWindow, \
 
 from ImageViewer import ImageViewer
 from DataInputBox import DataInputBox
+from ParameterEditor import ParameterEditor
 from WarningBox import WarningBox
+from camera import FrameRing, SyntheticCamera
+from telemetry import TelemetryPoller
+from recorder import PositionRecorder
 import posdummy as PhoenixD_pos
 
 ###### FIX THIS!
@@ -26,6 +30,7 @@ from data_images import image_data
 
 # Global parameters
 MINSIZE = (500, 300)
+RECORD_RATE = 200.0     # Samples per second of the stage trajectory
 #DEFAULT_STYLE = "background-color: white; color: black"
 
 
@@ -62,8 +67,18 @@ class MainWindow(QMainWindow):
         #self.dataBox.setMinimumWidth(200)
         #self.dataBox.setMaximumWidth(300)
 
+        # Producer thread of the live camera frames and the poller
+        # recording the stage positions
+        self.camera = None
+        self.stage_poller = None
+
+        # Windows of the stage positions and the parameter table
+        self.pos_window = None
+        self.parameter_editor = None
+
         # Foot line widget
         self.footLine = WarningBox(self)
+        self.dataBox.journal.failed.connect(self.footLine.add_warning)
         #self.footLine.setMinimumHeight(20)
 
         # Initialize content for main window
@@ -117,6 +132,13 @@ class MainWindow(QMainWindow):
                                shortcut='Ctrl+2',
                                triggered=self.dataBox.save_values_as))
         menu.addSeparator()
+        menu.addAction(QAction('&Open scene', self,
+                               triggered=self.viewer.load_scene_dialog))
+        menu.addAction(QAction('Save scene &as', self,
+                               triggered=self.viewer.save_scene_dialog))
+        menu.addAction(QAction('&Import manifest', self,
+                               triggered=self.viewer.import_manifest_dialog))
+        menu.addSeparator()
         menu.addAction(QAction('E&xit', self,
                                shortcut='Ctrl+Q',
                                triggered=self.close))
@@ -126,12 +148,21 @@ class MainWindow(QMainWindow):
         menu = QMenu('&Action', self)
         menu.addAction(QAction('Detect layers', self,
                                shortcut='Ctrl+d'))
+        menu.addAction(QAction('Build image pyramid', self,
+                               triggered=self.viewer.build_pyramid))
         menu.addAction(QAction('Add Object', self,
                                shortcut='Ctrl+a',
                                triggered=self.viewer.add_object))
         menu.addAction(QAction('Positions', self,
                                shortcut='Ctrl+p',
                                triggered=self.show_positions_window))
+        menu.addAction(QAction('Parameter table', self,
+                               triggered=self.show_parameter_editor))
+        menu.addAction(QAction('Live camera', self,
+                               checkable=True,
+                               toggled=self.toggle_camera))
+        menu.addAction(QAction('Clear mosaic', self,
+                               triggered=self.viewer.clear_mosaic))
         menuBar.addMenu(menu)
 
         # Menu "Configuration"
@@ -174,21 +205,64 @@ class MainWindow(QMainWindow):
                                          'Do you want to save the changes?',
                                          QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
 
-            if reply == QMessageBox.Yes:
-                self.dataBox.save_values()
+            if reply == QMessageBox.Yes and self.dataBox.save_values():
                 event.accept()
             elif reply == QMessageBox.No:
+                self.dataBox.discard_changes()
                 event.accept()
             else:
                 event.ignore()
         else:
             event.accept()
 
+        if event.isAccepted():
+            if self.camera is not None:
+                self.camera.stop()
+                self.stage_poller.stop()
+            self.viewer.tile_loader.shutdown()
+            if self.parameter_editor is not None:
+                self.parameter_editor.close()
+
+    def toggle_camera(self, running):
+
+        """ Start or stop the synthetic camera feeding the viewer. """
+
+        if running and self.camera is None:
+            ring = FrameRing()
+            position = PhoenixD_pos.Position()
+            self.camera = SyntheticCamera(ring, position)
+            self.stage_poller = TelemetryPoller(position, RECORD_RATE, PositionRecorder())
+            self.viewer.attach_camera(ring)
+            self.viewer.show_trajectory(self.stage_poller.recorder)
+            self.camera.start()
+            self.stage_poller.start()
+        elif not running and self.camera is not None:
+            self.camera.stop()
+            self.stage_poller.stop()
+            self.stage_poller.recorder.flush()
+            self.stage_poller = None
+            self.viewer.detach_camera()
+            self.footLine.add_warning("Camera frames: %(written)d written, "
+                                      "%(dropped)d dropped" % self.camera.ring.stats())
+            self.camera = None
+
     def show_positions_window(self):
+        if self.pos_window is not None:
+            self.pos_window.close()
         position = PhoenixD_pos.Position()
         self.pos_window = PhoenixD_pos.Window(position)
         self.pos_window.show()
 
+    def show_parameter_editor(self):
+        if self.parameter_editor is None:
+            self.parameter_editor = ParameterEditor(data_specifications, data_values)
+            # Edits in the table go through the data box, which stores and
+            # journals them
+            self.parameter_editor.valueChanged.connect(
+                lambda key, value: self.dataBox.update_values({key: value}))
+        self.parameter_editor.show()
+        self.parameter_editor.raise_()
+
     '''
     # Create the zoom option for the image
     def zoomIn(self):
@@ -0,0 +1,289 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class ParameterEditor. It shows the parameters
+# of a data_specifications dictionary as table with one row per field,
+# which scales to machine configurations with thousands of entries. No
+# widget is created per parameter: the table reads the cells from the
+# ParameterModel on demand and the ParameterDelegate creates an editor
+# only for the cell being edited, depending on the type of its field.
+# Boolean parameters are shown as check boxes of the cell itself. The rows
+# are filtered by parameter name.
+#
+##########################################################################
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, \
+    QSortFilterProxyModel, pyqtSignal
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QTableView, \
+    QHeaderView, QStyledItemDelegate, QSpinBox, QDoubleSpinBox, QComboBox
+
+from fields import FieldRegistry
+
+# Global parameters
+ROW_HEIGHT = 22                         # Fixed row height in pixels
+INT_RANGE = (-2**31, 2**31 - 1)         # Range of QSpinBox
+FLOAT_RANGE = (-1e300, 1e300)           # Default range of QDoubleSpinBox
+FLOAT_DIGITS = 6                        # Default decimals of QDoubleSpinBox
+
+
+class ParameterModel(QAbstractTableModel):
+
+    HEADERS = ['Parameter', 'Value']
+    NAME, VALUE = range(2)
+
+    valueChanged = pyqtSignal(str, object)
+
+    def __init__(self, specifications, values, parent=None):
+
+        """ Table model of the parameters in specifications. The values
+        dictionary is edited in place, missing values show the default. """
+
+        super().__init__(parent)
+        self.fields = FieldRegistry(specifications)
+        self.rows = list(self.fields.values())
+        self.values = values
+
+
+    def rowCount(self, parent=QModelIndex()):
+
+        return 0 if parent.isValid() else len(self.rows)
+
+
+    def columnCount(self, parent=QModelIndex()):
+
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+
+    def field(self, index):
+
+        """ Return the field shown in the row of index. """
+
+        return self.rows[index.row()]
+
+
+    def value(self, field):
+
+        """ Return the current value of field. """
+
+        return self.values.get(field.key, field.default)
+
+
+    def data(self, index, role=Qt.DisplayRole):
+
+        if not index.isValid():
+            return None
+        field = self.rows[index.row()]
+        if index.column() == self.NAME:
+            if role == Qt.DisplayRole:
+                return field.name
+            if role == Qt.ToolTipRole:
+                return field.key
+            return None
+
+        value = self.value(field)
+        if field.type == bool:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if value else Qt.Unchecked
+            return None
+        if role == Qt.DisplayRole:
+            return field.validator.format(value)
+        if role == Qt.EditRole:
+            return value
+        if role == Qt.TextAlignmentRole and field.type in (int, float):
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+
+    def flags(self, index):
+
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        field = self.rows[index.row()]
+        if index.column() == self.VALUE and field.writable:
+            if field.type == bool:
+                flags |= Qt.ItemIsUserCheckable
+            else:
+                flags |= Qt.ItemIsEditable
+        return flags
+
+
+    def setData(self, index, value, role=Qt.EditRole):
+
+        if not index.isValid() or index.column() != self.VALUE:
+            return False
+        field = self.rows[index.row()]
+        if not field.writable:
+            return False
+        if role == Qt.CheckStateRole and field.type == bool:
+            value = value == Qt.Checked
+        elif role != Qt.EditRole:
+            return False
+        if field.validator.check(value) is not None:
+            return False
+        if self.value(field) == value and field.key in self.values:
+            return True
+
+        self.values[field.key] = value
+        self.dataChanged.emit(index, index, [role])
+        self.valueChanged.emit(field.key, value)
+        return True
+
+
+    def set_values(self, values):
+
+        """ Show another dictionary of values. """
+
+        self.beginResetModel()
+        self.values = values
+        self.endResetModel()
+
+
+    def update_values(self, keys):
+
+        """ Notify the views about values changed outside the model. """
+
+        for key in keys:
+            field = self.fields.get(key)
+            if field is not None:
+                index = self.index(field.index, self.VALUE)
+                self.dataChanged.emit(index, index)
+
+
+class ParameterDelegate(QStyledItemDelegate):
+
+    def __init__(self, parent=None):
+
+        """ Item delegate creating the editor of a value cell depending on
+        the type of its field. """
+
+        super().__init__(parent)
+
+
+    def source(self, index):
+
+        """ Return the ParameterModel and the field of index, which may
+        belong to a proxy model. """
+
+        model = index.model()
+        while isinstance(model, QSortFilterProxyModel):
+            index = model.mapToSource(index)
+            model = model.sourceModel()
+        return model, model.field(index)
+
+
+    def createEditor(self, parent, option, index):
+
+        model, field = self.source(index)
+        validator = field.validator
+        if field.type == int:
+            editor = QSpinBox(parent)
+            editor.setRange(INT_RANGE[0] if validator.min is None else max(validator.min, INT_RANGE[0]),
+                            INT_RANGE[1] if validator.max is None else min(validator.max, INT_RANGE[1]))
+        elif field.type == float:
+            editor = QDoubleSpinBox(parent)
+            editor.setDecimals(FLOAT_DIGITS if validator.digits is None else validator.digits)
+            editor.setRange(FLOAT_RANGE[0] if validator.min is None else validator.min,
+                            FLOAT_RANGE[1] if validator.max is None else validator.max)
+        elif field.type == list:
+            editor = QComboBox(parent)
+            editor.addItems(field.parameters[0])
+        elif field.type == str:
+            editor = QLineEdit(parent)
+            if validator.maxlen is not None:
+                editor.setMaxLength(validator.maxlen)
+        else:
+            return None
+        editor.setAutoFillBackground(True)
+        return editor
+
+
+    def setEditorData(self, editor, index):
+
+        model, field = self.source(index)
+        value = model.value(field)
+        if field.type in (int, float):
+            editor.setValue(value)
+        elif field.type == list:
+            editor.setCurrentText(field.validator.format(value))
+        else:
+            editor.setText(str(value))
+
+
+    def setModelData(self, editor, model, index):
+
+        source, field = self.source(index)
+        if field.type in (int, float):
+            editor.interpretText()
+            value = editor.value()
+        elif field.type == list:
+            value = editor.currentText()
+        else:
+            value = editor.text()
+        model.setData(index, value, Qt.EditRole)
+
+
+class ParameterEditor(QWidget):
+
+    valueChanged = pyqtSignal(str, object)
+
+    def __init__(self, specifications, values, parent=None):
+
+        """ Editor of the parameters in specifications with a name filter
+        above the table. The values dictionary is edited in place, each
+        accepted edit emits valueChanged(key, value). """
+
+        super().__init__(parent)
+        self.setWindowTitle('Parameters')
+
+        self.model = ParameterModel(specifications, values, self)
+        self.model.valueChanged.connect(self.valueChanged)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterKeyColumn(ParameterModel.NAME)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        self.filter = QLineEdit(self)
+        self.filter.setPlaceholderText('Filter by name')
+        self.filter.setClearButtonEnabled(True)
+        self.filter.textChanged.connect(self.proxy.setFilterFixedString)
+
+        # Fixed row heights and no resizing to contents, so the table never
+        # has to measure all rows
+        self.table = QTableView(self)
+        self.table.setModel(self.proxy)
+        self.table.setItemDelegate(ParameterDelegate(self.table))
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
+        self.table.setEditTriggers(QTableView.DoubleClicked | QTableView.EditKeyPressed |
+                                   QTableView.AnyKeyPressed | QTableView.SelectedClicked)
+        vertical = self.table.verticalHeader()
+        vertical.setVisible(False)
+        vertical.setSectionResizeMode(QHeaderView.Fixed)
+        vertical.setDefaultSectionSize(ROW_HEIGHT)
+        horizontal = self.table.horizontalHeader()
+        horizontal.setSectionResizeMode(ParameterModel.NAME, QHeaderView.Interactive)
+        horizontal.setStretchLastSection(True)
+        self.table.setColumnWidth(ParameterModel.NAME, 200)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.filter)
+        layout.addWidget(self.table)
+        self.resize(460, 500)
+
+
+    def set_filter(self, text):
+
+        """ Show only the parameters with text in their name. """
+
+        self.filter.setText(text)
@@ -0,0 +1,249 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the camera frame ingestion. A producer thread
+# writes frames tagged with the stage position into the preallocated
+# QImages of a FrameRing. The consumer always takes the newest frame and
+# reads it in place. Frames which are overwritten or skipped before they
+# were consumed are counted as dropped.
+#
+# SyntheticCamera is a stand-in for a real camera. It scans the dummy
+# stage of posdummy in a raster and renders a test pattern of the sample
+# at the stage position.
+#
+##########################################################################
+
+import math
+import time
+import threading
+
+from PyQt5.QtGui import QImage
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Global parameters
+FRAME_SIZE = (256, 256)
+RING_SIZE = 4
+PIXEL_SIZE = 4.0                        # µm per camera pixel
+
+# States of a ring slot
+FREE, WRITING, READY, READING = range(4)
+
+
+class Frame(object):
+
+    """ Frame handed to the consumer. The image is the ring slot itself and
+    must be released after use. """
+
+    __slots__ = ('slot', 'image', 'x', 'y', 'seq', 'timestamp', 'pixel_size')
+
+    def __init__(self, slot, image, x, y, seq, timestamp, pixel_size):
+
+        self.slot = slot
+        self.image = image
+        self.x = x
+        self.y = y
+        self.seq = seq
+        self.timestamp = timestamp
+        self.pixel_size = pixel_size
+
+
+class FrameRing(object):
+
+    def __init__(self, size=RING_SIZE, frame_size=FRAME_SIZE, pixel_size=PIXEL_SIZE,
+                 fmt=QImage.Format_Grayscale8):
+
+        """ Preallocate size frames of frame_size (width, height) pixels.
+        At least three slots are required, so the producer always finds a
+        slot while the consumer reads another one. """
+
+        if size < 3:
+            raise RuntimeError("A frame ring needs at least 3 slots!")
+        self.frame_size = tuple(frame_size)
+        self.pixel_size = pixel_size
+        self.lock = threading.Lock()
+        self.images = []
+        self.buffers = []
+        for i in range(size):
+            image = QImage(frame_size[0], frame_size[1], fmt)
+            image.fill(0)
+            bits = image.bits()
+            bits.setsize(image.sizeInBytes())
+            self.images.append(image)
+            self.buffers.append(memoryview(bits))
+        self.states = [FREE] * size
+        self.meta = [None] * size       # (x, y, seq, timestamp) of each slot
+        self.seq = 0
+        self.written = 0
+        self.consumed = 0
+        self.dropped = 0
+
+
+    def __len__(self):
+
+        return len(self.images)
+
+
+    def array(self, slot):
+
+        """ Return the pixel data of a slot as writable NumPy array of shape
+        (height, bytes per line) or as memoryview without NumPy. """
+
+        if np is None:
+            return self.buffers[slot]
+        image = self.images[slot]
+        return np.frombuffer(self.buffers[slot], np.uint8).reshape(
+            image.height(), image.bytesPerLine())
+
+
+    def begin_write(self):
+
+        """ Return a slot for the next frame. A free slot is preferred,
+        otherwise the oldest unconsumed frame is overwritten and counted
+        as dropped. """
+
+        with self.lock:
+            ready = None
+            for slot, state in enumerate(self.states):
+                if state == FREE:
+                    self.states[slot] = WRITING
+                    return slot
+                if state == READY and (ready is None or
+                                       self.meta[slot][2] < self.meta[ready][2]):
+                    ready = slot
+            self.states[ready] = WRITING
+            self.dropped += 1
+            return ready
+
+
+    def commit(self, slot, x, y, timestamp=None):
+
+        """ Publish the frame in slot taken at stage position (x, y). """
+
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        with self.lock:
+            self.seq += 1
+            self.meta[slot] = (x, y, self.seq, timestamp)
+            self.states[slot] = READY
+            self.written += 1
+
+
+    def acquire_latest(self):
+
+        """ Return the newest frame or None if there is no new frame. Older
+        unconsumed frames are skipped and counted as dropped. The frame
+        must be handed back with release(). """
+
+        with self.lock:
+            newest = None
+            for slot, state in enumerate(self.states):
+                if state == READY and (newest is None or
+                                       self.meta[slot][2] > self.meta[newest][2]):
+                    newest = slot
+            if newest is None:
+                return None
+            for slot, state in enumerate(self.states):
+                if state == READY and slot != newest:
+                    self.states[slot] = FREE
+                    self.dropped += 1
+            self.states[newest] = READING
+            self.consumed += 1
+            x, y, seq, timestamp = self.meta[newest]
+        return Frame(newest, self.images[newest], x, y, seq, timestamp, self.pixel_size)
+
+
+    def release(self, frame):
+
+        with self.lock:
+            self.states[frame.slot] = FREE
+
+
+    def stats(self):
+
+        """ Return a dictionary with the frame counters. """
+
+        with self.lock:
+            return {
+                "slots": len(self.images),
+                "written": self.written,
+                "consumed": self.consumed,
+                "dropped": self.dropped,
+                }
+
+
+class SyntheticCamera(threading.Thread):
+
+    def __init__(self, ring, position, fps=30.0, columns=8, overlap=0.2):
+
+        """ Producer thread writing frames into ring with the rate fps. The
+        dummy stage position is moved in a raster of columns frames per
+        row, neighbouring frames overlap by the given fraction. """
+
+        super().__init__(daemon=True)
+        self.ring = ring
+        self.position = position
+        self.interval = 1.0 / fps
+        self.columns = columns
+        width, height = ring.frame_size
+        self.step = ((1 - overlap) * width * ring.pixel_size,
+                     (1 - overlap) * height * ring.pixel_size)
+        self.origin = (position.x0, position.y0)
+        self.stopped = threading.Event()
+        self.count = 0
+
+
+    def stop(self):
+
+        self.stopped.set()
+        self.join()
+
+
+    def run(self):
+
+        start = time.perf_counter()
+        while not self.stopped.is_set():
+            # Move the dummy stage to the next raster position
+            column = self.count % self.columns
+            row = self.count // self.columns
+            if row % 2:
+                column = self.columns - 1 - column
+            self.position.x0 = self.origin[0] + column * self.step[0]
+            self.position.y0 = self.origin[1] + row * self.step[1]
+            x = self.position.xPosition
+            y = self.position.yPosition
+
+            slot = self.ring.begin_write()
+            self.render(slot, x, y)
+            self.ring.commit(slot, x, y)
+            self.count += 1
+
+            delay = start + self.count * self.interval - time.perf_counter()
+            if delay > 0:
+                self.stopped.wait(delay)
+
+
+    def render(self, slot, x, y):
+
+        """ Write the test pattern of the sample at stage position (x, y)
+        into a ring slot in place. """
+
+        ring = self.ring
+        width, height = ring.frame_size
+        pixel = ring.pixel_size
+        data = ring.array(slot)
+        if np is not None:
+            u = (x + pixel * (np.arange(width) - width / 2)) / 150.0
+            v = (y + pixel * (np.arange(height) - height / 2)) / 230.0
+            data[:, :width] = 128 + 100 * np.sin(u)[None, :] * np.cos(v)[:, None]
+        else:
+            stride = len(data) // height
+            for j in range(height):
+                level = int(128 + 100 * math.cos((y + pixel * (j - height / 2)) / 230.0))
+                data[j*stride:j*stride+width] = bytes((level,)) * width
@@ -0,0 +1,86 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the field registry of the DataInputBox. It is
+# built once from data_specifications and holds one Field per parameter
+# with its specification, its compiled validator, its position and its
+# editor widget. Fields are found by key or by widget in constant time.
+#
+##########################################################################
+
+from collections.abc import Mapping
+
+from validators import Validators
+
+
+class Field(object):
+
+    __slots__ = ('key', 'name', 'type', 'default', 'parameters', 'writable',
+                 'validator', 'index', 'widget')
+
+    def __init__(self, key, options, validator, index):
+
+        """ Field of the parameter key with the specification options and
+        its validator at position index of data_specifications. """
+
+        self.key = key
+        self.name = options['name']
+        self.type = options['type']
+        self.default = options['default']
+        self.parameters = options.get('parameters')
+        self.writable = options.get('writable', False)
+        self.validator = validator
+        self.index = index
+        self.widget = None
+
+
+    def __repr__(self):
+
+        return "Field(%r, %s)" % (self.key, self.type.__name__)
+
+
+class FieldRegistry(Mapping):
+
+    def __init__(self, specifications):
+
+        """ Build the fields of all parameters in specifications. """
+
+        self.validators = Validators(specifications)
+        self.fields = {key: Field(key, options, self.validators[key], index)
+                       for index, (key, options) in enumerate(specifications.items())}
+        self.widgets = {}               # widget -> field
+
+
+    def __getitem__(self, key):
+
+        return self.fields[key]
+
+
+    def __iter__(self):
+
+        return iter(self.fields)
+
+
+    def __len__(self):
+
+        return len(self.fields)
+
+
+    def bind(self, field, widget):
+
+        """ Register widget as editor of field. """
+
+        if field.widget is not None:
+            self.widgets.pop(field.widget, None)
+        field.widget = widget
+        self.widgets[widget] = field
+
+
+    def field_for(self, widget):
+
+        """ Return the field edited by widget or None. """
+
+        return self.widgets.get(widget)
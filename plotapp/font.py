@@ -5,9 +5,115 @@
 ##########################################################################
 
 import math
+from collections import OrderedDict
 #from fonttable import HP1345A
 from fonttable import HP1345A
 
+# Optional array backend
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class StrokeArray(object):
+
+    """ Polylines stored as one contiguous float array of points with
+    shape (n, 2) and an array of polyline start offsets with one extra
+    element marking the end. The object behaves like the list of
+    polylines with (x, y) tuples used by the list backend. """
+
+    def __init__(self, points, offsets):
+
+        self.points = points
+        self.offsets = offsets
+
+
+    @classmethod
+    def from_lines(cls, lines):
+
+        """ Return a StrokeArray for a list of polylines. """
+
+        lines = [line for line in lines]
+        lengths = [len(line) for line in lines]
+        offsets = np.zeros(len(lines)+1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        points = np.array([p for line in lines for p in line], dtype=float)
+        return cls(points.reshape(-1, 2), offsets)
+
+
+    @classmethod
+    def concatenate(cls, arrays, shifts=None):
+
+        """ Join several StrokeArrays. The optional shifts are added to the
+        x coordinates of the respective array. """
+
+        if not arrays:
+            return cls(np.zeros((0, 2)), np.zeros(1, dtype=np.int64))
+        points = np.concatenate([a.points for a in arrays])
+        if shifts is not None:
+            counts = [len(a.points) for a in arrays]
+            points[:,0] += np.repeat(np.asarray(shifts, dtype=float), counts)
+        lengths = np.concatenate([np.diff(a.offsets) for a in arrays])
+        offsets = np.zeros(len(lengths)+1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(points, offsets)
+
+
+    def __len__(self):
+
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, i):
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Polyline index out of range!")
+        return [tuple(p) for p in self.points[self.offsets[i]:self.offsets[i+1]].tolist()]
+
+
+    def __iter__(self):
+
+        points = [tuple(p) for p in self.points.tolist()]
+        offsets = self.offsets.tolist()
+        for i in range(len(offsets)-1):
+            yield points[offsets[i]:offsets[i+1]]
+
+
+    def tolist(self):
+
+        """ Return the polylines as list of lists of (x, y) tuples. """
+
+        return list(self)
+
+
+    def transform(self, matrix=None, dx=0.0, dy=0.0):
+
+        """ Return a new StrokeArray with all points multiplied by the 2x2
+        matrix and shifted by (dx, dy). """
+
+        points = self.points
+        if matrix is not None:
+            points = points @ np.asarray(matrix, dtype=float).T
+        if dx or dy:
+            points = points + (dx, dy)
+        elif matrix is None:
+            points = points.copy()
+        return StrokeArray(points, self.offsets)
+
+
+    def bbox(self):
+
+        """ Return the bounding box [xmin, ymin, xmax, ymax] or None if
+        there are no points. """
+
+        if not len(self.points):
+            return None
+        return self.points.min(axis=0).tolist() + self.points.max(axis=0).tolist()
+
+
 
 class Font(object):
 
@@ -27,7 +133,7 @@ class Font(object):
         "valign": ("top", "center", "base", "bottom"),
         }
 
-    def __init__(self, table=None, **kwargs):
+    def __init__(self, table=None, cache_size=1024, arrays=False, **kwargs):
 
         # Store default parameters modified by kwargs
         self.defaults = {k: v for k, v in self._defaults.items()}
@@ -40,6 +146,20 @@ class Font(object):
         else:
             self.table = table
 
+        # Return StrokeArrays instead of lists of polylines
+        if arrays and np is None:
+            raise RuntimeError("The array backend requires numpy!")
+        self.arrays = arrays
+
+        # Scaled and mirrored polylines with bounding box of each glyph
+        # and the most recently used string layouts
+        self.glyphs = {}
+        self.glyph_arrays = {}
+        self.layouts = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
 
     def parse(self, **kwargs):
 
@@ -61,26 +181,56 @@ class Font(object):
 
     def string(self, text, x0=0, y0=0, **kwargs):
 
+        """ Return the polylines of the text string. The result is cached
+        and shared between calls with equal arguments, it must not be
+        modified by the caller. """
+
+        key = (text, x0, y0) + tuple(sorted(kwargs.items()))
+        lines = self.layouts.get(key)
+        if lines is not None:
+            self.layouts.move_to_end(key)
+            self.hits += 1
+            return lines
+
         # Merge kwargs into the font parameters
-        args = self.parse(**kwargs)
+        args = self.parse(**kwargs) if kwargs else self.defaults
+        if self.arrays:
+            lines = self.layout_array(text, x0, y0, args)
+        else:
+            lines = self.layout(text, x0, y0, args)
 
-        # Polylines for the string scaled to font size
+        # Store the layout and drop the least recently used one
+        self.misses += 1
+        self.layouts[key] = lines
+        if len(self.layouts) > self.cache_size:
+            self.layouts.popitem(last=False)
+        return lines
+
+
+    def layout(self, text, x0, y0, args):
+
+        """ Return the polylines of the text string for the parameter
+        dictionary args. """
+
+        # Scaled and mirrored glyphs with their horizontal offset
         scale = float(args["size"]) / args["divisor"]
-        width = args["width"]
-        lines = self.strokes(text, scale, width)
-        #print("Init", self.bbox(lines))
-
-        # Apply mirror
-        if args["mirrorx"] and args["mirrory"]:
-            lines = self.flop(lines, 2)
-        elif args["mirrorx"]:
-            lines = self.mirror(lines, "x")
-        elif args["mirrory"]:
-            lines = self.mirror(lines, "y")
-        #print("Mirror", self.bbox(lines))
+        glyphs = self.glyph_string(text, scale, args["width"],
+                                   args["mirrorx"], args["mirrory"])
 
-        # Determine bounding box
-        bbox = self.bbox(lines)
+        # Determine bounding box from the glyph boxes
+        bbox = None
+        for lines, gbox, offset in glyphs:
+            if gbox is None:
+                continue
+            if bbox is None:
+                bbox = [gbox[0]+offset, gbox[1], gbox[2]+offset, gbox[3]]
+            else:
+                bbox[0] = min(bbox[0], gbox[0]+offset)
+                bbox[1] = min(bbox[1], gbox[1])
+                bbox[2] = max(bbox[2], gbox[2]+offset)
+                bbox[3] = max(bbox[3], gbox[3])
+        if bbox is None:
+            return []
 
         # Horizonal alignment offset
         if args["halign"] == "left":
@@ -100,44 +250,130 @@ class Font(object):
         else:
             dy = -0.5*(bbox[1] + bbox[3])
 
-        # Apply alignment offset
-        if dx or dy:
-            lines = self.shift(lines, dx, dy)
-        #print("Align", self.bbox(lines))
-
-        # Apply rotation
+        # Without rotation the global offset is applied in the same pass
         angle = args["rotate"]
+        if not angle:
+            dx += x0
+            dy += y0
+
+        # Place the glyphs and apply the alignment offset
+        lines = []
+        for glines, gbox, offset in glyphs:
+            ox = offset + dx
+            for line in glines:
+                lines.append([(x+ox, y+dy) for x, y in line])
+
+        # Apply rotation and global offset
         if angle:
             lines = self.rotate(lines, angle)
-        #print("Rotate", self.bbox(lines))
-
-        # Apply global offset
-        if x0 or y0:
-            lines = self.shift(lines, x0, y0)
-        #print("Global", self.bbox(lines))
+            if x0 or y0:
+                lines = self.shift(lines, x0, y0)
 
         # Return list of polylines
         return lines
 
 
-    def strokes(self, text, scale, width):
+    def layout_array(self, text, x0, y0, args):
 
-        lines = []
+        """ Return the polylines of the text string for the parameter
+        dictionary args as StrokeArray. All transformations are applied
+        to the whole point array at once. """
+
+        # Scaled and mirrored glyph arrays placed at their offsets
+        scale = float(args["size"]) / args["divisor"]
+        glyphs = self.glyph_string(text, scale, args["width"],
+                                   args["mirrorx"], args["mirrory"])
+        arrays = [self.glyph_array(c, scale, args["mirrorx"], args["mirrory"])
+                  for c in text if c != " "]
+        lines = StrokeArray.concatenate(arrays, [offset for _, _, offset in glyphs])
+
+        # Determine bounding box
+        bbox = lines.bbox()
+        if bbox is None:
+            return lines
+
+        # Horizonal alignment offset
+        if args["halign"] == "left":
+            dx = -bbox[0]
+        elif args["halign"] == "right":
+            dx = -bbox[2]
+        else:
+            dx = -0.5*(bbox[0] + bbox[2])
+
+        # Vertical alignment offset
+        if args["valign"] == "bottom":
+            dy = -bbox[1]
+        elif args["valign"] == "top":
+            dy = -bbox[3]
+        elif args["valign"] == "base":
+            dy = 0.0
+        else:
+            dy = -0.5*(bbox[1] + bbox[3])
+
+        # Apply alignment, rotation and global offset
+        lines.points += (dx, dy)
+        angle = args["rotate"]
+        if angle:
+            lines = self.rotate(lines, angle)
+        if x0 or y0:
+            lines.points += (x0, y0)
+        return lines
+
+
+    def glyph_array(self, c, scale, mirrorx=False, mirrory=False):
+
+        """ Return the cached glyph of the character c as StrokeArray. """
+
+        key = (c, scale, mirrorx, mirrory)
+        glyph = self.glyph_arrays.get(key)
+        if glyph is None:
+            lines, bbox = self.glyph(c, scale, mirrorx, mirrory)
+            glyph = self.glyph_arrays[key] = StrokeArray.from_lines(lines)
+        return glyph
+
+
+    def glyph(self, c, scale, mirrorx=False, mirrory=False):
+
+        """ Return the polylines of the character c scaled and mirrored at
+        the origin together with their bounding box. The result is taken
+        from the glyph cache. """
+
+        key = (c, scale, mirrorx, mirrory)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            if c not in self.table:
+                raise RuntimeError("Unknown character code %04X!" % ord(c))
+            fx = -scale if mirrorx else scale
+            fy = -scale if mirrory else scale
+            lines = [tuple((x*fx, y*fy) for x, y in line) for line in self.table[c]]
+            glyph = self.glyphs[key] = (lines, self.bbox(lines))
+        return glyph
+
+
+    def glyph_string(self, text, scale, width, mirrorx=False, mirrory=False):
+
+        """ Return a list of (polylines, bbox, offset) tuples with the cached
+        glyphs of the text string and their horizontal offsets. """
+
+        sign = -1 if mirrorx else 1
+        glyphs = []
         for i, c in enumerate(text):
 
             # Space character
             if c == " ":
                 continue
 
-            # Unknown character
-            if c not in self.table:
-                raise RuntimeError("Unknown character code %04X!" % ord(c))
+            lines, bbox = self.glyph(c, scale, mirrorx, mirrory)
+            glyphs.append((lines, bbox, sign*i*width))
+        return glyphs
+
 
-            # Add polylines of character
-            x = i*width
-            y = 0
-            lines += self.char(c, x, y, scale)
+    def strokes(self, text, scale, width):
 
+        lines = []
+        for lines_c, bbox, offset in self.glyph_string(text, scale, width):
+            for line in lines_c:
+                lines.append([(x+offset, y) for x, y in line])
         return lines
 
 
@@ -152,6 +388,9 @@ class Font(object):
 
     def bbox(self, lines):
 
+        if isinstance(lines, StrokeArray):
+            return lines.bbox()
+
         bbox = None
         for line in lines:
             for x, y in line:
@@ -167,6 +406,9 @@ class Font(object):
 
     def scale(self, lines, scale):
 
+        if isinstance(lines, StrokeArray):
+            return lines.transform(((scale, 0), (0, scale)))
+
         newlines = []
         for line in lines:
             line = [(scale*x, scale*y) for x, y in line]
@@ -176,6 +418,9 @@ class Font(object):
 
     def shift(self, lines, dx, dy):
 
+        if isinstance(lines, StrokeArray):
+            return lines.transform(None, dx, dy)
+
         newlines = []
         for line in lines:
             line = [(x+dx, y+dy) for x, y in line]
@@ -195,6 +440,9 @@ class Font(object):
         # Rotate by arbitrary angle
         sin = math.sin(angle*math.pi/180)
         cos = math.cos(angle*math.pi/180)
+        if isinstance(lines, StrokeArray):
+            return lines.transform(((cos, -sin), (sin, cos)))
+
         newlines = []
         for line in lines:
             line = [(x*cos-y*sin, x*sin+y*cos) for x, y in line]
@@ -207,12 +455,16 @@ class Font(object):
         num = int(num) % 4
         if num == 0:
             return lines
+
+        if isinstance(lines, StrokeArray):
+            matrix = (None, ((0, -1), (1, 0)), ((-1, 0), (0, -1)), ((0, 1), (-1, 0)))
+            return lines.transform(matrix[num])
         
         newlines = []
         for line in lines:
             if num == 1:
                 line = [(-y, x) for x, y in line]
-            if num == 2:
+            elif num == 2:
                 line = [(-x, -y) for x, y in line]
             else:
                 line = [(y, -x) for x, y in line]
@@ -227,6 +479,9 @@ class Font(object):
             raise RuntimeError("Unknown mirror axis '%s'!" % axis)
 
         horz = axis == "x"
+        if isinstance(lines, StrokeArray):
+            return lines.transform(((-1, 0), (0, 1)) if horz else ((1, 0), (0, -1)))
+
         newlines = []
         for line in lines:
             if horz:
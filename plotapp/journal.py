@@ -0,0 +1,234 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class ProfileJournal. It keeps unsaved edits
+# of a profile safe without rewriting the profile on every change. Edits
+# are collected in memory and appended to a write-ahead log
+# <profile>.journal once the debounce delay has passed, so a crash loses
+# at most the edits of one delay. Each journal line is one JSON object
+# {"key": ..., "value": ...}, later lines override earlier ones.
+#
+# When the journal has grown to COMPACT_ENTRIES lines, it is compacted:
+# the full set of values is written to <profile>.autosave and the journal
+# starts over. Saving the profile discards both files. Unsaved changes
+# left by a crash are recovered from them when the profile is opened.
+# If the files can't be written, the edits are kept in memory and the
+# signal failed is emitted once until writing succeeds again.
+#
+##########################################################################
+
+import os
+import json
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from profiles import read_profile, write_profile
+from validators import Validators
+
+# Global parameters
+AUTOSAVE_DELAY = 500                    # Debounce delay in ms
+COMPACT_ENTRIES = 200                   # Journal lines before compaction
+
+
+class ProfileJournal(QObject):
+
+    # Error message of the first failed write
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, snapshot, delay=AUTOSAVE_DELAY,
+                 compact_entries=COMPACT_ENTRIES, parent=None):
+
+        """ Journal of the profile file path. snapshot is a callable
+        returning the complete current values for compaction. """
+
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.compact_entries = compact_entries
+        self.pending = {}               # key -> value not yet written
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.flush)
+        self.flushes = 0
+        self.compactions = 0
+        self.errors = 0
+        self.error = None               # Last write error until a write succeeds
+        self.path = None
+        self.set_path(path)
+
+
+    @property
+    def journal_path(self):
+
+        return self.path + ".journal"
+
+
+    @property
+    def autosave_path(self):
+
+        return self.path + ".autosave"
+
+
+    def set_path(self, path):
+
+        """ Write the pending edits of the current profile and continue
+        with the profile path. """
+
+        if self.path is not None and not self.flush():
+            # Edits of the old profile must not end up in the new journal
+            self.pending = {}
+        self.path = path
+        self.entries = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as fp:
+                self.entries = sum(1 for line in fp)
+        except OSError:
+            pass
+
+
+    def record(self, key, value):
+
+        """ Note an edit. It is written when the debounce delay after the
+        first unwritten edit has passed, later edits of the same key
+        within the delay replace it. """
+
+        self.pending[key] = value
+        if not self.timer.isActive():
+            self.timer.start()
+
+
+    def clear(self):
+
+        """ Forget the edits not written yet. """
+
+        self.timer.stop()
+        self.pending = {}
+
+
+    def flush(self):
+
+        """ Append the pending edits to the journal. If this fails, they
+        are kept and written with the next edit. Return True on
+        success. """
+
+        self.timer.stop()
+        if not self.pending:
+            return True
+        try:
+            folder = os.path.dirname(self.journal_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as fp:
+                for key, value in self.pending.items():
+                    fp.write(json.dumps({"key": key, "value": value}) + "\n")
+                fp.flush()
+                os.fsync(fp.fileno())
+        except OSError as error:
+            # Lines written before the error are repeated next time,
+            # later lines override earlier ones
+            self.report(error)
+            return False
+        self.error = None
+        self.entries += len(self.pending)
+        self.pending = {}
+        self.flushes += 1
+        if self.entries >= self.compact_entries:
+            self.compact()
+        return True
+
+
+    def compact(self):
+
+        """ Write all current values to the autosave file and start an
+        empty journal. A crash in between leaves a journal which is
+        replayed on top of the new autosave file, with the same result. """
+
+        self.clear()
+        try:
+            write_profile(self.autosave_path, self.snapshot())
+        except OSError as error:
+            # The journal is kept and compaction is tried again with the
+            # next flush
+            self.report(error)
+            return
+        self.remove(self.journal_path)
+        self.entries = 0
+        self.compactions += 1
+
+
+    def discard(self):
+
+        """ Drop all unsaved edits, after the profile was saved or the
+        changes were rejected. """
+
+        self.clear()
+        self.remove(self.journal_path)
+        self.remove(self.autosave_path)
+        self.entries = 0
+
+
+    def recover(self, specifications):
+
+        """ Return the unsaved values left from an earlier session as
+        dictionary, which is empty if there are none. Values not valid for
+        the specifications, which may be given as compiled Validators, are
+        skipped. A journal line torn by a crash ends the replay. """
+
+        if not isinstance(specifications, Validators):
+            specifications = Validators(specifications)
+        values = {}
+        if os.path.exists(self.autosave_path):
+            try:
+                values.update(read_profile(self.autosave_path, specifications))
+            except RuntimeError:
+                pass
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                        key = entry['key']
+                        value = entry['value']
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    values[key] = value
+        except OSError:
+            pass
+
+        # Keep only the values that fit the specifications
+        return specifications.validate(values).values
+
+
+    def report(self, error):
+
+        """ Count a write error and emit failed for the first one after a
+        successful write. """
+
+        self.errors += 1
+        if self.error is None:
+            self.error = error
+            self.failed.emit("Unsaved changes can't be journaled: %s" % error)
+
+
+    def remove(self, path):
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+    def stats(self):
+
+        """ Return a dictionary with the journal counters. """
+
+        return {
+            "pending": len(self.pending),
+            "entries": self.entries,
+            "flushes": self.flushes,
+            "compactions": self.compactions,
+            "errors": self.errors,
+            }
@@ -0,0 +1,113 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class LayerIndex, a z-ordered map from layers
+# to the spatial index of the entries in each layer.
+#
+##########################################################################
+
+from bisect import bisect_left, insort
+
+from spatialindex import SpatialIndex
+
+
+class LayerIndex(object):
+
+    def __init__(self, cell=200.0):
+
+        """ Initialize an empty index. The entries of each layer are kept in
+        a spatial index with grid cells of the given size. """
+
+        self.cell = cell
+        self.zvalues = []               # Sorted z values of all layers
+        self.layers = {}                # z -> SpatialIndex
+        self.zmap = {}                  # key -> z
+
+
+    def __len__(self):
+
+        return len(self.zmap)
+
+
+    def __contains__(self, key):
+
+        return key in self.zmap
+
+
+    def insert(self, key, z, bounds, value=None):
+
+        """ Add or replace the entry key in layer z with bounds [top, right,
+        bot, left]. Queries return value, or key if value is None. """
+
+        if key in self.zmap:
+            self.remove(key)
+        layer = self.layers.get(z)
+        if layer is None:
+            layer = self.layers[z] = SpatialIndex(self.cell)
+            insort(self.zvalues, z)
+        layer.insert(key, bounds, value)
+        self.zmap[key] = z
+
+
+    def remove(self, key):
+
+        """ Remove the entry key and drop its layer if it became empty. """
+
+        z = self.zmap.pop(key)
+        layer = self.layers[z]
+        layer.remove(key)
+        if not len(layer):
+            del self.layers[z]
+            del self.zvalues[bisect_left(self.zvalues, z)]
+
+
+    def clear(self):
+
+        self.zvalues.clear()
+        self.layers.clear()
+        self.zmap.clear()
+
+
+    def below(self, front=None):
+
+        """ Return the z values of all layers below front in ascending order
+        or all layers if front is None. """
+
+        if front is None:
+            return list(self.zvalues)
+        return self.zvalues[:bisect_left(self.zvalues, front)]
+
+
+    def layer_values(self, z):
+
+        """ Return the values of all entries in layer z in insertion
+        order. """
+
+        layer = self.layers.get(z)
+        return layer.values() if layer is not None else []
+
+
+    def values(self, front=None):
+
+        """ Return the values of all entries below front ordered by layer
+        and insertion order. """
+
+        result = []
+        for z in self.below(front):
+            result += self.layers[z].values()
+        return result
+
+
+    def query(self, left, top, right, bottom, front=None):
+
+        """ Return the values of all entries below front overlapping the
+        rectangle. They are ordered by layer and insertion order, so no
+        sorting is required for drawing. """
+
+        result = []
+        for z in self.below(front):
+            result += self.layers[z].query(left, top, right, bottom)
+        return result
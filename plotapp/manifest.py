@@ -0,0 +1,160 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the streaming import of camera tile manifests.
+# A manifest is a text file with one JSON record per line:
+#
+#   {"key": "image_1", "image_path": "images/one.png", "x": 0, "y": 0, "z": 0}
+#
+# The optional item "bounds" [top, right, bot, left] defaults to a tile
+# of TILE_SIZE world units centered at (x, y). Coordinates and bounds
+# must be numbers, keys are used as strings. Blank lines and lines
+# starting with "#" are ignored. The records are read in batches, so only
+# one batch is held in memory besides the data of the viewer.
+#
+##########################################################################
+
+import json
+import math
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# Global parameters
+BATCH_SIZE = 1000
+TILE_SIZE = 100
+
+
+def is_number(value):
+
+    return isinstance(value, (int, float)) and not isinstance(value, bool) \
+        and math.isfinite(value)
+
+
+def parse_record(line, number):
+
+    """ Return (key, options) of a manifest line in the format of the
+    image_data dictionary. """
+
+    try:
+        record = json.loads(line)
+        options = {
+            'image_path': record['image_path'],
+            'x': record['x'],
+            'y': record['y'],
+            'z': record['z'],
+            }
+    except (ValueError, KeyError, TypeError) as error:
+        raise RuntimeError("Invalid manifest record in line %d: %s" % (number, error))
+    if not isinstance(options['image_path'], str):
+        raise RuntimeError("Invalid image path in line %d of the manifest!" % number)
+    for name in ('x', 'y', 'z'):
+        if not is_number(options[name]):
+            raise RuntimeError("Invalid coordinate %s in line %d of the manifest!" % (name, number))
+
+    bounds = record.get('bounds')
+    if bounds is None:
+        x, y, half = options['x'], options['y'], TILE_SIZE / 2
+        bounds = [y - half, x + half, y + half, x - half]
+    elif not isinstance(bounds, list) or len(bounds) != 4 or \
+            not all(is_number(value) for value in bounds):
+        raise RuntimeError("Invalid bounds in line %d of the manifest!" % number)
+    options['bounds'] = bounds
+    return str(record.get('key', "image_%d" % number)), options
+
+
+def read_manifest(path, batch_size=BATCH_SIZE):
+
+    """ Generator yielding the records of a manifest file as lists of
+    (key, options) with at most batch_size entries. The records before an
+    invalid line are yielded before its error is raised. """
+
+    batch = []
+    with open(path, "r", encoding="utf-8") as fp:
+        for number, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                batch.append(parse_record(line, number))
+            except RuntimeError:
+                if batch:
+                    yield batch
+                raise
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def write_manifest(path, image_data):
+
+    """ Write an image_data dictionary as manifest file. """
+
+    with open(path, "w", encoding="utf-8") as fp:
+        for key, options in image_data.items():
+            record = {'key': key}
+            record.update(options)
+            fp.write(json.dumps(record) + "\n")
+
+
+class ManifestLoader(QObject):
+
+    # Number of images imported so far
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(int)
+    # Error message, the import stops after the last valid record
+    failed = pyqtSignal(str)
+
+    def __init__(self, viewer, path, batch_size=BATCH_SIZE):
+
+        """ Feed the records of a manifest file to the ImageViewer viewer.
+        One batch is imported per pass of the event loop, so the view stays
+        responsive and the tiles show up while they are read. """
+
+        super().__init__(viewer)
+        self.viewer = viewer
+        self.batches = read_manifest(path, batch_size)
+        self.count = 0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.step)
+
+
+    def start(self):
+
+        self.timer.start(0)
+
+
+    def stop(self):
+
+        self.timer.stop()
+        self.batches.close()
+
+
+    @property
+    def running(self):
+
+        return self.timer.isActive()
+
+
+    def step(self):
+
+        """ Import the next batch of records. """
+
+        try:
+            batch = next(self.batches)
+        except StopIteration:
+            self.timer.stop()
+            self.finished.emit(self.count)
+            return
+        except (OSError, ValueError, RuntimeError) as error:
+            # Exceptions must not escape the timer slot
+            self.stop()
+            self.failed.emit(str(error))
+            return
+        self.viewer.add_images(batch)
+        self.count += len(batch)
+        self.progress.emit(self.count)
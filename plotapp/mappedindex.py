@@ -0,0 +1,234 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class MappedIndex, a layer index stored in
+# packed arrays, e.g. in a memory-mapped scene file. It answers the same
+# queries as a LayerIndex without building it first. The arrays are
+# written by pack_grid:
+#
+#   cell         grid cell size in world units
+#   layers       sorted z values of all layers
+#   layer_start  index of the first cell of each layer, one extra entry
+#   cells        codes of the occupied cells of each layer, sorted
+#   cell_start   index of the first key of each cell, one extra entry
+#   keys         keys of the entries in each cell in ascending order
+#
+# The keys ascend in insertion order, so sorting them restores the order
+# of a LayerIndex.
+#
+##########################################################################
+
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+from layerindex import LayerIndex
+
+# Global parameters
+GRID = ('cell', 'layers', 'layer_start', 'cells', 'cell_start', 'keys')
+TYPECODES = {'cell': 'd', 'layers': 'd', 'layer_start': 'Q', 'cells': 'Q',
+             'cell_start': 'Q', 'keys': 'q'}
+OFFSET = 2**31                          # Cell numbers are stored unsigned
+
+
+def cell_code(i, j):
+
+    """ Return the sortable code of the grid cell (i, j). """
+
+    return (i + OFFSET) << 32 | (j + OFFSET)
+
+
+def cell_of(code):
+
+    """ Return the grid cell (i, j) of a code. """
+
+    return (code >> 32) - OFFSET, (code & 0xffffffff) - OFFSET
+
+
+def pack_grid(entries, cell):
+
+    """ Return the dictionary of the arrays in GRID for an iterable of
+    entries (key, z, top, right, bot, left) with integer keys. """
+
+    floor = math.floor
+    layers = {}
+    for key, z, top, right, bot, left in entries:
+        cells = layers.get(z)
+        if cells is None:
+            cells = layers[z] = {}
+        i0, i1 = floor(min(left, right) / cell), floor(max(left, right) / cell)
+        j0, j1 = floor(min(top, bot) / cell), floor(max(top, bot) / cell)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                code = cell_code(i, j)
+                bucket = cells.get(code)
+                if bucket is None:
+                    cells[code] = [key]
+                else:
+                    bucket.append(key)
+
+    grid = {name: array(TYPECODES[name]) for name in GRID}
+    grid['cell'].append(cell)
+    for z in sorted(layers):
+        cells = layers[z]
+        grid['layers'].append(z)
+        grid['layer_start'].append(len(grid['cells']))
+        for code in sorted(cells):
+            grid['cells'].append(code)
+            grid['cell_start'].append(len(grid['keys']))
+            grid['keys'].extend(sorted(cells[code]))
+    grid['layer_start'].append(len(grid['cells']))
+    grid['cell_start'].append(len(grid['keys']))
+    return grid
+
+
+class MappedIndex(object):
+
+    def __init__(self, grid, bounds, value=None):
+
+        """ Index of the entries stored in the arrays of grid. bounds(key)
+        returns the bounds [top, right, bot, left] of a stored entry and
+        value(key) the value returned by the queries. Entries inserted
+        later are kept in a LayerIndex, stored entries which were replaced
+        or removed are hidden. """
+
+        self.grid = grid
+        self.cell = grid['cell'][0]
+        self.bounds = bounds
+        self.value = value
+        self.number = {z: n for n, z in enumerate(grid['layers'])}
+        self.added = LayerIndex(self.cell)
+        self.removed = set()            # Hidden stored keys
+
+
+    def insert(self, key, z, bounds, value=None):
+
+        """ Add or replace the entry key in layer z with bounds [top, right,
+        bot, left]. Queries return value, or key if value is None. """
+
+        self.removed.add(key)
+        self.added.insert(key, z, bounds, value)
+
+
+    def remove(self, key):
+
+        """ Remove the entry key. """
+
+        self.removed.add(key)
+        if key in self.added:
+            self.added.remove(key)
+
+
+    def clear(self):
+
+        self.number = {}                # No stored layer is visited
+        self.added.clear()
+        self.removed.clear()
+
+
+    def below(self, front=None):
+
+        """ Return the z values of all layers below front in ascending order
+        or all layers if front is None. """
+
+        zvalues = set(self.number)
+        zvalues.update(self.added.below(front))
+        zvalues = sorted(zvalues)
+        if front is None:
+            return zvalues
+        return zvalues[:bisect_left(zvalues, front)]
+
+
+    def stored_keys(self, cells):
+
+        """ Return the stored keys in the cells at the given positions in
+        ascending order. """
+
+        grid = self.grid
+        cell_start = grid['cell_start']
+        keys = grid['keys']
+        found = set()
+        for c in cells:
+            found.update(keys[cell_start[c]:cell_start[c+1]])
+        found.difference_update(self.removed)
+        return sorted(found)
+
+
+    def values_of(self, keys):
+
+        """ Return the values of a list of stored keys. """
+
+        if self.value is None:
+            return keys
+        value = self.value
+        return [value(key) for key in keys]
+
+
+    def layer_values(self, z):
+
+        """ Return the values of all entries in layer z in insertion
+        order. """
+
+        result = []
+        n = self.number.get(z)
+        if n is not None:
+            layer_start = self.grid['layer_start']
+            result = self.values_of(self.stored_keys(range(layer_start[n], layer_start[n+1])))
+        return result + self.added.layer_values(z)
+
+
+    def values(self, front=None):
+
+        """ Return the values of all entries below front ordered by layer
+        and insertion order. """
+
+        result = []
+        for z in self.below(front):
+            result += self.layer_values(z)
+        return result
+
+
+    def query(self, left, top, right, bottom, front=None):
+
+        """ Return the values of all entries below front overlapping the
+        rectangle ordered by layer and insertion order. The cells of each
+        column of the rectangle are found by bisection, or the occupied
+        cells of a layer are scanned if there are fewer of them. """
+
+        grid = self.grid
+        codes = grid['cells']
+        layer_start = grid['layer_start']
+        cell = self.cell
+        i0, j0 = math.floor(left / cell), math.floor(top / cell)
+        i1, j1 = math.floor(right / cell), math.floor(bottom / cell)
+
+        result = []
+        for z in self.below(front):
+            n = self.number.get(z)
+            if n is not None:
+                start, stop = layer_start[n], layer_start[n+1]
+                if i1 - i0 + 1 <= stop - start:
+                    cells = []
+                    for i in range(i0, i1 + 1):
+                        lo = bisect_left(codes, cell_code(i, j0), start, stop)
+                        cells.extend(range(lo, bisect_right(codes, cell_code(i, j1), lo, stop)))
+                else:
+                    cells = []
+                    for c in range(start, stop):
+                        i, j = cell_of(codes[c])
+                        if i0 <= i <= i1 and j0 <= j <= j1:
+                            cells.append(c)
+
+                keys = []
+                for key in self.stored_keys(cells):
+                    y0, x1, y1, x0 = self.bounds(key)
+                    if min(x0, x1) < right and max(x0, x1) > left and \
+                            min(y0, y1) < bottom and max(y0, y1) > top:
+                        keys.append(key)
+                result += self.values_of(keys)
+            if z in self.added.layers:
+                result += self.added.layers[z].query(left, top, right, bottom)
+        return result
@@ -0,0 +1,252 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class Mosaic. It stitches camera frames into
+# a persistent grid of fixed-size tiles. Every frame is blended into the
+# tiles it overlaps, which are updated in place and marked dirty. The
+# viewer uploads the dirty tiles only, so the cost of a redraw depends on
+# the size of the viewport and not on the number of frames.
+#
+# With NumPy, overlapping frames are blended by a weighted average with
+# weights falling off towards the frame edges. The weight of each pixel is
+# limited, so newer frames keep their influence. Without NumPy every frame
+# simply replaces the overlapped region.
+#
+##########################################################################
+
+from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtGui import QImage, QPainter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Global parameters
+TILE_SIZE = 256                         # Tile width and height in pixels
+MAX_WEIGHT = 8.0                        # Limit of the blending weight
+FEATHER = 8                             # Edge ramp is 1/FEATHER of a frame
+
+
+class MosaicTile(object):
+
+    __slots__ = ('key', 'image', 'pixels', 'sum', 'weight')
+
+    def __init__(self, key, size):
+
+        """ Tile with the grid index key (column, row). The image is
+        transparent until a frame covers it. """
+
+        self.key = key
+        self.image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+        self.image.fill(0)
+        if np is not None:
+            bits = self.image.bits()
+            bits.setsize(self.image.sizeInBytes())
+            self.pixels = np.frombuffer(bits, np.uint32).reshape(size, size)
+            self.sum = np.zeros((size, size), np.float32)
+            self.weight = np.zeros((size, size), np.float32)
+        else:
+            self.pixels = self.sum = self.weight = None
+
+
+class Mosaic(object):
+
+    def __init__(self, tile_size=TILE_SIZE, resolution=None, max_weight=MAX_WEIGHT):
+
+        """ Initialize an empty mosaic. The resolution in world units per
+        mosaic pixel defaults to the pixel size of the first frame. """
+
+        self.tile_size = tile_size
+        self.resolution = resolution
+        self.max_weight = max_weight
+        self.tiles = {}                 # (column, row) -> MosaicTile
+        self.dirty = set()              # Keys of tiles changed since take_dirty()
+        self.feathers = {}              # (width, height) -> weight array
+        self.frames = 0
+
+
+    def __len__(self):
+
+        return len(self.tiles)
+
+
+    def __contains__(self, key):
+
+        return key in self.tiles
+
+
+    def __getitem__(self, key):
+
+        return self.tiles[key]
+
+
+    def clear(self):
+
+        self.tiles = {}
+        self.dirty = set()
+        self.frames = 0
+
+
+    def add_frame(self, image, x, y, scale):
+
+        """ Blend the QImage image centered at world position (x, y) into
+        the mosaic. scale is the size of a frame pixel in world units. The
+        image is read in place unless it must be converted or resampled. """
+
+        if self.resolution is None:
+            self.resolution = scale
+        if image.format() != QImage.Format_Grayscale8:
+            image = image.convertToFormat(QImage.Format_Grayscale8)
+        factor = scale / self.resolution
+        if abs(factor - 1) > 1e-3:
+            image = image.scaled(max(1, round(image.width() * factor)),
+                                 max(1, round(image.height() * factor)),
+                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        width, height = image.width(), image.height()
+
+        # Frame position in mosaic pixels
+        left = round(x / self.resolution - width / 2)
+        top = round(y / self.resolution - height / 2)
+
+        size = self.tile_size
+        keys = [(i, j) for j in range(top // size, (top + height - 1) // size + 1)
+                for i in range(left // size, (left + width - 1) // size + 1)]
+        if np is None:
+            for key in keys:
+                self.paint_tile(self.tile(key), image, left, top)
+        else:
+            bits = image.constBits()
+            bits.setsize(image.sizeInBytes())
+            frame = np.frombuffer(bits, np.uint8).reshape(
+                height, image.bytesPerLine())[:, :width]
+            weight = self.feather(width, height)
+            for key in keys:
+                self.blend_tile(self.tile(key), frame, weight, left, top)
+        self.dirty.update(keys)
+        self.frames += 1
+        return keys
+
+
+    def tile(self, key):
+
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self.tiles[key] = MosaicTile(key, self.tile_size)
+        return tile
+
+
+    def feather(self, width, height):
+
+        """ Return the blending weights of a frame. They rise linearly from
+        the edges and are 1 in the inner part of the frame. """
+
+        weight = self.feathers.get((width, height))
+        if weight is None:
+            ramp = max(1, min(width, height) // FEATHER)
+            u = np.arange(width)
+            u = np.minimum(np.minimum(u + 1, width - u), ramp)
+            v = np.arange(height)
+            v = np.minimum(np.minimum(v + 1, height - v), ramp)
+            weight = np.minimum.outer(v, u).astype(np.float32) / ramp
+            self.feathers[(width, height)] = weight
+        return weight
+
+
+    def overlap(self, tile, left, top, width, height):
+
+        """ Return the slices of the frame and of the tile covering their
+        common region. """
+
+        size = self.tile_size
+        x0 = tile.key[0] * size
+        y0 = tile.key[1] * size
+        x1 = max(left, x0)
+        x2 = min(left + width, x0 + size)
+        y1 = max(top, y0)
+        y2 = min(top + height, y0 + size)
+        return ((slice(y1 - top, y2 - top), slice(x1 - left, x2 - left)),
+                (slice(y1 - y0, y2 - y0), slice(x1 - x0, x2 - x0)))
+
+
+    def blend_tile(self, tile, frame, weight, left, top):
+
+        # Weighted running average of all frames covering a pixel
+        height, width = frame.shape
+        src, dst = self.overlap(tile, left, top, width, height)
+        w = weight[src]
+        total = tile.weight[dst]
+        value = tile.sum[dst]
+        total += w
+        value += w * frame[src]
+        excess = total > self.max_weight
+        if excess.any():
+            factor = np.where(excess, self.max_weight / total, 1.0)
+            total *= factor
+            value *= factor
+
+        # Opaque gray pixels, the region is fully covered by the frame
+        gray = (value / total + 0.5).astype(np.uint32)
+        np.minimum(gray, 255, out=gray)
+        tile.pixels[dst] = 0xff000000 | gray * 0x010101
+
+
+    def paint_tile(self, tile, image, left, top):
+
+        # Without NumPy the frame replaces the overlapped region
+        size = self.tile_size
+        painter = QPainter(tile.image)
+        painter.drawImage(QPoint(left - tile.key[0] * size, top - tile.key[1] * size), image)
+        painter.end()
+
+
+    def take_dirty(self, keys=None):
+
+        """ Return the dirty tiles and mark them clean. If keys is given,
+        only tiles with these keys are returned. """
+
+        if keys is None:
+            dirty = self.dirty
+            self.dirty = set()
+        else:
+            dirty = self.dirty.intersection(keys)
+            self.dirty -= dirty
+        return [self.tiles[key] for key in dirty]
+
+
+    def keys_in(self, left, top, right, bottom):
+
+        """ Return the keys of the existing tiles overlapping the world
+        rectangle. The cost is bounded by the size of the rectangle. """
+
+        if self.resolution is None:
+            return []
+        extent = self.tile_size * self.resolution
+        columns = range(int(left // extent), int(right // extent) + 1)
+        rows = range(int(top // extent), int(bottom // extent) + 1)
+        if len(columns) * len(rows) > len(self.tiles):
+            return [key for key in self.tiles if key[0] in columns and key[1] in rows]
+        return [(i, j) for j in rows for i in columns if (i, j) in self.tiles]
+
+
+    def tile_origin(self, key):
+
+        """ Return the world position of the top left corner of a tile. """
+
+        extent = self.tile_size * self.resolution
+        return key[0] * extent, key[1] * extent
+
+
+    def stats(self):
+
+        """ Return a dictionary with the mosaic counters. """
+
+        return {
+            "frames": self.frames,
+            "tiles": len(self.tiles),
+            "dirty": len(self.dirty),
+            "tile_size": self.tile_size,
+            }
@@ -0,0 +1,481 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class ObjectStore, a columnar storage of the
+# objects drawn in the ImageViewer. Each shape type has its own set of
+# typed array columns, colors are interned in a palette and single
+# objects are accessed through lightweight ObjectRecord handles.
+#
+# For drawing, the objects are read in bulk from whole columns as draw
+# rows, plain tuples
+#
+#   (oid, x, y, z, (color, linewidth), bounds, shape, text height)
+#
+# The shape tuple starts with the shape type followed by the parameters
+# of the path, e.g. ('circle', radius). It is the same for all objects of
+# equal shape. The text height is the letter height of text objects and
+# infinite for all other types.
+#
+##########################################################################
+
+import math
+from array import array
+from itertools import repeat
+from operator import itemgetter
+
+# Parameter columns of the shape types besides the common columns
+SHAPES = {
+    'circle': ('radius',),
+    'rectangle': ('height', 'width', 'angle'),
+    'line': ('length', 'angle'),
+    'text': ('letter_height', 'angle'),
+    }
+KINDS = tuple(SHAPES)
+COMMON = ('x', 'y', 'z', 'linewidth')
+BOUNDS = ('top', 'right', 'bot', 'left')
+DELETED = 255
+
+
+def to_array(typecode, buffer):
+
+    """ Return a copy of a buffer as typed array. """
+
+    result = array(typecode)
+    if isinstance(buffer, memoryview):
+        buffer = buffer.cast('B')
+    result.frombytes(buffer)
+    return result
+
+
+class ShapeTable(object):
+
+    def __init__(self, kind):
+
+        """ Initialize empty columns for the shape type kind. """
+
+        self.kind = kind
+        self.names = COMMON + SHAPES[kind] + BOUNDS
+        self.columns = {name: array('d') for name in self.names}
+        self.color = array('H')         # Index into the palette
+        self.oid = array('q')            # Object id of each row
+        self.content = [] if kind == 'text' else None
+        self.deleted = 0                # Unused rows of removed objects
+
+
+    def __len__(self):
+
+        return len(self.oid)
+
+
+class ObjectRecord(object):
+
+    """ Handle of a single object in an ObjectStore. It supports the item
+    access of the dictionaries formerly used for drawn objects. """
+
+    __slots__ = ('store', 'oid')
+
+    def __init__(self, store, oid):
+
+        self.store = store
+        self.oid = oid
+
+
+    def __getitem__(self, name):
+
+        return self.store.get(self.oid, name)
+
+
+    def __setitem__(self, name, value):
+
+        self.store.set(self.oid, name, value)
+
+
+    def __contains__(self, name):
+
+        return name in self.keys()
+
+
+    def __eq__(self, other):
+
+        return isinstance(other, ObjectRecord) and \
+            other.store is self.store and other.oid == self.oid
+
+
+    def __hash__(self):
+
+        return hash((id(self.store), self.oid))
+
+
+    def __repr__(self):
+
+        return repr(self.to_dict())
+
+
+    def get(self, name, default=None):
+
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
+    def keys(self):
+
+        return self.store.keys(self.oid)
+
+
+    def to_dict(self):
+
+        """ Return the object as dictionary. """
+
+        return {name: self[name] for name in self.keys()}
+
+
+class ObjectStore(object):
+
+    def __init__(self, objects=()):
+
+        """ Initialize the store with an iterable of object dictionaries. """
+
+        self.tables = {kind: ShapeTable(kind) for kind in KINDS}
+        self.palette = []               # Interned color strings
+        self.palette_index = {}         # Color string -> palette index
+        self.kinds = bytearray()        # Object id -> kind index or DELETED
+        self.rows = array('q')          # Object id -> row in the table
+        self.count = 0
+        self.mapped = False             # Columns are read-only buffers
+        self.extend(objects)
+
+
+    @classmethod
+    def from_buffers(cls, tables, palette, kinds, rows, count):
+
+        """ Return a store using the given buffers without copying them,
+        e.g. memoryviews of a memory-mapped scene file. tables maps each
+        shape type to a dictionary with its column buffers and the keys
+        'color', 'oid' and for text 'content'. The buffers are copied on
+        the first modification of the store. """
+
+        store = cls()
+        for kind, buffers in tables.items():
+            table = store.tables[kind]
+            table.columns = {name: buffers[name] for name in table.names}
+            table.color = buffers['color']
+            table.oid = buffers['oid']
+            if table.content is not None:
+                table.content = buffers['content']
+        store.palette = list(palette)
+        store.palette_index = {color: i for i, color in enumerate(store.palette)}
+        store.kinds = kinds
+        store.rows = rows
+        store.count = count
+        store.mapped = True
+        for table in store.tables.values():
+            table.deleted = None        # Counted on the first removal
+        return store
+
+
+    def detach(self):
+
+        """ Replace read-only buffers by private arrays. """
+
+        if not self.mapped:
+            return
+        for table in self.tables.values():
+            table.columns = {name: to_array('d', column)
+                             for name, column in table.columns.items()}
+            table.color = to_array('H', table.color)
+            table.oid = to_array('q', table.oid)
+            if table.content is not None:
+                table.content = list(table.content)
+        self.kinds = bytearray(self.kinds)
+        self.rows = to_array('q', self.rows)
+        self.mapped = False
+
+
+    def __len__(self):
+
+        return self.count
+
+
+    def __iter__(self):
+
+        """ Iterate over the records of all objects in insertion order. """
+
+        for oid, kind in enumerate(self.kinds):
+            if kind != DELETED:
+                yield ObjectRecord(self, oid)
+
+
+    def __repr__(self):
+
+        counts = ", ".join("%d %s" % (len(self.tables[kind]), kind) for kind in KINDS)
+        return "ObjectStore(%d objects: %s)" % (self.count, counts)
+
+
+    def color_index(self, color):
+
+        """ Return the palette index of a color string. """
+
+        index = self.palette_index.get(color)
+        if index is None:
+            index = self.palette_index[color] = len(self.palette)
+            self.palette.append(color)
+        return index
+
+
+    def append(self, obj):
+
+        """ Add an object dictionary with the keys used by the ImageViewer
+        and return its record. """
+
+        kind = obj['type']
+        if kind not in SHAPES:
+            raise RuntimeError("Unknown object type '%s'!" % kind)
+
+        self.detach()
+        table = self.tables[kind]
+        oid = len(self.kinds)
+        for name in COMMON + SHAPES[kind]:
+            table.columns[name].append(obj[name])
+        for name, value in zip(BOUNDS, obj['bounds']):
+            table.columns[name].append(value)
+        table.color.append(self.color_index(obj['color']))
+        if table.content is not None:
+            table.content.append(obj['content'])
+        table.oid.append(oid)
+
+        self.kinds.append(KINDS.index(kind))
+        self.rows.append(len(table) - 1)
+        self.count += 1
+        return ObjectRecord(self, oid)
+
+
+    def extend(self, objects):
+
+        """ Add an iterable of object dictionaries. """
+
+        for obj in objects:
+            self.append(obj)
+
+
+    def add_columns(self, kind, columns, color, content=None):
+
+        """ Add many objects of one shape type at once. columns maps the
+        column names (common, shape and bounds columns) to sequences or
+        arrays of equal length. color is a single color string or a
+        sequence of them, content the sequence of strings of text
+        objects. Return the range of the new object ids. """
+
+        if kind not in SHAPES:
+            raise RuntimeError("Unknown object type '%s'!" % kind)
+        self.detach()
+        table = self.tables[kind]
+
+        num = None
+        for name in table.names:
+            if name not in columns:
+                raise RuntimeError("Missing column '%s' for %s objects!" % (name, kind))
+            values = columns[name]
+            if hasattr(values, 'tolist'):
+                values = values.tolist()
+            if num is None:
+                num = len(values)
+            elif len(values) != num:
+                raise RuntimeError("Column '%s' has wrong length!" % name)
+            table.columns[name].extend(values)
+
+        if isinstance(color, str):
+            table.color.extend([self.color_index(color)] * num)
+        else:
+            table.color.extend(self.color_index(c) for c in color)
+        if table.content is not None:
+            if content is None or len(content) != num:
+                raise RuntimeError("Text objects need one content string each!")
+            table.content.extend(content)
+
+        first = len(self.kinds)
+        start = len(table.oid)
+        table.oid.extend(range(first, first + num))
+        self.kinds.extend([KINDS.index(kind)] * num)
+        self.rows.extend(range(start, start + num))
+        self.count += num
+        return range(first, first + num)
+
+
+    def record(self, oid):
+
+        """ Return the record of the object id. """
+
+        return ObjectRecord(self, oid)
+
+
+    def records(self, kind=None):
+
+        """ Return the records of all objects of the given shape type in
+        insertion order or of all objects if kind is None. """
+
+        if kind is None:
+            return list(self)
+        table = self.tables[kind]
+        return [ObjectRecord(self, oid) for oid in table.oid
+                if self.kinds[oid] != DELETED]
+
+
+    def remove(self, record):
+
+        """ Remove the object of a record. The table row is left unused
+        until the unused rows of the table outnumber the used ones. """
+
+        table, row = self.locate(record.oid)
+        self.detach()
+        self.kinds[record.oid] = DELETED
+        self.count -= 1
+        if table.deleted is None:
+            table.deleted = sum(1 for oid in table.oid if self.kinds[oid] == DELETED)
+        else:
+            table.deleted += 1
+        if 2 * table.deleted > len(table):
+            self.compact(table)
+
+
+    def compact(self, table):
+
+        """ Drop the unused rows of a shape table. The object ids are kept,
+        only their rows change. """
+
+        kinds = self.kinds
+        keep = [row for row, oid in enumerate(table.oid) if kinds[oid] != DELETED]
+        table.columns = {name: array('d', [column[row] for row in keep])
+                         for name, column in table.columns.items()}
+        table.color = array('H', [table.color[row] for row in keep])
+        table.oid = array('q', [table.oid[row] for row in keep])
+        if table.content is not None:
+            table.content = [table.content[row] for row in keep]
+        rows = self.rows
+        for row, oid in enumerate(table.oid):
+            rows[oid] = row
+        table.deleted = 0
+
+
+    def clear(self):
+
+        self.__init__()
+
+
+    def locate(self, oid):
+
+        """ Return the table and row of an object id. """
+
+        if oid >= len(self.kinds) or self.kinds[oid] == DELETED:
+            raise KeyError("Unknown object id %d!" % oid)
+        return self.tables[KINDS[self.kinds[oid]]], self.rows[oid]
+
+
+    def keys(self, oid):
+
+        """ Return the dictionary keys of an object. """
+
+        table, row = self.locate(oid)
+        keys = ('type',) + COMMON + SHAPES[table.kind] + ('color', 'bounds')
+        if table.content is not None:
+            keys += ('content',)
+        return keys
+
+
+    def get(self, oid, name):
+
+        """ Return a single value of an object. """
+
+        table, row = self.locate(oid)
+        if name == 'type':
+            return table.kind
+        if name == 'color':
+            return self.palette[table.color[row]]
+        if name == 'bounds':
+            return [table.columns[b][row] for b in BOUNDS]
+        if name == 'content' and table.content is not None:
+            return table.content[row]
+        column = table.columns.get(name)
+        if column is None:
+            raise KeyError(name)
+        return column[row]
+
+
+    def set(self, oid, name, value):
+
+        """ Change a single value of an object. The shape type can't be
+        changed. """
+
+        self.detach()
+        table, row = self.locate(oid)
+        if name == 'color':
+            table.color[row] = self.color_index(value)
+        elif name == 'bounds':
+            for b, v in zip(BOUNDS, value):
+                table.columns[b][row] = v
+        elif name == 'content' and table.content is not None:
+            table.content[row] = value
+        elif name in table.columns:
+            table.columns[name][row] = value
+        else:
+            raise KeyError(name)
+
+
+    def table_rows(self, table, start=0, stop=None):
+
+        """ Return the draw rows of the rows start to stop of a shape
+        table. Unused rows are skipped. """
+
+        stop = len(table) if stop is None else stop
+        columns = {name: column[start:stop] for name, column in table.columns.items()}
+        palette = self.palette
+        pens = zip([palette[c] for c in table.color[start:stop]], columns['linewidth'])
+        bounds = zip(*[columns[name] for name in BOUNDS])
+        kind = repeat(table.kind)
+        if table.kind == 'circle':
+            shapes = zip(kind, columns['radius'])
+        elif table.kind == 'rectangle':
+            shapes = zip(kind, columns['width'], columns['height'], columns['angle'])
+        elif table.kind == 'line':
+            shapes = zip(kind, columns['length'], columns['angle'])
+        else:
+            content = [table.content[row] for row in range(start, stop)]
+            shapes = zip(kind, content, columns['letter_height'])
+        heights = columns['letter_height'] if table.kind == 'text' else repeat(math.inf)
+
+        oids = table.oid[start:stop]
+        rows = list(zip(oids, columns['x'], columns['y'], columns['z'], pens,
+                        bounds, shapes, heights))
+        if table.deleted != 0:
+            kinds = self.kinds
+            rows = [row for row in rows if kinds[row[0]] != DELETED]
+        return rows
+
+
+    def draw_rows(self, oids=None):
+
+        """ Return the draw rows of all objects ordered by object id or of
+        the object ids in a range returned by add_columns. """
+
+        if oids is None:
+            rows = []
+            for table in self.tables.values():
+                rows += self.table_rows(table)
+            rows.sort(key=itemgetter(0))
+            return rows
+        if not oids:
+            return []
+        table, row = self.locate(oids[0])
+        return self.table_rows(table, row, row + len(oids))
+
+
+    def draw_row(self, oid):
+
+        """ Return the draw row of a single object. """
+
+        table, row = self.locate(oid)
+        return self.table_rows(table, row, row + 1)[0]
@@ -0,0 +1,164 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class PixmapCache, a bounded cache of decoded
+# and scaled image files with least recently used eviction.
+#
+##########################################################################
+
+import os
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap
+
+
+class PixmapCache(object):
+
+    def __init__(self, max_bytes=256*1024*1024, check_mtime=True):
+
+        """ Initialize an empty cache with a budget of max_bytes for the
+        pixel data of all cached pixmaps. If check_mtime is True, the
+        modification time of the file is compared on every lookup and
+        outdated entries are dropped. """
+
+        self.max_bytes = max_bytes
+        self.check_mtime = check_mtime
+        self.entries = OrderedDict()    # (path, size) -> (pixmap, mtime, nbytes)
+        self.sizes = {}                 # path -> set of cached sizes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def get(self, path, size=None):
+
+        """ Return the image file path as QPixmap scaled to size (width,
+        height) keeping the aspect ratio. The full resolution image is
+        returned if size is None. """
+
+        pixmap = self.find(path, size)
+        if pixmap is not None:
+            return pixmap
+
+        self.misses += 1
+        pixmap = QPixmap(path)
+        if size is not None and not pixmap.isNull():
+            pixmap = pixmap.scaled(*self.round(size), Qt.KeepAspectRatio)
+        self.insert(path, size, pixmap)
+        return pixmap
+
+
+    def find(self, path, size=None):
+
+        """ Return the cached pixmap of the image file path at size or None
+        if it is not cached. The file is never decoded here. """
+
+        size = self.round(size)
+        key = (path, size)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        mtime = self.mtime(path) if self.check_mtime else None
+        if entry[1] != mtime:
+            self.invalidate(path)
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+
+    def insert(self, path, size, pixmap):
+
+        """ Store a pixmap of the image file path decoded elsewhere, e.g. by
+        a TileLoader. """
+
+        mtime = self.mtime(path) if self.check_mtime else None
+        self.put((path, self.round(size)), pixmap, mtime)
+
+
+    def round(self, size):
+
+        if size is None:
+            return None
+        return (round(size[0]), round(size[1]))
+
+
+    def put(self, key, pixmap, mtime):
+
+        """ Store a pixmap and evict least recently used entries until the
+        byte budget is met. Pixmaps larger than the budget are not
+        stored. """
+
+        nbytes = pixmap.width() * pixmap.height() * pixmap.depth() // 8
+        if nbytes > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[2]
+        self.entries[key] = (pixmap, mtime, nbytes)
+        self.sizes.setdefault(key[0], set()).add(key[1])
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            old_key, old = self.entries.popitem(last=False)
+            self.nbytes -= old[2]
+            self.forget(old_key)
+            self.evictions += 1
+
+
+    def forget(self, key):
+
+        """ Update the bookkeeping after an entry was removed. """
+
+        path, size = key
+        sizes = self.sizes[path]
+        sizes.discard(size)
+        if not sizes:
+            del self.sizes[path]
+
+
+    def invalidate(self, path=None):
+
+        """ Drop all cached sizes of the given image file or the whole
+        cache if path is None. """
+
+        if path is None:
+            self.entries.clear()
+            self.sizes.clear()
+            self.nbytes = 0
+            return
+
+        for size in self.sizes.pop(path, ()):
+            entry = self.entries.pop((path, size))
+            self.nbytes -= entry[2]
+
+
+    def mtime(self, path):
+
+        """ Return the modification time of the file or None if it does not
+        exist. """
+
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+
+    def stats(self):
+
+        """ Return a dictionary with the cache counters. """
+
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -5,6 +5,11 @@ import sys
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 
+from telemetry import TelemetryPoller
+
+# Refresh rate of the window in updates per second
+REFRESH_RATE = 30.0
+
 """
 Window Layout:
     
@@ -57,9 +62,59 @@ class Position(object):
         return 1e-3 * (self.shutter * 20.0 + 30.0)
 
 
+class PositionModel(QAbstractTableModel):
+    
+    """ Fixed table of the axis labels, reference and current values. The
+    cells hold the display strings, only cells whose string changes emit
+    dataChanged. """
+    
+    HEADERS = ['', 'Reference', 'Values']
+    LABELS = ['Stage x', 'Stage y', 'Stage z', 'DHM OPL', 'DHM Δt', 'DHM Shutter']
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cells = [[label, '', ''] for label in self.LABELS]
+        
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.cells)
+    
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.cells[index.row()][index.column()]
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+    
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    
+    def setColumn(self, column, texts):
+        
+        """ Set the strings of a column and notify the views about the
+        changed cells only. """
+        
+        for row, text in enumerate(texts):
+            if self.cells[row][column] != text:
+                self.cells[row][column] = text
+                index = self.index(row, column)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+
 class Window(QMainWindow):
     
-    def __init__(self, position: Position):
+    def __init__(self, position: Position, rate: float = REFRESH_RATE):
         super().__init__()
         self.pos = position
         self.absolute = True
@@ -70,6 +125,15 @@ class Window(QMainWindow):
         
         self.win = self.initWindow()
         
+        # The stage is read on a background thread only, the window
+        # shows the latest snapshot of all axes
+        self.poller = TelemetryPoller(position, rate)
+        self.poller.start()
+        self.shown = None
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(round(1000 / rate))
+        
         self.update()
         
     
@@ -85,81 +149,63 @@ class Window(QMainWindow):
         self.setCentralWidget(self.central_widget)
 
         layout = QVBoxLayout()
-        self.tableWidget = QTableWidget()
-        layout.addWidget(self.tableWidget)
+        self.model = PositionModel(self)
+        self.tableView = QTableView()
+        self.tableView.setModel(self.model)
+        layout.addWidget(self.tableView)
         self.central_widget.setLayout(layout)
 
         self.createTable()
-        self.addButtonsToTable()
+        self.addButtons(layout)
+        self.resize(460, 270)
         
 
     def createTable(self):
-        # Set number of rows and columns
-        self.tableWidget.setRowCount(3)
-        self.tableWidget.setColumnCount(3)
-        
-        # Hide row and column labels
-        self.tableWidget.verticalHeader().setVisible(False)
-        self.tableWidget.horizontalHeader().setVisible(False)
+        # Hide row labels and grid
+        self.tableView.verticalHeader().setVisible(False)
+        self.tableView.setShowGrid(False)
+        self.tableView.setSelectionMode(QAbstractItemView.NoSelection)
+        self.tableView.setFocusPolicy(Qt.NoFocus)
+        self.tableView.setWordWrap(False)
         
         # Set stretch to make the table occupy the whole window
-        self.tableWidget.horizontalHeader().setStretchLastSection(True)
-        self.tableWidget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-
-        # Set section resize mode for vertical header
-        header = self.tableWidget.verticalHeader()
-        header.setSectionResizeMode(0, QHeaderView.Fixed)  # First row fixed height
-        header.setSectionResizeMode(1, QHeaderView.Stretch)  # Rest of the rows stretch
-        header.setSectionResizeMode(2, QHeaderView.Stretch)  # Rest of the rows stretch
-
-        # Set the initial sizes
-        self.tableWidget.setRowHeight(0, 30)  # Fixed height for the first row
-        self.tableWidget.setRowHeight(1, 100)
-        self.tableWidget.setRowHeight(2, 50)
-        self.tableWidget.setColumnWidth(0, 70)
-        self.tableWidget.setColumnWidth(1, 125)
-        self.tableWidget.setColumnWidth(2, 125)
-
-        # Add labels to specific cells
-        self.reference_title_label = QTableWidgetItem("Reference")
-        self.values_title_label = QTableWidgetItem("Values")
-
-        self.tableWidget.setItem(0, 1, self.reference_title_label)
-        self.tableWidget.setItem(0, 2, self.values_title_label)
+        header = self.tableView.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        self.tableView.verticalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
 
 
-    def addButtonsToTable(self):
-        # Button set Reference
+    def addButtons(self, layout):
+        # Button set Reference below the reference column
         self.button_set = QPushButton("Set")
         self.button_set.clicked.connect(lambda: self.setReference())
-        self.tableWidget.setCellWidget(2, 1, self.button_set)
-
-        # Create a layout to hold the buttons
-        self.buttonLayout = QHBoxLayout()
 
         # Button set Absolute
         self.button_abs = QPushButton("Abs")
         self.button_abs.clicked.connect(lambda: self.setAbsolute())
-        self.buttonLayout.addWidget(self.button_abs)
 
         # Button set Relative
         self.button_rel = QPushButton("Rel")
         self.button_rel.clicked.connect(lambda: self.setRelative())
-        self.buttonLayout.addWidget(self.button_rel)
 
-        # Set the layout as the widget for the cell
-        cellWidget = QWidget()
-        cellWidget.setLayout(self.buttonLayout)
-        self.tableWidget.setCellWidget(2, 2, cellWidget)
+        # Create a layout to hold the buttons
+        self.buttonLayout = QHBoxLayout()
+        self.buttonLayout.addStretch(1)
+        self.buttonLayout.addWidget(self.button_set, 1)
+        self.buttonLayout.addWidget(self.button_abs)
+        self.buttonLayout.addWidget(self.button_rel)
+        layout.addLayout(self.buttonLayout)
 
     
     def setReference(self):
         print(f"Button setReference clicked")
-        self.x0 = self.pos.xPosition
-        self.y0 = self.pos.yPosition
-        self.z0 = self.pos.zPosition
-        self.m0 = self.pos.oplMotorPosition
-        self.absoute = False
+        snap = self.poller.snapshot
+        if snap is None:
+            return
+        self.x0 = snap.x
+        self.y0 = snap.y
+        self.z0 = snap.z
+        self.m0 = snap.opl
+        self.absolute = False
         self.update()
     
     
@@ -177,18 +223,33 @@ class Window(QMainWindow):
         self.update()
 
 
-    def update(self):
+    def refresh(self):
         
-        """ Read current properties from position object and display them. """
+        """ Display the latest snapshot if the poller has a new one. """
         
-        x = self.pos.xPosition
-        y = self.pos.yPosition
-        z = self.pos.zPosition
-        m = self.pos.oplMotorPosition
-        s = self.pos.shutter
-        t = self.pos.shutterTime
+        snap = self.poller.snapshot
+        if snap is not None and snap.seq != self.shown:
+            self.update()
+
+
+    def update(self):
         
+        """ Display the latest snapshot of the position object. """
+        
+        snap = self.poller.snapshot
         hasRef = self.x0 is not None
+        if snap is None:
+            self.showContent(None, None, None, None, None, None, None, None,
+                             None, None, hasRef)
+            return
+        self.shown = snap.seq
+        
+        x = snap.x
+        y = snap.y
+        z = snap.z
+        m = snap.opl
+        s = snap.shutter
+        t = snap.shutter_time
 
         if not hasRef or self.absolute:
             x0 = None
@@ -212,43 +273,26 @@ class Window(QMainWindow):
         
         """ Display given data in window. Gray out / deactivate the <rel>
         button if hasRef is False. """
-        if not hasRef:
-            self.button_rel.setVisible(False)
-        else:
-            self.button_rel.setVisible(True)
-
-         # Create a list of lists containing labels and values for each cell
-        items = [
-            ['Stage x',  f'{x0:.3f} µm' if x0 is not None else '', f'{x:.3f} µm' if x is not None else ''],     # µm
-            ['Stage y',  f'{y0:.3f} µm' if y0 is not None else '', f'{y:.3f} µm' if y is not None else ''],     # µm
-            ['Stage z',  f'{z0:.3f} µm' if z0 is not None else '', f'{z:.3f} µm' if z is not None else ''],     # µm
-            ['DHM OPL',  f'{w0:.3f} µm' if w0 is not None else '', f'{m:.3f} µm' if m is not None else ''],     # µm
-            ['DHM Δt', '', f'{t:.3f} ms' if t is not None else ''],     # ms
-            ['DHM Shutter', '', s]            # 
-        ]
-
-        cell_text = ''
-        ref_text = ''   
-        value_text = ''
+        
+        self.button_rel.setVisible(hasRef)
 
-        # Loop through the items and set the data in the table
-        for label, ref, value in items:
-            cell_text += f'{label}\n'
-            ref_text += f'{ref}\n'
-            value_text += f'{value}\n'
+        def um(value):
+            return f'{value:.3f} µm' if value is not None else ''
 
-        # Create QTableWidgetItem for each string and set them in the table
-        cell_item = QTableWidgetItem()
-        ref_item = QTableWidgetItem()
-        value_item = QTableWidgetItem()
+        self.model.setColumn(1, [um(x0), um(y0), um(z0), um(w0), '', ''])
+        self.model.setColumn(2, [um(x), um(y), um(z), um(m),
+                                 f'{t:.3f} ms' if t is not None else '',
+                                 f'{s}' if s is not None else ''])
 
-        cell_item.setText(cell_text)
-        ref_item.setText(ref_text)
-        value_item.setText(value_text)
 
-        self.tableWidget.setItem(1, 0, QTableWidgetItem(cell_text))  
-        self.tableWidget.setItem(1, 1, QTableWidgetItem(ref_text))
-        self.tableWidget.setItem(1, 2, QTableWidgetItem(value_text))
+    def closeEvent(self, event):
+        
+        """ Stop polling the stage when the window is closed. A read in
+        progress is not waited for. """
+        
+        self.timer.stop()
+        self.poller.stop(0)
+        super().closeEvent(event)
 
     
 
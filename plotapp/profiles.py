@@ -0,0 +1,195 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the profile files of the DataInputBox. A profile
+# is a JSON document with a format tag, a version and the parameter
+# values. It is written with one parameter per line:
+#
+#   {"format": "plotapp-profile", "version": 1, "values": {
+#   "speed": 400,
+#   "axis": "y axis"
+#   }}
+#
+# Files in this layout are parsed line by line without reading the whole
+# document first, other valid JSON documents are parsed as a whole. All
+# values are checked against data_specifications by the compiled
+# validators of the module validators. Old profiles written as
+# Python source are converted once by convert_profile(), they are never
+# executed.
+#
+##########################################################################
+
+import os
+import re
+import ast
+import json
+
+from validators import Validators
+
+# Global parameters
+FORMAT = "plotapp-profile"
+VERSION = 1
+HEADER = re.compile(r'^\{"format":\s*("(?:[^"\\]|\\.)*"),\s*"version":\s*(\d+),\s*"values":\s*\{$')
+
+
+def check_header(path, format, version):
+
+    if format != FORMAT:
+        raise RuntimeError("File '%s' is no profile!" % path)
+    if not isinstance(version, int) or version > VERSION:
+        raise RuntimeError("Unsupported profile version %s!" % version)
+
+
+def iter_profile(path):
+
+    """ Generator yielding (key, value, line number) for all parameters of
+    a profile file. The line number is 0 for documents in another layout
+    than the one written by write_profile(). """
+
+    with open(path, "r", encoding="utf-8") as fp:
+        match = HEADER.match(fp.readline().strip())
+        if match is None:
+            fp.seek(0)
+            try:
+                document = json.load(fp)
+                format = document['format']
+                version = document['version']
+                values = document['values']
+            except (ValueError, KeyError, TypeError) as error:
+                raise RuntimeError("Invalid profile '%s': %s" % (path, error))
+            check_header(path, format, version)
+            if not isinstance(values, dict):
+                raise RuntimeError("Invalid profile '%s': values must be an object" % path)
+            for key, value in values.items():
+                yield key, value, 0
+            return
+
+        check_header(path, json.loads(match.group(1)), int(match.group(2)))
+        for number, line in enumerate(fp, 2):
+            line = line.strip()
+            if line == "}}":
+                break
+            if not line:
+                continue
+            try:
+                entry = json.loads("{%s}" % line.rstrip(","))
+            except ValueError as error:
+                raise RuntimeError("Invalid profile entry in line %d: %s" % (number, error))
+            if len(entry) != 1:
+                raise RuntimeError("Invalid profile entry in line %d!" % number)
+            key, value = entry.popitem()
+            yield key, value, number
+        else:
+            raise RuntimeError("Profile '%s' is truncated!" % path)
+        if fp.read().strip():
+            raise RuntimeError("Unexpected data after the end of profile '%s'!" % path)
+
+
+def read_profile(path, specifications):
+
+    """ Return the parameter values of a profile file as dictionary. All
+    values are checked against the specifications, which may be given as
+    compiled Validators. The error raised for invalid values lists all of
+    them. """
+
+    if not isinstance(specifications, Validators):
+        specifications = Validators(specifications)
+    values = {}
+    lines = {}
+    for key, value, number in iter_profile(path):
+        if key in values:
+            where = " in line %d" % number if number else ""
+            raise RuntimeError("Duplicate parameter '%s'%s!" % (key, where))
+        values[key] = value
+        lines[key] = number
+
+    report = specifications.validate(values)
+    if not report.ok:
+        raise RuntimeError(report.message(lines))
+    return values
+
+
+def write_profile(path, values):
+
+    """ Write a dictionary of parameter values as profile file. """
+
+    lines = ['{"format": %s, "version": %d, "values": {' % (json.dumps(FORMAT), VERSION)]
+    entries = ["%s: %s" % (json.dumps(key), json.dumps(value)) for key, value in values.items()]
+    lines.append(",\n".join(entries))
+    lines.append("}}\n")
+
+    temp = path + ".tmp"
+    with open(temp, "w", encoding="utf-8") as fp:
+        fp.write("\n".join(line for line in lines if line))
+    os.replace(temp, path)
+
+
+def converted_path(path):
+
+    """ Return the default path of the profile file converted from the
+    Python profile path. """
+
+    return os.path.splitext(path)[0] + ".json"
+
+
+def convert_profile(path, target=None, specifications=None, overwrite=False):
+
+    """ Convert a profile written as Python source with an assignment
+    data_values = {...} into a profile file. The dictionary must be a
+    literal, the source is not executed. If specifications are given, no
+    file is written unless all values are valid. An existing file is only
+    replaced if overwrite is True. Return the path of the new file, which
+    defaults to converted_path(path). """
+
+    if target is None:
+        target = converted_path(path)
+    if not overwrite and os.path.exists(target):
+        raise RuntimeError("Profile '%s' exists already!" % target)
+
+    with open(path, "r", encoding="utf-8") as fp:
+        source = fp.read()
+    try:
+        tree = ast.parse(source, path)
+    except SyntaxError as error:
+        raise RuntimeError("Invalid Python profile '%s': %s" % (path, error))
+
+    values = None
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(name, ast.Name) and
+                                                name.id == "data_values"
+                                                for name in node.targets):
+            try:
+                values = ast.literal_eval(node.value)
+            except ValueError:
+                raise RuntimeError("Profile '%s' is no literal dictionary!" % path)
+    if not isinstance(values, dict):
+        raise RuntimeError("No data_values dictionary in '%s'!" % path)
+    if specifications is not None:
+        if not isinstance(specifications, Validators):
+            specifications = Validators(specifications)
+        report = specifications.validate(values)
+        if not report.ok:
+            raise RuntimeError("Profile '%s' was not converted:\n%s" % (path, report.message()))
+
+    write_profile(target, values)
+    return target
+
+
+##########################################################################
+if __name__ == "__main__":
+
+    import sys
+    from data_specifications import data_specifications
+
+    overwrite = "-f" in sys.argv
+    for path in sys.argv[1:]:
+        if path == "-f":
+            continue
+        try:
+            print("%s -> %s" % (path, convert_profile(path, specifications=data_specifications,
+                                                      overwrite=overwrite)))
+        except (OSError, RuntimeError) as error:
+            print(error, file=sys.stderr)
@@ -0,0 +1,290 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class TilePyramid. It precomputes downscaled
+# copies of the camera tiles (mip levels 1/2, 1/4, 1/8, ...) and stores
+# them on disk, so that zoomed out views decode small files only. The
+# level files are named after the full file name of the image. Levels
+# older than the image are not used, the PyramidBuilder rebuilds them on
+# a thread pool.
+#
+##########################################################################
+
+import os
+import time
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+
+# Global parameters
+LEVELS = (2, 4, 8)
+FOLDER = "pyramid"
+CHECK_INTERVAL = 2.0                    # Seconds between the checks of an image file
+BUILD_PRIORITY = -2**30                 # Rebuilds wait for the pending tiles
+
+
+class TilePyramid(object):
+
+    def __init__(self, levels=LEVELS, folder=FOLDER):
+
+        """ Initialize the pyramid with the given downscaling divisors.
+        The levels of an image are stored in the subfolder folder next
+        to the image file. """
+
+        self.levels = tuple(sorted(levels))
+        self.folder = folder
+        self.sizes = {}                 # path -> full size (width, height)
+        self.available = {}             # path -> (check time, signature, levels)
+        self.stale = set()              # Images with outdated levels
+        self.built = {}                 # path -> signature the levels were built from
+
+
+    def level_path(self, path, level):
+
+        """ Return the file path of the given level of an image. Level 1 is
+        the original image. """
+
+        if level == 1:
+            return path
+        head, tail = os.path.split(path)
+        return os.path.join(head, self.folder, "%s_%d.png" % (tail, level))
+
+
+    def build(self, path, force=False):
+
+        """ Write all levels of the image file path. Levels which are newer
+        than the image are kept unless force is True. Return the number of
+        written files. """
+
+        signature = self.signature(path)
+        count, size = self.write_levels(path, force)
+        self.rebuilt(path, signature, size)
+        return count
+
+
+    def rebuilt(self, path, signature, size=None):
+
+        """ Forget the levels of an image after they were written from the
+        image file with the given signature. size is its full size (width,
+        height) if known. """
+
+        self.built[path] = signature
+        if size is not None:
+            self.sizes[path] = size
+        self.available.pop(path, None)
+        self.stale.discard(path)
+
+
+    def write_levels(self, path, force=False):
+
+        """ Write the levels of the image file path like build, but without
+        touching the caches, so it may run on a worker thread. Each level
+        is scaled down from the previous one. Return the number of written
+        files and the full size of the image or None if nothing was
+        written. """
+
+        mtime = os.stat(path).st_mtime_ns
+        todo = []
+        for level in self.levels:
+            level_path = self.level_path(path, level)
+            if force or not os.path.exists(level_path) or \
+                    os.stat(level_path).st_mtime_ns < mtime:
+                todo.append(level)
+        if not todo:
+            return 0, None
+
+        image = QImage(path)
+        if image.isNull():
+            raise RuntimeError("Can't read image file '%s'!" % path)
+        os.makedirs(os.path.join(os.path.dirname(path), self.folder), exist_ok=True)
+
+        count = 0
+        width = image.width()
+        height = image.height()
+        for level in self.levels:
+            size = (max(1, width // level), max(1, height // level))
+            image = image.scaled(*size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            if level in todo:
+                if not image.save(self.level_path(path, level)):
+                    raise RuntimeError("Can't write level %d of '%s'!" % (level, path))
+                count += 1
+        return count, (width, height)
+
+
+    def build_all(self, image_data, force=False):
+
+        """ Build the pyramids of all images in image_data. Return the
+        number of written files. """
+
+        paths = {options['image_path'] for options in image_data.values()}
+        return sum(self.build(path, force) for path in sorted(paths))
+
+
+    def size(self, path):
+
+        """ Return the full resolution (width, height) of an image. Only the
+        header of the file is read. """
+
+        size = self.sizes.get(path)
+        if size is None:
+            size = QImageReader(path).size()
+            size = (size.width(), size.height())
+            self.sizes[path] = size
+        return size
+
+
+    def signature(self, path):
+
+        """ Return the modification time and size of a file or None if it
+        does not exist. """
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+    def levels_of(self, path):
+
+        """ Return the usable levels of the image file path. The files are
+        checked for changes at most every CHECK_INTERVAL seconds. Levels
+        older than the image are not used, unless they were built from
+        the current image, and the image is added to the set stale. """
+
+        now = time.monotonic()
+        entry = self.available.get(path)
+        if entry is not None and now - entry[0] < CHECK_INTERVAL:
+            return entry[2]
+        signature = self.signature(path)
+        if entry is not None and entry[1] == signature:
+            self.available[path] = (now, signature, entry[2])
+            return entry[2]
+
+        # The image is new or has changed since the last check
+        self.sizes.pop(path, None)
+        current = signature is None or self.built.get(path) == signature
+        levels = []
+        for level in self.levels:
+            level_signature = self.signature(self.level_path(path, level))
+            if level_signature is None:
+                continue
+            if not current and level_signature[0] < signature[0]:
+                self.stale.add(path)
+            else:
+                levels.append(level)
+        levels = tuple(levels)
+        self.available[path] = (now, signature, levels)
+        return levels
+
+
+    def select(self, path, size):
+
+        """ Return the coarsest existing level of the image which still
+        provides at least the display size (width, height) in pixels. """
+
+        levels = self.levels_of(path)
+        width, height = self.size(path)
+        if width <= 0 or height <= 0:
+            return 1
+
+        # Aspect ratio is kept, the fitting side determines the scale
+        scale = min(size[0] / width, size[1] / height)
+        best = 1
+        for level in levels:
+            if scale * level <= 1:
+                best = level
+        return best
+
+
+    def path_for(self, path, size):
+
+        """ Return the file path of the level to be used for the display
+        size (width, height) in pixels. """
+
+        return self.level_path(path, self.select(path, size))
+
+
+class BuildTask(QRunnable):
+
+    def __init__(self, builder, path):
+
+        """ Task writing the outdated levels of the image file path. """
+
+        super().__init__()
+        self.setAutoDelete(False)
+        self.builder = builder
+        self.path = path
+        self.signature = None
+        self.failed = False
+
+
+    def run(self):
+
+        # Runs on a worker thread, only files and QImage are used here
+        size = None
+        self.signature = self.builder.pyramid.signature(self.path)
+        try:
+            count, size = self.builder.pyramid.write_levels(self.path)
+        except (OSError, RuntimeError):
+            self.failed = True
+        try:
+            self.builder.done.emit(self, size)
+        except RuntimeError:
+            pass                        # Builder deleted during shutdown
+
+
+class PyramidBuilder(QObject):
+
+    # Emitted in the GUI thread with the path of a rebuilt image
+    built = pyqtSignal(str)
+
+    # Internal signal from the worker threads
+    done = pyqtSignal(object, object)
+
+    def __init__(self, pyramid, pool, parent=None):
+
+        """ Rebuild the outdated levels of the images of a TilePyramid on
+        the QThreadPool pool. """
+
+        super().__init__(parent)
+        self.pyramid = pyramid
+        self.pool = pool
+        self.running = {}               # path -> BuildTask
+        self.done.connect(self.finish)
+
+
+    def update(self):
+
+        """ Start the rebuild of all stale images. """
+
+        for path in self.pyramid.stale:
+            if path not in self.running:
+                task = self.running[path] = BuildTask(self, path)
+                self.pool.start(task, BUILD_PRIORITY)
+
+
+    def finish(self, task, size):
+
+        del self.running[task.path]
+        if task.failed:
+            # Tried again once the image changes
+            self.pyramid.stale.discard(task.path)
+            return
+        self.pyramid.rebuilt(task.path, task.signature, size)
+        self.built.emit(task.path)
+
+
+##########################################################################
+if __name__ == "__main__":
+
+    import sys
+    from PyQt5.QtGui import QGuiApplication
+    from data_images import image_data
+
+    app = QGuiApplication(sys.argv)
+    count = TilePyramid().build_all(image_data, "-f" in sys.argv)
+    print("%d pyramid files written." % count)
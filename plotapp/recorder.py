@@ -0,0 +1,231 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class PositionRecorder. It records timestamped
+# stage positions in typed arrays. Whenever CHUNK_SIZE samples have been
+# collected, the chunk is appended to one binary file per column and the
+# memory is released. The files are memory-mapped for reading, so long
+# recordings need little memory.
+#
+# For plotting, the samples are decimated to a given number of buckets.
+# The minimum and maximum sample of each bucket are kept, so peaks and
+# drift remain visible however many samples are reduced to one pixel.
+#
+##########################################################################
+
+import os
+import mmap
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Global parameters
+COLUMNS = ('t', 'x', 'y', 'z', 'opl')
+CHUNK_SIZE = 65536                      # Samples kept in memory
+
+
+class PositionRecorder(object):
+
+    def __init__(self, folder=None, chunk_size=CHUNK_SIZE):
+
+        """ Initialize the recorder. The columns are stored in the files
+        <column>.f64 in folder, samples already there are continued. A
+        temporary folder is used and removed at exit if folder is None. """
+
+        if folder is None:
+            self.tempdir = tempfile.TemporaryDirectory(prefix="positions-")
+            folder = self.tempdir.name
+        else:
+            self.tempdir = None
+            os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.chunk = {name: array('d') for name in COLUMNS}
+        self.spilled = min(self.file_size(name) for name in COLUMNS)
+        self.maps = {}                  # column -> (samples, mapped view)
+
+
+    def __len__(self):
+
+        return self.spilled + len(self.chunk['t'])
+
+
+    def path(self, name):
+
+        return os.path.join(self.folder, name + ".f64")
+
+
+    def file_size(self, name):
+
+        try:
+            return os.path.getsize(self.path(name)) // 8
+        except OSError:
+            return 0
+
+
+    def append(self, t, x, y, z, opl):
+
+        with self.lock:
+            for name, value in zip(COLUMNS, (t, x, y, z, opl)):
+                self.chunk[name].append(value)
+            if len(self.chunk['t']) >= self.chunk_size:
+                self.spill()
+
+
+    def append_snapshot(self, snapshot):
+
+        """ Record a Snapshot of the TelemetryPoller. """
+
+        self.append(snapshot.timestamp, snapshot.x, snapshot.y, snapshot.z, snapshot.opl)
+
+
+    def spill(self):
+
+        # Append the chunk to the column files, the lock must be held
+        count = len(self.chunk['t'])
+        if not count:
+            return
+        for name, column in self.chunk.items():
+            # A shorter file of an interrupted spill is cut to the others
+            with open(self.path(name), "ab") as fp:
+                fp.truncate(8 * self.spilled)
+                column.tofile(fp)
+        self.spilled += count
+        self.chunk = {name: array('d') for name in COLUMNS}
+
+
+    def flush(self):
+
+        """ Write all samples to the files. """
+
+        with self.lock:
+            self.spill()
+
+
+    def mapped(self, name, count):
+
+        """ Return the first count samples of a column file as read-only
+        view. The file is mapped again after it has grown. """
+
+        samples, view = self.maps.get(name, (0, None))
+        if count > samples:
+            with open(self.path(name), "rb") as fp:
+                buffer = mmap.mmap(fp.fileno(), 8 * count, access=mmap.ACCESS_READ)
+            if np is not None:
+                view = np.frombuffer(buffer, np.float64, count)
+            else:
+                view = memoryview(buffer).cast('d')
+            self.maps[name] = (count, view)
+        return view
+
+
+    def values(self, name, start=0, stop=None):
+
+        """ Return the samples start to stop of a column. The result is a
+        NumPy array or a list without NumPy. Samples on disk are read
+        without copying unless the range reaches into the memory chunk. """
+
+        with self.lock:
+            spilled = self.spilled
+            stop = len(self) if stop is None else min(stop, len(self))
+            tail = self.chunk[name][max(0, start - spilled):max(0, stop - spilled)]
+        if start >= stop:
+            return np.empty(0) if np is not None else []
+        head = self.mapped(name, spilled)[start:min(stop, spilled)] if start < spilled else ()
+        if np is not None:
+            if not len(tail):
+                return head
+            tail = np.frombuffer(tail, np.float64)
+            return np.concatenate((head, tail)) if len(head) else tail
+        return list(head) + list(tail)
+
+
+    def index(self, t):
+
+        """ Return the index of the first sample not earlier than time t. """
+
+        with self.lock:
+            spilled = self.spilled
+            chunk = self.chunk['t']
+            if spilled and (not len(chunk) or t <= chunk[0]):
+                return bisect_left(self.mapped('t', spilled), t)
+            return spilled + bisect_left(chunk, t)
+
+
+    def decimate(self, names, buckets, start=None, stop=None):
+
+        """ Return the sorted indices of the samples from time start to
+        stop which are the minimum or maximum of one of the columns names
+        within one of buckets equal parts of the range. All samples are
+        returned if there are not more than twice as many as buckets. """
+
+        first = 0 if start is None else self.index(start)
+        last = len(self) if stop is None else self.index(stop)
+        count = last - first
+        if count <= 2 * buckets:
+            return list(range(first, last))
+
+        size = count // buckets
+        if np is not None:
+            indices = []
+            for name in names:
+                data = self.values(name, first, last)
+                full = data[:size * buckets].reshape(buckets, size)
+                offsets = np.arange(buckets) * size
+                indices += [offsets + full.argmin(axis=1), offsets + full.argmax(axis=1)]
+                rest = data[size * buckets:]
+                if len(rest):
+                    indices.append([size * buckets + rest.argmin(), size * buckets + rest.argmax()])
+            return (np.unique(np.concatenate(indices)) + first).tolist()
+
+        indices = set()
+        for name in names:
+            data = self.values(name, first, last)
+            for i in range(0, count, size):
+                part = range(i, min(i + size, count))
+                indices.add(min(part, key=data.__getitem__))
+                indices.add(max(part, key=data.__getitem__))
+        return sorted(i + first for i in indices)
+
+
+    def take(self, name, indices):
+
+        """ Return the samples of a column at the given sorted indices. """
+
+        if not indices:
+            return []
+        data = self.values(name, indices[0], indices[-1] + 1)
+        first = indices[0]
+        if np is not None:
+            return data[np.asarray(indices) - first].tolist()
+        return [data[i - first] for i in indices]
+
+
+    def downsample(self, name, buckets, start=None, stop=None):
+
+        """ Return the lists (times, values) of a column reduced to the
+        minimum and maximum of each of buckets parts of the time range. """
+
+        indices = self.decimate((name,), buckets, start, stop)
+        return self.take('t', indices), self.take(name, indices)
+
+
+    def close(self):
+
+        """ Write the remaining samples and release the files. The
+        temporary folder is removed. """
+
+        self.flush()
+        self.maps = {}
+        if self.tempdir is not None:
+            self.tempdir.cleanup()
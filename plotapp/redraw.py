@@ -0,0 +1,83 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class RedrawScheduler. It merges all redraw
+# requests arriving within one display frame into a single call of the
+# render function.
+#
+##########################################################################
+
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+# Global parameters
+FRAME_RATE = 60
+
+
+class RedrawScheduler(QObject):
+
+    def __init__(self, render, frame_rate=FRAME_RATE, parent=None):
+
+        """ Initialize the scheduler for the callable render. It is called
+        at most frame_rate times per second. """
+
+        super().__init__(parent)
+        self.render = render
+        self.interval = 1.0 / frame_rate
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.execute)
+        self.last = None                # Time of the last render
+        self.requested = 0
+        self.executed = 0
+
+
+    @property
+    def pending(self):
+
+        return self.timer.isActive()
+
+
+    def request(self):
+
+        """ Mark the view dirty. The render function is called once the
+        current frame is over, later requests until then are merged. """
+
+        self.requested += 1
+        if self.timer.isActive():
+            return
+        delay = 0.0
+        if self.last is not None:
+            delay = max(0.0, self.interval - (time.perf_counter() - self.last))
+        self.timer.start(round(1000 * delay))
+
+
+    def flush(self):
+
+        """ Render immediately if a redraw is pending. """
+
+        if self.timer.isActive():
+            self.timer.stop()
+            self.execute()
+
+
+    def execute(self):
+
+        self.last = time.perf_counter()
+        self.executed += 1
+        self.render()
+
+
+    def stats(self):
+
+        """ Return a dictionary with the redraw counters. """
+
+        return {
+            "requested": self.requested,
+            "executed": self.executed,
+            "coalesced": self.requested - self.executed,
+            }
@@ -0,0 +1,377 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides a binary scene file for the image data and the
+# drawn objects of the ImageViewer. The file starts with a fixed header
+# followed by packed arrays and a string table. It is memory-mapped when
+# opened, so the arrays are used without copying and only the pages
+# actually accessed are read from disk. The spatial indices of the images
+# and objects are stored as well, so a scene is shown without reading all
+# of its entries first.
+#
+# Layout (all offsets in bytes from the start of the file):
+#
+#   header    magic, version, byte order, object count, section count
+#   sections  one (offset, count) pair per array in SECTIONS
+#   arrays    each array aligned to 8 bytes, in native byte order
+#
+# The grid sections of the indices are described in mappedindex.
+#
+##########################################################################
+
+import os
+import sys
+import mmap
+import struct
+from array import array
+from collections.abc import MutableMapping, Sequence
+
+from objectstore import ObjectStore, SHAPES, KINDS, COMMON, BOUNDS, DELETED
+from mappedindex import MappedIndex, pack_grid, GRID, TYPECODES
+
+# Global parameters
+MAGIC = b"PLTSCENE"
+VERSION = 2
+HEADER = struct.Struct("<8sHBBIQ")
+SECTION = struct.Struct("<QQ")
+BYTEORDER = {"little": 0, "big": 1}
+IMAGE_COLUMNS = ('x', 'y', 'z') + BOUNDS
+NONE = 0xffffffff                       # String index of a missing string
+CELL = 200.0                            # Grid cell size of the indices
+
+
+def scene_sections():
+
+    """ Return the names and typecodes of all arrays in file order. """
+
+    sections = [("image." + name, 'd') for name in IMAGE_COLUMNS]
+    sections += [("image.path", 'I'), ("image.key", 'I'),
+                 ("palette", 'I'), ("kinds", 'B'), ("rows", 'q')]
+    for kind in KINDS:
+        sections += [("%s.%s" % (kind, name), 'd')
+                     for name in COMMON + SHAPES[kind] + BOUNDS]
+        sections += [(kind + ".color", 'H'), (kind + ".oid", 'q')]
+        if kind == 'text':
+            sections.append(("text.content", 'I'))
+    for index in ("image", "object"):
+        sections += [("%s.grid.%s" % (index, name), TYPECODES[name]) for name in GRID]
+    sections += [("strings.offsets", 'Q'), ("strings.data", 'B')]
+    return sections
+
+SECTIONS = scene_sections()
+
+
+class StringTable(Sequence):
+
+    def __init__(self, offsets, data):
+
+        """ Strings stored as UTF-8 in data. String i spans the bytes from
+        offsets[i] to offsets[i+1]. """
+
+        self.offsets = offsets
+        self.data = data
+
+
+    def __len__(self):
+
+        return max(0, len(self.offsets) - 1)
+
+
+    def __getitem__(self, index):
+
+        if index == NONE:
+            return None
+        return bytes(self.data[self.offsets[index]:self.offsets[index+1]]).decode("utf-8")
+
+
+class StringColumn(Sequence):
+
+    def __init__(self, strings, indices):
+
+        """ Column of strings given by their indices into a StringTable. """
+
+        self.strings = strings
+        self.indices = indices
+
+
+    def __len__(self):
+
+        return len(self.indices)
+
+
+    def __getitem__(self, row):
+
+        return self.strings[self.indices[row]]
+
+
+class ImageTable(MutableMapping):
+
+    """ Image data of a scene file with the same interface as the image_data
+    dictionary. The keys are the row numbers of the images, the option
+    dictionaries are created on access. Changed and added entries are kept
+    in memory. """
+
+    def __init__(self, scene):
+
+        self.scene = scene
+        self.columns = {name: scene.section("image." + name) for name in IMAGE_COLUMNS}
+        self.paths = scene.section("image.path")
+        self.names = scene.section("image.key")
+        self.changed = {}               # key -> options
+        self.deleted = set()
+
+
+    def __len__(self):
+
+        return len(self.paths) - len(self.deleted) + \
+            sum(1 for key in self.changed if not self.stored(key))
+
+
+    def __iter__(self):
+
+        for row in range(len(self.paths)):
+            if row not in self.deleted:
+                yield row
+        for key in self.changed:
+            if not self.stored(key):
+                yield key
+
+
+    def __getitem__(self, key):
+
+        options = self.changed.get(key)
+        if options is not None:
+            return options
+        if not self.stored(key) or key in self.deleted:
+            raise KeyError(key)
+        columns = self.columns
+        return {
+            'image_path': self.scene.strings[self.paths[key]],
+            'x': columns['x'][key],
+            'y': columns['y'][key],
+            'z': columns['z'][key],
+            'bounds': [columns[name][key] for name in BOUNDS],
+            }
+
+
+    def __setitem__(self, key, options):
+
+        self.changed[key] = options
+        self.deleted.discard(key)
+
+
+    def __delitem__(self, key):
+
+        if key in self.changed:
+            del self.changed[key]
+            if self.stored(key):
+                self.deleted.add(key)
+        elif self.stored(key) and key not in self.deleted:
+            self.deleted.add(key)
+        else:
+            raise KeyError(key)
+
+
+    def stored(self, key):
+
+        return isinstance(key, int) and 0 <= key < len(self.paths)
+
+
+    def name(self, key):
+
+        """ Return the original image_data key of a stored image. """
+
+        if self.stored(key):
+            return self.scene.strings[self.names[key]]
+        return key
+
+
+class SceneFile(object):
+
+    def __init__(self, path):
+
+        """ Open a scene file and map it into memory. """
+
+        self.path = path
+        with open(path, "rb") as fp:
+            self.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+
+        if len(self.buffer) < HEADER.size:
+            raise RuntimeError("File '%s' is too short for a scene file!" % path)
+        magic, version, byteorder, _, num, count = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise RuntimeError("File '%s' is no scene file!" % path)
+        if version != VERSION:
+            raise RuntimeError("Unsupported scene file version %d!" % version)
+        if byteorder != BYTEORDER[sys.byteorder]:
+            raise RuntimeError("Scene file '%s' has the wrong byte order!" % path)
+        if num != len(SECTIONS):
+            raise RuntimeError("Scene file '%s' is corrupt!" % path)
+
+        self.count = count
+        self.sections = {}
+        for i, (name, typecode) in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(self.buffer, HEADER.size + i * SECTION.size)
+            size = length * array(typecode).itemsize
+            if offset + size > len(self.buffer):
+                raise RuntimeError("Scene file '%s' is truncated!" % path)
+            self.sections[name] = self.buffer[offset:offset+size].cast(typecode)
+
+        self.strings = StringTable(self.section("strings.offsets"),
+                                   self.section("strings.data"))
+        self.images = ImageTable(self)
+        self.objects = self.object_store()
+
+
+    def section(self, name):
+
+        """ Return the array name as typed memoryview. """
+
+        return self.sections[name]
+
+
+    def grid(self, index):
+
+        """ Return the grid sections of the index "image" or "object". """
+
+        return {name: self.section("%s.grid.%s" % (index, name)) for name in GRID}
+
+
+    def image_index(self):
+
+        """ Return the index of the images with their row numbers as
+        keys. """
+
+        columns = [self.images.columns[name] for name in BOUNDS]
+        return MappedIndex(self.grid("image"), lambda row: [c[row] for c in columns])
+
+
+    def object_index(self):
+
+        """ Return the index of the drawn objects with their draw rows as
+        values. The draw rows are read on first access. """
+
+        objects = self.objects
+        rows = {}
+        def row(oid):
+            value = rows.get(oid)
+            if value is None:
+                value = rows[oid] = objects.draw_row(oid)
+            return value
+        return MappedIndex(self.grid("object"), lambda oid: row(oid)[5], row)
+
+
+    def object_store(self):
+
+        """ Return an ObjectStore working on the mapped arrays. """
+
+        tables = {}
+        for kind in KINDS:
+            buffers = {name: self.section("%s.%s" % (kind, name))
+                       for name in COMMON + SHAPES[kind] + BOUNDS}
+            buffers['color'] = self.section(kind + ".color")
+            buffers['oid'] = self.section(kind + ".oid")
+            if kind == 'text':
+                buffers['content'] = StringColumn(self.strings, self.section("text.content"))
+            tables[kind] = buffers
+        palette = [self.strings[i] for i in self.section("palette")]
+        return ObjectStore.from_buffers(tables, palette, self.section("kinds"),
+                                        self.section("rows"), self.count)
+
+
+def write_scene(path, image_data, objects):
+
+    """ Write image data and drawn objects to a scene file. objects is an
+    ObjectStore or an iterable of object dictionaries. """
+
+    if not isinstance(objects, ObjectStore):
+        objects = ObjectStore(objects)
+
+    # String table with each string stored once
+    strings = []
+    index = {}
+    def intern(text):
+        if text is None:
+            return NONE
+        i = index.get(text)
+        if i is None:
+            i = index[text] = len(strings)
+            strings.append(text.encode("utf-8"))
+        return i
+
+    # Images of a loaded scene keep the keys they were saved with
+    image_key = getattr(image_data, "name", lambda key: key)
+    arrays = {name: array(typecode) for name, typecode in SECTIONS}
+    entries = []
+    for key, options in image_data.items():
+        arrays["image.x"].append(options['x'])
+        arrays["image.y"].append(options['y'])
+        arrays["image.z"].append(options['z'])
+        for name, value in zip(BOUNDS, options['bounds']):
+            arrays["image." + name].append(value)
+        arrays["image.path"].append(intern(options['image_path']))
+        arrays["image.key"].append(intern(str(image_key(key))))
+        entries.append((len(entries), options['z']) + tuple(options['bounds']))
+    grids = {"image": pack_grid(entries, CELL)}
+
+    arrays["palette"].extend(intern(color) for color in objects.palette)
+    arrays["kinds"].frombytes(bytes(objects.kinds))
+    arrays["rows"].frombytes(bytes(objects.rows))
+    for kind, table in objects.tables.items():
+        for name, column in table.columns.items():
+            arrays["%s.%s" % (kind, name)].frombytes(bytes(column))
+        arrays[kind + ".color"].frombytes(bytes(table.color))
+        arrays[kind + ".oid"].frombytes(bytes(table.oid))
+        if table.content is not None:
+            arrays["text.content"].extend(intern(text) for text in table.content)
+
+    # Index entries of the objects, the grid sorts them by id
+    kinds = objects.kinds
+    entries = []
+    for table in objects.tables.values():
+        columns = [table.oid, table.columns['z']] + [table.columns[name] for name in BOUNDS]
+        entries += [entry for entry in zip(*columns) if kinds[entry[0]] != DELETED]
+    grids["object"] = pack_grid(entries, CELL)
+    for index, grid in grids.items():
+        for name in GRID:
+            arrays["%s.grid.%s" % (index, name)] = grid[name]
+
+    offsets = arrays["strings.offsets"]
+    offsets.append(0)
+    for text in strings:
+        offsets.append(offsets[-1] + len(text))
+    arrays["strings.data"].frombytes(b"".join(strings))
+
+    # Header and section table followed by the 8 byte aligned arrays
+    position = HEADER.size + len(SECTIONS) * SECTION.size
+    table = []
+    for name, typecode in SECTIONS:
+        position += -position % 8
+        table.append((position, len(arrays[name])))
+        position += len(arrays[name]) * arrays[name].itemsize
+
+    # A mapped file of the same name stays valid until it is closed
+    temp = path + ".tmp"
+    with open(temp, "wb") as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, BYTEORDER[sys.byteorder], 0,
+                             len(SECTIONS), len(objects)))
+        for offset, length in table:
+            fp.write(SECTION.pack(offset, length))
+        for (name, typecode), (offset, length) in zip(SECTIONS, table):
+            fp.write(bytes(offset - fp.tell()))
+            arrays[name].tofile(fp)
+    os.replace(temp, path)
+
+
+##########################################################################
+if __name__ == "__main__":
+
+    from data_images import image_data
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "scene.plt"
+    write_scene(path, image_data, ())
+    print("%d images written to '%s'." % (len(image_data), path))
@@ -0,0 +1,132 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class SpatialIndex, a uniform grid over the
+# bounds of images and drawn objects for fast viewport queries.
+#
+##########################################################################
+
+import math
+
+
+class SpatialIndex(object):
+
+    def __init__(self, cell=200.0):
+
+        """ Initialize an empty index with square grid cells of the given
+        size in world units. """
+
+        self.cell = float(cell)
+        self.cells = {}                 # (i, j) -> {key: value}
+        self.entries = {}               # key -> (rect, cell range, value, order)
+        self.counter = 0
+
+
+    def __len__(self):
+
+        return len(self.entries)
+
+
+    def __contains__(self, key):
+
+        return key in self.entries
+
+
+    def rect(self, bounds):
+
+        """ Return bounds [top, right, bot, left] as normalized rectangle
+        (left, top, right, bottom). """
+
+        top, right, bot, left = bounds
+        return (min(left, right), min(top, bot), max(left, right), max(top, bot))
+
+
+    def cell_range(self, rect):
+
+        """ Return the range (i0, j0, i1, j1) of grid cells covered by the
+        rectangle. """
+
+        cell = self.cell
+        return (math.floor(rect[0] / cell), math.floor(rect[1] / cell),
+                math.floor(rect[2] / cell), math.floor(rect[3] / cell))
+
+
+    def insert(self, key, bounds, value=None):
+
+        """ Add or replace the entry key with bounds [top, right, bot, left].
+        Queries return value, or key if value is None. A replaced entry is
+        ordered like a new one. """
+
+        if key in self.entries:
+            self.remove(key)
+        if value is None:
+            value = key
+
+        rect = self.rect(bounds)
+        cells = self.cell_range(rect)
+        for i in range(cells[0], cells[2] + 1):
+            for j in range(cells[1], cells[3] + 1):
+                self.cells.setdefault((i, j), {})[key] = value
+        self.entries[key] = (rect, cells, value, self.counter)
+        self.counter += 1
+
+
+    def remove(self, key):
+
+        """ Remove the entry key from the index. """
+
+        rect, cells, value, order = self.entries.pop(key)
+        for i in range(cells[0], cells[2] + 1):
+            for j in range(cells[1], cells[3] + 1):
+                bucket = self.cells[(i, j)]
+                del bucket[key]
+                if not bucket:
+                    del self.cells[(i, j)]
+
+
+    def clear(self):
+
+        self.cells.clear()
+        self.entries.clear()
+
+
+    def values(self):
+
+        """ Return the values of all entries in insertion order. """
+
+        return [entry[2] for entry in self.entries.values()]
+
+
+    def query(self, left, top, right, bottom):
+
+        """ Return the values of all entries overlapping the rectangle in
+        insertion order. Only the grid cells inside the rectangle are
+        visited, or the occupied cells if there are fewer of them. """
+
+        i0, j0, i1, j1 = self.cell_range((left, top, right, bottom))
+        if (i1 - i0 + 1) * (j1 - j0 + 1) <= len(self.cells):
+            buckets = (self.cells.get((i, j)) for i in range(i0, i1 + 1)
+                       for j in range(j0, j1 + 1))
+        else:
+            buckets = (bucket for (i, j), bucket in self.cells.items()
+                       if i0 <= i <= i1 and j0 <= j <= j1)
+
+        result = []
+        seen = set()
+        entries = self.entries
+        for bucket in buckets:
+            if not bucket:
+                continue
+            for key in bucket:
+                if key in seen:
+                    continue
+                seen.add(key)
+                rect, cells, value, order = entries[key]
+                if rect[0] < right and rect[2] > left and \
+                        rect[1] < bottom and rect[3] > top:
+                    result.append((order, value))
+        result.sort(key=lambda item: item[0])
+        return [value for order, value in result]
@@ -0,0 +1,138 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class TelemetryPoller. It samples all axes of
+# a stage position object on a background thread at a fixed rate. Every
+# property read may be a blocking round trip to the controller, so the
+# GUI never reads the stage itself. It only takes the latest Snapshot,
+# which is replaced as a whole after each complete sample.
+#
+##########################################################################
+
+import time
+import threading
+
+# Global parameters
+POLL_RATE = 20.0                        # Samples per second
+
+
+class Snapshot(object):
+
+    """ Immutable sample of all stage axes taken at the same time. """
+
+    __slots__ = ('seq', 'timestamp', 'x', 'y', 'z', 'opl', 'shutter', 'shutter_time')
+
+    def __init__(self, seq, timestamp, x, y, z, opl, shutter, shutter_time):
+
+        for name, value in zip(self.__slots__, (seq, timestamp, x, y, z, opl,
+                                                shutter, shutter_time)):
+            object.__setattr__(self, name, value)
+
+
+    def __setattr__(self, name, value):
+
+        raise AttributeError("Snapshot is read-only!")
+
+
+    def __repr__(self):
+
+        return "Snapshot(%s)" % ", ".join("%s=%r" % (name, getattr(self, name))
+                                          for name in self.__slots__)
+
+
+class TelemetryPoller(threading.Thread):
+
+    def __init__(self, position, rate=POLL_RATE, recorder=None):
+
+        """ Poller thread for the stage position object position, taking
+        rate samples per second. Every sample is also appended to the
+        PositionRecorder recorder if given. """
+
+        super().__init__(daemon=True)
+        self.position = position
+        self.recorder = recorder
+        self.interval = 1.0 / rate
+        self.snapshot = None            # Latest complete sample
+        self.stopped = threading.Event()
+        self.samples = 0
+        self.errors = 0
+        self.error = None               # Last exception of the controller
+        self.read_time = 0.0            # Duration of the last sample
+
+
+    @property
+    def rate(self):
+
+        return 1.0 / self.interval
+
+
+    def set_rate(self, rate):
+
+        if rate <= 0:
+            raise RuntimeError("Poll rate must be positive!")
+        self.interval = 1.0 / rate
+
+
+    def stop(self, timeout=None):
+
+        """ Stop the thread. A read already running is not interrupted,
+        the thread may outlive the call if timeout is given. """
+
+        self.stopped.set()
+        self.join(timeout)
+
+
+    def sample(self):
+
+        """ Read all axes and return them as Snapshot. """
+
+        pos = self.position
+        t0 = time.perf_counter()
+        x = pos.xPosition
+        y = pos.yPosition
+        z = pos.zPosition
+        opl = pos.oplMotorPosition
+        shutter = pos.shutter
+        shutter_time = pos.shutterTime
+        t1 = time.perf_counter()
+        self.read_time = t1 - t0
+        return Snapshot(self.samples + 1, 0.5 * (t0 + t1), x, y, z, opl,
+                        shutter, shutter_time)
+
+
+    def run(self):
+
+        tick = time.perf_counter()
+        while not self.stopped.is_set():
+            try:
+                snapshot = self.sample()
+            except Exception as error:
+                self.error = error
+                self.errors += 1
+            else:
+                self.snapshot = snapshot
+                self.samples += 1
+                if self.recorder is not None:
+                    self.recorder.append_snapshot(snapshot)
+
+            # Skip the ticks missed by a slow controller
+            tick += self.interval
+            now = time.perf_counter()
+            if tick < now:
+                tick = now
+            self.stopped.wait(tick - now)
+
+
+    def stats(self):
+
+        """ Return a dictionary with the poller counters. """
+
+        return {
+            "rate": self.rate,
+            "samples": self.samples,
+            "errors": self.errors,
+            "read_ms": 1000 * self.read_time,
+            }
@@ -0,0 +1,176 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the class TileLoader. It decodes image files on a
+# pool of worker threads into QImages and hands them back to the GUI
+# thread. Requests are prioritized by the caller and can be cancelled
+# while they are still waiting in the queue.
+#
+##########################################################################
+
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QImage
+
+
+class DecodeTask(QRunnable):
+
+    def __init__(self, loader, key, path, size, priority):
+
+        """ Task decoding the image file path, scaled to size (width,
+        height) keeping the aspect ratio if size is not None. """
+
+        super().__init__()
+        self.setAutoDelete(False)
+        self.loader = loader
+        self.key = key
+        self.path = path
+        self.size = size
+        self.priority = priority
+        self.cancelled = False
+
+
+    def run(self):
+
+        # Runs on a worker thread, only QImage may be used here. Cancelled
+        # tasks report back as well, so the loader can release them.
+        image = QImage()
+        if not self.cancelled:
+            image = QImage(self.path)
+            if self.size is not None and not image.isNull():
+                image = image.scaled(*self.size, Qt.KeepAspectRatio)
+        try:
+            self.loader.decoded.emit(self, image)
+        except RuntimeError:
+            pass                        # Loader deleted during shutdown
+
+
+class TileLoader(QObject):
+
+    # Emitted in the GUI thread with the request key and the image
+    loaded = pyqtSignal(object, QImage)
+
+    # Internal signal from the worker threads
+    decoded = pyqtSignal(object, QImage)
+
+    def __init__(self, parent=None, threads=None):
+
+        """ Initialize the loader with its own thread pool. The number of
+        threads defaults to the number of CPU cores. """
+
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if threads is not None:
+            self.pool.setMaxThreadCount(threads)
+        self.pending = {}               # key -> DecodeTask
+        self.orphans = set()            # Cancelled tasks still running
+        self.decoded.connect(self.finish)
+        self.requested = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.discarded = 0
+
+
+    def __len__(self):
+
+        return len(self.pending)
+
+
+    def __contains__(self, key):
+
+        return key in self.pending
+
+
+    def request(self, key, path, size=None, priority=0):
+
+        """ Queue the decoding of the image file path. Higher priorities
+        are decoded first. A pending request with the same key is moved to
+        the new priority if it has not been started yet. """
+
+        size = None if size is None else (round(size[0]), round(size[1]))
+        task = self.pending.get(key)
+        if task is not None:
+            if task.priority != priority and self.pool.tryTake(task):
+                task.priority = priority
+                self.pool.start(task, priority)
+            return
+
+        task = DecodeTask(self, key, path, size, priority)
+        self.pending[key] = task
+        self.pool.start(task, priority)
+        self.requested += 1
+
+
+    def cancel(self, key):
+
+        """ Cancel the request key. A task which is already running
+        finishes, but its image is discarded. """
+
+        task = self.pending.pop(key, None)
+        if task is None:
+            return
+        task.cancelled = True
+        if not self.pool.tryTake(task):
+            # The task must stay alive until it is done
+            self.orphans.add(task)
+        self.cancelled += 1
+
+
+    def retain(self, keys):
+
+        """ Cancel all pending requests whose key is not in keys. """
+
+        for key in [key for key in self.pending if key not in keys]:
+            self.cancel(key)
+
+
+    def clear(self):
+
+        for key in list(self.pending):
+            self.cancel(key)
+
+
+    def shutdown(self):
+
+        """ Cancel all requests and wait for the running tasks. Must be
+        called before the loader is deleted, the thread pool would
+        otherwise wait for tasks which need the interpreter lock. """
+
+        self.clear()
+        self.pool.waitForDone()
+
+
+    def wait(self, msecs=-1):
+
+        """ Block until all started tasks are done. Return False on a
+        timeout. """
+
+        return self.pool.waitForDone(msecs)
+
+
+    def finish(self, task, image):
+
+        # Deliver the image unless the request was cancelled meanwhile
+        self.orphans.discard(task)
+        if self.pending.get(task.key) is not task:
+            self.discarded += 1
+            return
+        del self.pending[task.key]
+        self.completed += 1
+        self.loaded.emit(task.key, image)
+
+
+    def stats(self):
+
+        """ Return a dictionary with the current loader statistics. """
+
+        return {
+            "pending": len(self.pending),
+            "threads": self.pool.maxThreadCount(),
+            "requested": self.requested,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "discarded": self.discarded,
+            }
@@ -0,0 +1,353 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# This module provides the validators of the parameters in
+# data_specifications. The constraints of each parameter are compiled
+# once into a validator object:
+#
+#   int     {'min': ..., 'max': ...}
+#   float   {'min': ..., 'max': ..., 'digits': ...}
+#   str     [maxlen, charset]
+#   list    ([title, ...], [value, ...])
+#   bool    None
+#
+# All constraints are optional. The charset is one of the names in
+# CHARSETS or a string of the allowed characters. Validators checks all
+# values of a profile in one pass and returns a ValidationReport with the
+# valid values and all errors.
+#
+##########################################################################
+
+import re
+from collections.abc import Mapping
+
+# Global parameters
+CHARSETS = {
+    "alphanumeric": "A-Za-z0-9",
+    "alpha": "A-Za-z",
+    "numeric": "0-9",
+    "identifier": "A-Za-z0-9_",
+    "printable": "\x20-\x7e",
+    }
+
+
+class Validator(object):
+
+    __slots__ = ('key', 'kind')
+
+    def __init__(self, key, kind):
+
+        """ Validator of the parameter key without constraints. """
+
+        self.key = key
+        self.kind = kind
+
+
+    def parse(self, text):
+
+        """ Convert the text of an editor to a value. Raise ValueError if
+        this is not possible. """
+
+        return self.kind(text)
+
+
+    def check(self, value):
+
+        """ Return an error message if value is not valid or None
+        otherwise. """
+
+        return None
+
+
+    def format(self, value):
+
+        """ Return the display string of value. """
+
+        return str(value)
+
+
+    def invalid(self, value):
+
+        return "invalid value %r for type %s" % (value, self.kind.__name__)
+
+
+class BoolValidator(Validator):
+
+    __slots__ = ()
+
+    def __init__(self, key, parameters):
+
+        super().__init__(key, bool)
+
+
+    def check(self, value):
+
+        if not isinstance(value, bool):
+            return self.invalid(value)
+        return None
+
+
+class RangeValidator(Validator):
+
+    __slots__ = ('min', 'max')
+
+    def __init__(self, key, kind, parameters):
+
+        """ Validator of numbers with the optional limits min and max. """
+
+        super().__init__(key, kind)
+        parameters = parameters or {}
+        self.min = parameters.get('min')
+        self.max = parameters.get('max')
+
+
+    def check(self, value):
+
+        if self.min is not None and value < self.min:
+            return "value %r below minimum %r" % (value, self.min)
+        if self.max is not None and value > self.max:
+            return "value %r above maximum %r" % (value, self.max)
+        return None
+
+
+class IntValidator(RangeValidator):
+
+    __slots__ = ()
+
+    def __init__(self, key, parameters):
+
+        super().__init__(key, int, parameters)
+
+
+    def check(self, value):
+
+        if type(value) is not int:
+            return self.invalid(value)
+        return super().check(value)
+
+
+class FloatValidator(RangeValidator):
+
+    __slots__ = ('digits', 'template')
+
+    def __init__(self, key, parameters):
+
+        """ Validator of floats, which are displayed with the given number
+        of digits after the decimal point. """
+
+        super().__init__(key, float, parameters)
+        self.digits = (parameters or {}).get('digits')
+        self.template = "%s" if self.digits is None else "%%.%df" % self.digits
+
+
+    def check(self, value):
+
+        if type(value) not in (int, float):
+            return self.invalid(value)
+        return super().check(value)
+
+
+    def format(self, value):
+
+        return self.template % value
+
+
+class StrValidator(Validator):
+
+    __slots__ = ('maxlen', 'charset', 'pattern')
+
+    def __init__(self, key, parameters):
+
+        """ Validator of strings with an optional maximum length and set
+        of allowed characters. """
+
+        super().__init__(key, str)
+        maxlen, charset = (list(parameters or []) + [None, None])[:2]
+        self.maxlen = maxlen
+        self.charset = charset
+        if charset is None:
+            self.pattern = None
+        elif charset in CHARSETS:
+            self.pattern = re.compile("[%s]*" % CHARSETS[charset])
+        elif isinstance(charset, str):
+            self.pattern = re.compile("[%s]*" % re.escape(charset))
+        else:
+            raise RuntimeError("Invalid charset %r of parameter '%s'!" % (charset, key))
+
+
+    def parse(self, text):
+
+        return text
+
+
+    def check(self, value):
+
+        if not isinstance(value, str):
+            return self.invalid(value)
+        if self.maxlen is not None and len(value) > self.maxlen:
+            return "text longer than %d characters" % self.maxlen
+        if self.pattern is not None and self.pattern.fullmatch(value) is None:
+            return "text %r not %s" % (value, self.charset if self.charset in CHARSETS
+                                      else "made of %r" % self.charset)
+        return None
+
+
+class ChoiceValidator(Validator):
+
+    __slots__ = ('titles', 'values')
+
+    def __init__(self, key, parameters):
+
+        """ Validator of a selection from a list. The widgets store the
+        title, older profiles the value. """
+
+        super().__init__(key, list)
+        titles, values = parameters
+        self.titles = {title: value for title, value in zip(titles, values)}
+        self.values = {value: title for title, value in zip(titles, values)}
+
+
+    def parse(self, text):
+
+        return text
+
+
+    def check(self, value):
+
+        if not isinstance(value, str) or (value not in self.titles and
+                                          value not in self.values):
+            return self.invalid(value)
+        return None
+
+
+    def format(self, value):
+
+        if value not in self.titles:
+            return self.values.get(value, value)
+        return value
+
+
+VALIDATORS = {
+    bool: BoolValidator,
+    int: IntValidator,
+    float: FloatValidator,
+    str: StrValidator,
+    list: ChoiceValidator,
+    }
+
+
+def compile_validator(key, options):
+
+    """ Return the validator of the parameter key with the specification
+    options. """
+
+    factory = VALIDATORS.get(options['type'])
+    if factory is None:
+        return Validator(key, options['type'])
+    return factory(key, options.get('parameters'))
+
+
+class ValidationIssue(object):
+
+    __slots__ = ('key', 'value', 'message')
+
+    def __init__(self, key, value, message):
+
+        """ Invalid value of the parameter key. """
+
+        self.key = key
+        self.value = value
+        self.message = message
+
+
+    def __repr__(self):
+
+        return "ValidationIssue(%r, %r)" % (self.key, self.message)
+
+
+class ValidationReport(object):
+
+    def __init__(self):
+
+        """ Result of a validation with the dictionary of valid values and
+        the list of issues. """
+
+        self.values = {}
+        self.issues = []
+
+
+    @property
+    def ok(self):
+
+        return not self.issues
+
+
+    def message(self, lines=None, limit=10):
+
+        """ Return a description of the first limit issues. The optional
+        dictionary lines maps the keys to their line numbers in a file. """
+
+        lines = lines or {}
+        text = []
+        for issue in self.issues[:limit]:
+            where = " in line %d" % lines[issue.key] if lines.get(issue.key) else ""
+            text.append("Parameter '%s'%s: %s!" % (issue.key, where, issue.message))
+        if len(self.issues) > limit:
+            text.append("... and %d more invalid parameters." % (len(self.issues) - limit))
+        return "\n".join(text)
+
+
+class Validators(Mapping):
+
+    def __init__(self, specifications):
+
+        """ Compiled validators of all parameters in specifications. """
+
+        self.validators = {key: compile_validator(key, options)
+                           for key, options in specifications.items()}
+
+
+    def __getitem__(self, key):
+
+        return self.validators[key]
+
+
+    def __iter__(self):
+
+        return iter(self.validators)
+
+
+    def __len__(self):
+
+        return len(self.validators)
+
+
+    def check(self, key, value):
+
+        """ Return an error message if value is no valid value of the
+        parameter key or None otherwise. """
+
+        validator = self.validators.get(key)
+        if validator is None:
+            return "unknown parameter"
+        return validator.check(value)
+
+
+    def validate(self, values):
+
+        """ Check a dictionary of parameter values and return the
+        ValidationReport. """
+
+        report = ValidationReport()
+        validators = self.validators
+        for key, value in values.items():
+            validator = validators.get(key)
+            message = "unknown parameter" if validator is None else validator.check(value)
+            if message is None:
+                report.values[key] = value
+            else:
+                report.issues.append(ValidationIssue(key, value, message))
+        return report
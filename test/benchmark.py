@@ -0,0 +1,624 @@
+##########################################################################
+# Copyright (c) 2023-2024 Reinhard Caspary and Dennet Orbaugh            #
+# <reinhard.caspary@phoenixd.uni-hannover.de>                            #
+# This program is free software under the terms of the MIT license.      #
+##########################################################################
+#
+# Benchmark suite of the ImageViewer and the font engine. Synthetic
+# scenes of several sizes are rendered in the rebuild and the retained
+# mode of the viewer. The timings are reported as JSON to track
+# regressions between releases. Runs without a display using the
+# offscreen platform of Qt:
+#
+#   python test/benchmark.py [-o report.json] [--index num] [--scene num] [size ...]
+#
+##########################################################################
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import contextlib
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plotapp"))
+
+from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QApplication
+
+from ImageViewer import ImageViewer
+from pyramid import TilePyramid
+from spatialindex import SpatialIndex
+from layerindex import LayerIndex
+from font import Font, np
+from objectstore import ObjectStore
+from scenefile import SceneFile, write_scene
+from camera import FrameRing, SyntheticCamera
+from posdummy import Position
+from profiles import read_profile, write_profile
+from validators import Validators
+from ParameterEditor import ParameterEditor
+
+# Global parameters
+VIEW_SIZE = (800, 600)
+TILE_SIZE = 256
+MAX_TILES = 256
+NUM_FRAMES = 20
+ZOOM_STEPS = 4
+NUM_QUERIES = 100
+NUM_LAYERS = 200
+SIZES = (100, 400, 1600)
+INDEX_SIZE = 100000
+SCENE_SIZE = 1000000
+LOAD_SIZE = 100000
+CAMERA_FPS = 200
+CAMERA_TIME = 1.0
+PROFILE_SIZE = 10000
+EDITOR_SIZE = 10000
+
+
+def log(*args):
+
+    """ Progress messages go to stderr to keep stdout clean for JSON. """
+
+    print(*args, file=sys.stderr, flush=True)
+
+
+def make_tiles(folder, num, size=TILE_SIZE):
+
+    """ Write synthetic camera tiles and return their paths. The tiles are
+    filled with noise to make decoding as costly as for real camera
+    images. """
+
+    paths = []
+    for i in range(num):
+        data = os.urandom(4 * size * size)
+        image = QImage(data, size, size, QImage.Format_RGB32)
+        path = os.path.join(folder, "tile_%d.png" % i)
+        image.save(path)
+        paths.append(path)
+    return paths
+
+
+def make_scene(paths, num_images, num_objects, seed=0):
+
+    """ Return image data and drawn objects of a synthetic scene. The
+    images form a square mosaic, the objects are scattered across it. """
+
+    rnd = random.Random(seed)
+    side = max(1, int(num_images ** 0.5))
+    images = {}
+    for i in range(num_images):
+        x = 100 * (i % side)
+        y = 100 * (i // side)
+        images["image_%d" % i] = {
+            "image_path": paths[i % len(paths)],
+            "x": x,
+            "y": y,
+            "z": 0,
+            "bounds": [y - 50, x + 50, y + 50, x - 50],
+            }
+
+    extent = 100 * side
+    objects = []
+    for i in range(num_objects):
+        kind = ("circle", "rectangle", "line", "text")[i % 4]
+        x = rnd.uniform(0, extent)
+        y = rnd.uniform(0, extent)
+        objects.append((kind, x, y))
+    return images, objects
+
+
+def add_objects(viewer, objects):
+
+    """ Add the synthetic objects through the public drawing API. """
+
+    redraw = viewer.update_camera_view
+    viewer.update_camera_view = lambda: None
+    for kind, x, y in objects:
+        if kind == "circle":
+            viewer.draw_circle(x, y, 0, 20, "black", 2)
+        elif kind == "rectangle":
+            viewer.draw_rectangle(x, y, 0, 30, 50, 30, "red", 2)
+        elif kind == "line":
+            viewer.draw_line(x, y, 0, 60, 45, "blue", 2)
+        else:
+            viewer.draw_text("P%d" % int(x), x, y, 0, 12, 0, "green", 1)
+    viewer.update_camera_view = redraw
+
+
+def frame_time(app, viewer, step, num=NUM_FRAMES):
+
+    """ Return the mean time of a full frame in ms. The callable step
+    changes the view and updates the scene, then the viewport is
+    painted. """
+
+    viewer.update_camera_view()
+    app.processEvents()
+    t0 = time.perf_counter()
+    for i in range(num):
+        step(i)
+        viewer.viewport().repaint()
+    return 1000 * (time.perf_counter() - t0) / num
+
+
+def bench_viewer(app, paths, num, retained):
+
+    """ Return the timings of a viewer showing num images and num drawn
+    objects in the given mode. """
+
+    images, objects = make_scene(paths, num, num)
+    viewer = ImageViewer(None, images, retained=retained)
+    viewer.objects_visible = True
+    viewer.drawn_objects.clear()
+    viewer.resize(*VIEW_SIZE)
+    viewer.show()
+    add_objects(viewer, objects)
+
+    # The first frame includes building the index and the retained scene
+    t0 = time.perf_counter()
+    viewer.set_retained(retained)
+    first = 1000 * (time.perf_counter() - t0)
+
+    # Pan right and back to stay within the scene
+    def pan(i):
+        step = viewer.window_step if i < NUM_FRAMES // 2 else -viewer.window_step
+        viewer.window_pos_x += step
+        viewer.update_camera_view()
+
+    # Zoom in and out by ZOOM_STEPS in turn to keep the scale bounded
+    zoom_in = zoom_out = 0
+    rounds = max(1, NUM_FRAMES // ZOOM_STEPS)
+    for i in range(rounds):
+        zoom_in += frame_time(app, viewer, lambda i: viewer.zoom_in(), ZOOM_STEPS)
+        zoom_out += frame_time(app, viewer, lambda i: viewer.zoom_out(), ZOOM_STEPS)
+    zoom_in /= rounds
+    zoom_out /= rounds
+
+    # Pan with simplified drawing as during a continuous drag
+    viewer.begin_interaction()
+    pan_lod = frame_time(app, viewer, pan)
+    viewer.idle_timer.stop()
+    viewer.interactive = False
+
+    result = {
+        "images": num,
+        "objects": num,
+        "mode": "retained" if retained else "rebuild",
+        "first_frame_ms": first,
+        "update_camera_view_ms": frame_time(app, viewer, lambda i: viewer.update_camera_view()),
+        "pan_ms": frame_time(app, viewer, pan),
+        "pan_lod_ms": pan_lod,
+        "zoom_in_ms": zoom_in,
+        "zoom_out_ms": zoom_out,
+        "go_to_home_view_ms": frame_time(app, viewer, lambda i: viewer.go_to_home_view()),
+        "pixmap_cache": viewer.pixmap_cache.stats(),
+        "tile_loader": viewer.tile_loader.stats(),
+        "redraw": viewer.redraw.stats(),
+        }
+    viewer.tile_loader.clear()
+    viewer.tile_loader.wait()
+    viewer.close()
+    return result
+
+
+def bench_font(num, arrays=False, seed=0):
+
+    """ Return the timings of Font.string for num distinct strings. The
+    first pass lays out every string, the second one hits the cache. """
+
+    rnd = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 :.-"
+    texts = ["".join(rnd.choice(letters) for j in range(rnd.randint(4, 24)))
+             for i in range(num)]
+    font = Font(cache_size=num, arrays=arrays, valign="bottom", mirrory=True)
+
+    t0 = time.perf_counter()
+    for text in texts:
+        font.string(text, 3.6, 3.6, size=12, width=12)
+    layout = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for text in texts:
+        font.string(text, 3.6, 3.6, size=12, width=12)
+    cached = time.perf_counter() - t0
+
+    return {
+        "strings": num,
+        "backend": "numpy" if arrays else "lists",
+        "string_us": 1e6 * layout / num,
+        "cached_us": 1e6 * cached / num,
+        "hits": font.hits,
+        "misses": font.misses,
+        }
+
+
+def bench_index(num=INDEX_SIZE, seed=0):
+
+    """ Compare viewport queries of the spatial index with the linear scan
+    over all bounds and return the timings. """
+
+    rnd = random.Random(seed)
+    extent = 100 * num ** 0.5
+    bounds = []
+    for i in range(num):
+        x = rnd.uniform(0, extent)
+        y = rnd.uniform(0, extent)
+        size = rnd.uniform(5, 100)
+        bounds.append([y - size, x + size, y + size, x - size])
+
+    index = SpatialIndex()
+    t0 = time.perf_counter()
+    for i, b in enumerate(bounds):
+        index.insert(i, b)
+    insert = 1e6 * (time.perf_counter() - t0) / num
+
+    views = []
+    for i in range(NUM_QUERIES):
+        x = rnd.uniform(0, extent)
+        y = rnd.uniform(0, extent)
+        views.append((x, y, x + VIEW_SIZE[0], y + VIEW_SIZE[1]))
+
+    t0 = time.perf_counter()
+    found = 0
+    for left, top, right, bottom in views:
+        found += len(index.query(left, top, right, bottom))
+    query = 1000 * (time.perf_counter() - t0) / NUM_QUERIES
+
+    # Linear scan as done before the index existed
+    zoom = 1.0
+    t0 = time.perf_counter()
+    for left, top, right, bottom in views:
+        for b in bounds:
+            b = [coord * zoom for coord in b]
+            if left < b[1] and right > b[3] and bottom > b[0] and top < b[2]:
+                pass
+    scan = 1000 * (time.perf_counter() - t0) / NUM_QUERIES
+
+    # Layer index with a depth cutoff in the middle of the layer stack
+    layers = LayerIndex()
+    for i, b in enumerate(bounds):
+        layers.insert(i, i % NUM_LAYERS, b)
+    t0 = time.perf_counter()
+    for left, top, right, bottom in views:
+        layers.query(left, top, right, bottom, NUM_LAYERS // 2)
+    layered = 1000 * (time.perf_counter() - t0) / NUM_QUERIES
+
+    return {
+        "entries": num,
+        "queries": NUM_QUERIES,
+        "visible_per_query": found / NUM_QUERIES,
+        "insert_us": insert,
+        "query_ms": query,
+        "linear_scan_ms": scan,
+        "layers": NUM_LAYERS,
+        "layer_query_ms": layered,
+        }
+
+
+def make_circles(num, rnd):
+
+    """ Return an ObjectStore with num random circles. """
+
+    extent = 100 * num ** 0.5
+    x = [rnd.uniform(0, extent) for i in range(num)]
+    y = [rnd.uniform(0, extent) for i in range(num)]
+    store = ObjectStore()
+    store.add_columns("circle", {
+        "x": x, "y": y, "z": [0] * num, "linewidth": [1] * num, "radius": [5] * num,
+        "top": [v - 5 for v in y], "right": [v + 5 for v in x],
+        "bot": [v + 5 for v in y], "left": [v - 5 for v in x],
+        }, "black")
+    return store
+
+
+def bench_scene(folder, num=SCENE_SIZE, seed=0):
+
+    """ Write num circles to a scene file and return the times for writing,
+    opening, reading random objects and the draw rows of all objects from
+    the memory-mapped file. """
+
+    rnd = random.Random(seed)
+    store = make_circles(num, rnd)
+
+    images = {"image_%d" % i: {
+        "image_path": "image_%d.png" % i, "x": 100.0 * i, "y": 0.0, "z": 0.0,
+        "bounds": [0.0, 100.0 * i + 50, 50.0, 100.0 * i - 50]} for i in range(10)}
+
+    path = os.path.join(folder, "scene.plt")
+    t0 = time.perf_counter()
+    write_scene(path, images, store)
+    write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    scene = SceneFile(path)
+    opened = time.perf_counter() - t0
+
+    oids = [rnd.randrange(num) for i in range(NUM_QUERIES)]
+    t0 = time.perf_counter()
+    for oid in oids:
+        scene.objects.record(oid).to_dict()
+    access = time.perf_counter() - t0
+
+    # Draw rows of all objects read from whole columns
+    t0 = time.perf_counter()
+    scene.objects.draw_rows()
+    rows = time.perf_counter() - t0
+
+    # A loaded scene saved again keeps its image keys
+    copy = os.path.join(folder, "copy.plt")
+    write_scene(copy, scene.images, scene.objects)
+    reloaded = SceneFile(copy)
+    keys = sorted(reloaded.images.name(key) for key in reloaded.images)
+    if keys != sorted(images) or len(reloaded.objects) != num:
+        raise RuntimeError("Scene file '%s' changed when saved again!" % path)
+
+    return {
+        "objects": num,
+        "bytes": os.path.getsize(path),
+        "write_ms": 1000 * write,
+        "open_ms": 1000 * opened,
+        "record_us": 1e6 * access / NUM_QUERIES,
+        "draw_rows_ms": 1000 * rows,
+        }
+
+
+def bench_load(app, folder, num=LOAD_SIZE, seed=0):
+
+    """ Return the times for loading a scene file with num circles into
+    the viewer in both modes, including the first frame. """
+
+    path = os.path.join(folder, "load.plt")
+    write_scene(path, {}, make_circles(num, random.Random(seed)))
+
+    result = {"objects": num}
+    for retained in (False, True):
+        viewer = ImageViewer(None, {}, retained=retained)
+        viewer.objects_visible = True
+        viewer.resize(*VIEW_SIZE)
+        viewer.show()
+        app.processEvents()
+        t0 = time.perf_counter()
+        viewer.load_scene(path)
+        viewer.viewport().repaint()
+        mode = "retained" if retained else "rebuild"
+        result[mode + "_ms"] = 1000 * (time.perf_counter() - t0)
+        viewer.close()
+    return result
+
+
+def bench_camera(app, fps=CAMERA_FPS, duration=CAMERA_TIME):
+
+    """ Feed the retained viewer with a synthetic camera running at fps for
+    duration seconds. Return the frame counters of the ring and the mosaic
+    and the mean time the viewer needs to take and stitch one frame. """
+
+    viewer = ImageViewer(None, {}, retained=True)
+    viewer.resize(*VIEW_SIZE)
+    viewer.show()
+    viewer.update_camera_view()
+
+    ring = FrameRing()
+    camera = SyntheticCamera(ring, Position(), fps)
+    viewer.camera_ring = ring
+    polls = []
+    camera.start()
+    t_end = time.perf_counter() + duration
+    while time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        viewer.poll_camera()
+        polls.append(time.perf_counter() - t0)
+        app.processEvents()
+        time.sleep(viewer.camera_interval / 1000)
+    camera.stop()
+    viewer.detach_camera()
+    viewer.close()
+
+    result = ring.stats()
+    result["mosaic"] = viewer.mosaic.stats()
+    result.update({
+        "fps": fps,
+        "duration_s": duration,
+        "frame_size": ring.frame_size,
+        "poll_ms": 1000 * sum(polls) / len(polls),
+        })
+    return result
+
+
+def bench_profile(folder, num=PROFILE_SIZE, seed=0):
+
+    """ Write a profile with num parameters and return the times for
+    writing and for the checked load, compared to running the same values
+    as Python source, and the times for compiling the validators and
+    checking all values. """
+
+    rnd = random.Random(seed)
+    specifications = {}
+    values = {}
+    for i in range(num):
+        key = "param_%d" % i
+        specifications[key] = {'name': key, 'type': int, 'default': 0,
+                               'parameters': {'min': 0, 'max': 9000}, 'writable': True}
+        values[key] = rnd.randrange(9000)
+
+    path = os.path.join(folder, "profile.json")
+    t0 = time.perf_counter()
+    write_profile(path, values)
+    write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    read_profile(path, specifications)
+    load = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    validators = Validators(specifications)
+    compilation = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    validators.validate(values)
+    validate = time.perf_counter() - t0
+
+    source = "data_values = %r" % values
+    t0 = time.perf_counter()
+    exec(source, {})
+    execute = time.perf_counter() - t0
+
+    return {
+        "parameters": num,
+        "bytes": os.path.getsize(path),
+        "write_ms": 1000 * write,
+        "load_ms": 1000 * load,
+        "exec_ms": 1000 * execute,
+        "compile_ms": 1000 * compilation,
+        "validate_ms": 1000 * validate,
+        }
+
+
+def bench_editor(app, num=EDITOR_SIZE):
+
+    """ Return the times for showing a parameter table with num parameters
+    and for filtering it by name, and the number of child objects of the
+    editor, which does not grow with num. """
+
+    kinds = ((int, 0, {'min': 0, 'max': 9000}),
+             (float, 1.0, {'min': 0.0, 'max': 2.0, 'digits': 3}),
+             (str, 'text', [40, "alphanumeric"]),
+             (bool, True, None),
+             (list, 'x axis', (['x axis', 'y axis'], ['x', 'y'])))
+    specifications = {}
+    for i in range(num):
+        kind, default, parameters = kinds[i % len(kinds)]
+        specifications["param_%d" % i] = {'name': "param %d" % i, 'type': kind,
+                                          'default': default, 'parameters': parameters,
+                                          'writable': True}
+
+    t0 = time.perf_counter()
+    editor = ParameterEditor(specifications, {})
+    editor.show()
+    app.processEvents()
+    show = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    editor.set_filter("param 12")
+    app.processEvents()
+    filter = time.perf_counter() - t0
+
+    result = {
+        "parameters": num,
+        "show_ms": 1000 * show,
+        "filter_ms": 1000 * filter,
+        "matches": editor.proxy.rowCount(),
+        "objects": len(editor.findChildren(object)),
+        }
+    editor.close()
+    return result
+
+
+def run(sizes=SIZES, index_size=INDEX_SIZE, scene_size=SCENE_SIZE):
+
+    """ Run the whole suite and return the report dictionary. """
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt": QT_VERSION_STR,
+        "pyqt": PYQT_VERSION_STR,
+        "numpy": np is not None,
+        "view_size": VIEW_SIZE,
+        "frames": NUM_FRAMES,
+        "viewer": [],
+        "font": [],
+        "scene": None,
+        "load": None,
+        "index": None,
+        "camera": None,
+        "profile": None,
+        "editor": None,
+        }
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_tiles(folder, min(max(sizes), MAX_TILES))
+        TilePyramid().build_all({path: {"image_path": path} for path in paths})
+        for num in sizes:
+            for retained in (False, True):
+                result = bench_viewer(app, paths, num, retained)
+                log("viewer %5d %-8s first %8.2f ms  pan %7.2f ms  zoom in %7.2f ms" % (
+                    num, result["mode"], result["first_frame_ms"], result["pan_ms"],
+                    result["zoom_in_ms"]))
+                report["viewer"].append(result)
+
+    for num in sizes:
+        for arrays in (False, True) if np is not None else (False,):
+            result = bench_font(num, arrays)
+            log("font   %5d %-8s string %7.2f us  cached %5.2f us" % (
+                num, result["backend"], result["string_us"], result["cached_us"]))
+            report["font"].append(result)
+
+    if scene_size:
+        with tempfile.TemporaryDirectory() as folder:
+            result = bench_scene(folder, scene_size)
+        log("scene  %d objects, write %.1f ms, open %.3f ms, record %.1f us, rows %.1f ms" % (
+            scene_size, result["write_ms"], result["open_ms"], result["record_us"],
+            result["draw_rows_ms"]))
+        report["scene"] = result
+
+        with tempfile.TemporaryDirectory() as folder:
+            result = bench_load(app, folder, min(scene_size, LOAD_SIZE))
+        log("load   %d objects, rebuild %.1f ms, retained %.1f ms" % (
+            result["objects"], result["rebuild_ms"], result["retained_ms"]))
+        report["load"] = result
+
+    if index_size:
+        result = bench_index(index_size)
+        log("index  %d entries, query %.3f ms, linear scan %.3f ms" % (
+            index_size, result["query_ms"], result["linear_scan_ms"]))
+        report["index"] = result
+
+    result = bench_camera(app)
+    log("camera %d fps, %d written, %d consumed, %d dropped, poll %.3f ms" % (
+        result["fps"], result["written"], result["consumed"], result["dropped"],
+        result["poll_ms"]))
+    report["camera"] = result
+
+    with tempfile.TemporaryDirectory() as folder:
+        result = bench_profile(folder)
+    log("profile %d parameters, write %.1f ms, load %.1f ms, exec %.1f ms, validate %.1f ms" % (
+        result["parameters"], result["write_ms"], result["load_ms"], result["exec_ms"],
+        result["validate_ms"]))
+    report["profile"] = result
+
+    result = bench_editor(app)
+    log("editor %d parameters, show %.1f ms, filter %.1f ms, %d objects" % (
+        result["parameters"], result["show_ms"], result["filter_ms"], result["objects"]))
+    report["editor"] = result
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark suite of the PlotApp viewer.")
+    parser.add_argument("sizes", nargs="*", type=int, default=SIZES,
+                        help="number of images and drawn objects of each scene")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file")
+    parser.add_argument("--index", type=int, default=INDEX_SIZE,
+                        help="number of entries of the index benchmark, 0 to skip")
+    parser.add_argument("--scene", type=int, default=SCENE_SIZE,
+                        help="number of objects of the scene file benchmark, 0 to skip")
+    args = parser.parse_args()
+
+    # Debug output of the viewer must not mix with the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args.sizes, args.index, args.scene)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()